@@ -0,0 +1,206 @@
+"""
+ANN Index - On-Disk IVF Search over Chunk Vectors
+=================================================
+Approximate nearest-neighbour index for nationwide manual coverage. Each state
+(or handbook) gets its own inverted-file (IVF) index directory under
+indexes/ann/<state>/: k-means centroids plus the chunk vectors grouped by
+cluster. Arrays are saved as .npy and memory-mapped at query time, so only
+the probed clusters are touched and workers share pages.
+
+Knobs:
+    RAG_ANN_NLIST   clusters per state at build time (default sqrt(chunks))
+    RAG_ANN_NPROBE  clusters scanned per query - higher = better recall, slower
+
+Builds are incremental per state - adding one manual doesn't rebuild the rest:
+    python ann_index.py [state ...] [--force]
+"""
+
+import json
+import math
+import os
+import shutil
+import sys
+import time
+from typing import Dict, List, Optional
+import numpy as np
+from dense_retriever import DenseIndex, embed_query, MIN_SIMILARITY
+from index_artifact import INDEX_DIR, source_stamp
+
+ANN_DIR = os.path.join(INDEX_DIR, 'ann')
+ANN_VERSION = 1
+ANN_NLIST = int(os.environ.get('RAG_ANN_NLIST', 0))  # 0 = sqrt(chunks)
+ANN_NPROBE = int(os.environ.get('RAG_ANN_NPROBE', 8))
+KMEANS_ITERATIONS = 12
+
+
+def ann_path(state: str, ann_dir: str = None) -> str:
+    return os.path.join(ann_dir or ANN_DIR, state)
+
+
+def spherical_kmeans(vectors: np.ndarray, nlist: int, iterations: int = KMEANS_ITERATIONS,
+                     seed: int = 0) -> np.ndarray:
+    """Cluster unit vectors by cosine similarity; returns (nlist, dims) unit centroids"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=nlist)
+        empty = counts == 0
+        if empty.any():  # re-seed empty clusters with random vectors
+            sums[empty] = vectors[rng.choice(len(vectors), size=int(empty.sum()), replace=False)]
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-9)
+    return centroids.astype(np.float32)
+
+
+def build_state(state: str, index, source_path: str = None, nlist: int = None, ann_dir: str = None) -> str:
+    """Embed one state's chunks and write its IVF index directory (atomic swap)"""
+    start = time.time()
+    dense = DenseIndex(index, quantize=False)
+    vectors = dense.unit_vectors()
+    nlist = max(1, min(nlist or ANN_NLIST or int(math.sqrt(len(vectors))), len(vectors)))
+
+    centroids = spherical_kmeans(vectors, nlist)
+    assignments = np.argmax(vectors @ centroids.T, axis=1)
+    order = np.argsort(assignments, kind='stable')
+    offsets = np.zeros(nlist + 1, dtype=np.int64)
+    np.cumsum(np.bincount(assignments, minlength=nlist), out=offsets[1:])
+
+    path = ann_path(state, ann_dir)
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    np.save(os.path.join(tmp_path, 'centroids.npy'), centroids)
+    np.save(os.path.join(tmp_path, 'vectors.npy'), np.ascontiguousarray(vectors[order]))
+    np.save(os.path.join(tmp_path, 'ids.npy'), order.astype(np.uint32))
+    np.save(os.path.join(tmp_path, 'offsets.npy'), offsets)
+    np.save(os.path.join(tmp_path, 'components.npy'), dense.components)
+    np.save(os.path.join(tmp_path, 'idf.npy'), dense.idf)
+    meta = {
+        'version': ANN_VERSION,
+        'state': state,
+        'chunks': len(vectors),
+        'dimensions': int(vectors.shape[1]),
+        'nlist': nlist,
+        'vocabulary': dense.vocabulary,
+        'source_stamp': list(source_stamp(source_path)) if source_path else None,
+        'built_at': time.time()
+    }
+    with open(os.path.join(tmp_path, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    print(f"✅ Built ANN {path}: {len(vectors)} vectors, {nlist} lists in {(time.time() - start) * 1000:.0f}ms")
+    return path
+
+
+def is_current(state: str, source_path: str = None, chunks: int = None, ann_dir: str = None) -> bool:
+    """True if the state's ANN index exists and matches its manual"""
+    meta_path = os.path.join(ann_path(state, ann_dir), 'meta.json')
+    if not os.path.exists(meta_path):
+        return False
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except Exception:
+        return False
+    if meta.get('version') != ANN_VERSION:
+        return False
+    if chunks is not None and meta.get('chunks') != chunks:
+        return False
+    if source_path and os.path.exists(source_path) and meta.get('source_stamp') != list(source_stamp(source_path)):
+        return False
+    return True
+
+
+class AnnIndex:
+    """
+    Memory-mapped IVF index for one state
+    """
+
+    def __init__(self, state: str, path: str):
+        self.state = state
+        self.path = path
+        with open(os.path.join(path, 'meta.json'), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.term_ids = {term: i for i, term in enumerate(self.meta['vocabulary'])}
+        self.centroids = np.load(os.path.join(path, 'centroids.npy'), mmap_mode='r')
+        self.vectors = np.load(os.path.join(path, 'vectors.npy'), mmap_mode='r')
+        self.ids = np.load(os.path.join(path, 'ids.npy'), mmap_mode='r')
+        self.offsets = np.load(os.path.join(path, 'offsets.npy'))
+        self.components = np.load(os.path.join(path, 'components.npy'), mmap_mode='r')
+        self.idf = np.load(os.path.join(path, 'idf.npy'), mmap_mode='r')
+
+    @classmethod
+    def open(cls, state: str, source_path: str = None, chunks: int = None,
+             ann_dir: str = None) -> Optional['AnnIndex']:
+        """Map a state's ANN index; None if it's missing or stale"""
+        if not is_current(state, source_path, chunks, ann_dir):
+            return None
+        return cls(state, ann_path(state, ann_dir))
+
+    @property
+    def nbytes(self) -> int:
+        # Mapped and shared, but counted so the registry budget stays conservative
+        return self.vectors.nbytes + self.components.nbytes + self.centroids.nbytes + len(self.term_ids) * 120
+
+    def search(self, query: str, top_k: int = 5, nprobe: int = None,
+               min_similarity: float = MIN_SIMILARITY) -> Dict:
+        """
+        Probe the `nprobe` closest clusters and rank their vectors by cosine.
+        Returns {'hits': [(chunk_id, similarity), ...], 'candidates': int, 'timings_ms': {...}}
+        """
+        start = time.time()
+        query_vector = embed_query(query, self.term_ids, self.idf, self.components)
+        hits = []
+        scanned = 0
+        if query_vector.any():
+            nlist = len(self.centroids)
+            nprobe = max(1, min(nprobe or ANN_NPROBE, nlist))
+            centroid_scores = self.centroids @ query_vector
+            probes = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+
+            ranges = [(int(self.offsets[p]), int(self.offsets[p + 1])) for p in probes]
+            positions = np.concatenate([np.arange(a, b) for a, b in ranges]) if ranges else np.zeros(0, dtype=np.int64)
+            scanned = len(positions)
+            if scanned:
+                scores = np.concatenate([self.vectors[a:b] @ query_vector for a, b in ranges])
+                k = min(top_k, scanned)
+                top = np.argpartition(-scores, k - 1)[:k]
+                top = top[np.argsort(-scores[top], kind='stable')]
+                hits = [(int(self.ids[positions[i]]), float(scores[i]))
+                        for i in top if scores[i] >= min_similarity]
+        return {
+            'hits': hits,
+            'candidates': scanned,
+            'reranked': 0,
+            'timings_ms': {'retrieve': round((time.time() - start) * 1000, 2), 'rerank': 0.0}
+        }
+
+
+def build_all(states: List[str] = None, force: bool = False, ann_dir: str = None) -> Dict[str, str]:
+    """Incremental build: only states whose ANN index is missing or stale are rebuilt"""
+    from corpus_registry import get_registry
+
+    registry = get_registry()
+    built = {}
+    for state in states or registry.states():
+        key = registry.resolve(state)
+        index = registry.get_index(state) if key else None
+        if index is None:
+            print(f"⚠️  Could not load {state} manual - skipping")
+            continue
+        source_path = registry.catalog[key].get('path')
+        if not force and is_current(key, source_path, len(index), ann_dir):
+            print(f"✔️  ANN index for {key} is up to date")
+            continue
+        built[key] = build_state(key, index, source_path, ann_dir=ann_dir)
+    return built
+
+
+if __name__ == "__main__":
+    print("DriveSmart ANN Index Builder")
+    args = [arg for arg in sys.argv[1:] if arg != '--force']
+    build_all(args or None, force='--force' in sys.argv)
@@ -0,0 +1,206 @@
+"""
+Answer Cache - Persistent LLM Answer Cache in SQLite
+===================================================
+Generated answers are stored keyed by (state, normalized question, hash of the
+context chunks, model, generation options), so a repeated question is answered
+without calling Ollama. Normalization keeps negations and modals, so "can I"
+and "can't I" are different questions. SQLite (WAL mode) keeps the cache across restarts and
+shares it between gunicorn workers.
+
+Entries older than RAG_ANSWER_CACHE_MAX_AGE seconds are ignored and purged;
+past RAG_ANSWER_CACHE_MAX_ENTRIES the least recently used entries are evicted.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from query_cache import normalize_question
+
+ANSWER_CACHE_PATH = os.environ.get('RAG_ANSWER_CACHE_PATH', 'answer_cache.db')
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get('RAG_ANSWER_CACHE_MAX_ENTRIES', 5000))
+ANSWER_CACHE_MAX_AGE = float(os.environ.get('RAG_ANSWER_CACHE_MAX_AGE', 7 * 24 * 3600))
+PURGE_EVERY = 100  # writes between eviction passes
+
+
+def context_hash(contexts: List[str]) -> str:
+    """Stable hash of the context chunks an answer was generated from"""
+    digest = hashlib.sha1()
+    for context in contexts:
+        digest.update(context.encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+def answer_key(state: str, question: str, contexts: List[str], model: str, options: Dict) -> str:
+    """Cache key for one (state, question, contexts, model, options) combination"""
+    parts = [state, normalize_question(question), context_hash(contexts), model,
+             json.dumps(options or {}, sort_keys=True)]
+    return hashlib.sha256(json.dumps(parts).encode('utf-8')).hexdigest()
+
+
+class AnswerCache:
+    """
+    SQLite-backed answer cache with size and age eviction
+    """
+
+    def __init__(self, path: str = None, max_entries: int = None, max_age: float = None):
+        self.path = path or ANSWER_CACHE_PATH
+        self.max_entries = max_entries or ANSWER_CACHE_MAX_ENTRIES
+        self.max_age = max_age or ANSWER_CACHE_MAX_AGE
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._counters = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0, 'errors': 0}
+        self._init_schema()
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads, so keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        try:
+            conn = self._connection()
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS answer_cache (
+                    key TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    question TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    answer TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_hit_at REAL NOT NULL,
+                    hits INTEGER DEFAULT 0
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_answer_cache_last_hit ON answer_cache (last_hit_at)')
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️  Answer cache unavailable ({self.path}): {e}")
+            self._counters['errors'] += 1
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached answer for a key, or None if missing or expired"""
+        try:
+            conn = self._connection()
+            now = time.time()
+            row = conn.execute(
+                'SELECT answer FROM answer_cache WHERE key = ? AND created_at >= ?',
+                (key, now - self.max_age)
+            ).fetchone()
+            if row is None:
+                self._count('misses')
+                return None
+            conn.execute('UPDATE answer_cache SET last_hit_at = ?, hits = hits + 1 WHERE key = ?', (now, key))
+            conn.commit()
+            self._count('hits')
+            return row[0]
+        except sqlite3.Error as e:
+            print(f"Answer cache read error: {e}")
+            self._count('errors')
+            return None
+
+    def put(self, key: str, state: str, question: str, model: str, answer: str):
+        try:
+            conn = self._connection()
+            now = time.time()
+            conn.execute(
+                'INSERT OR REPLACE INTO answer_cache (key, state, question, model, answer, created_at, last_hit_at, hits) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, 0)',
+                (key, state, question, model, answer, now, now)
+            )
+            conn.commit()
+            with self._lock:
+                self._counters['writes'] += 1
+                self._writes += 1
+                purge = self._writes % PURGE_EVERY == 1
+            if purge:
+                self.purge()
+        except sqlite3.Error as e:
+            print(f"Answer cache write error: {e}")
+            self._count('errors')
+
+    def purge(self) -> int:
+        """Drop expired entries, then the least recently used beyond max_entries"""
+        try:
+            conn = self._connection()
+            expired = conn.execute('DELETE FROM answer_cache WHERE created_at < ?',
+                                   (time.time() - self.max_age,)).rowcount
+            overflow = conn.execute(
+                'DELETE FROM answer_cache WHERE key IN ('
+                'SELECT key FROM answer_cache ORDER BY last_hit_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            ).rowcount
+            conn.commit()
+            self._count('evictions', expired + overflow)
+            return expired + overflow
+        except sqlite3.Error as e:
+            print(f"Answer cache purge error: {e}")
+            self._count('errors')
+            return 0
+
+    def recent(self, limit: int = 1000) -> List[Tuple[str, str, str]]:
+        """(state, question, answer) of the most recently used live entries"""
+        try:
+            return self._connection().execute(
+                'SELECT state, question, answer FROM answer_cache WHERE created_at >= ? '
+                'ORDER BY last_hit_at DESC LIMIT ?',
+                (time.time() - self.max_age, limit)
+            ).fetchall()[::-1]
+        except sqlite3.Error as e:
+            print(f"Answer cache read error: {e}")
+            return []
+
+    def invalidate_states(self, matches: Callable[[str], bool]) -> int:
+        """Drop every entry whose state label satisfies `matches` (e.g. after a manual changes)"""
+        try:
+            conn = self._connection()
+            states = [row[0] for row in conn.execute('SELECT DISTINCT state FROM answer_cache').fetchall()]
+            dropped = 0
+            for state in filter(matches, states):
+                dropped += conn.execute('DELETE FROM answer_cache WHERE state = ?', (state,)).rowcount
+            conn.commit()
+            self._count('evictions', dropped)
+            return dropped
+        except sqlite3.Error as e:
+            print(f"Answer cache invalidation error: {e}")
+            self._count('errors')
+            return 0
+
+    def clear(self):
+        try:
+            conn = self._connection()
+            conn.execute('DELETE FROM answer_cache')
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Answer cache clear error: {e}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+        try:
+            entries = self._connection().execute('SELECT COUNT(*) FROM answer_cache').fetchone()[0]
+        except sqlite3.Error:
+            entries = None
+        lookups = counters['hits'] + counters['misses']
+        return dict(
+            counters,
+            entries=entries,
+            max_entries=self.max_entries,
+            max_age_seconds=self.max_age,
+            path=self.path,
+            hit_rate=round(counters['hits'] / lookups, 3) if lookups else 0.0
+        )
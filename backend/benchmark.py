@@ -0,0 +1,309 @@
+"""
+Benchmark - Retrieval and Answer Quality on the Quiz Golden Set
+===============================================================
+Golden set: every quiz question in frontend/assets/quizzes/<state>.json,
+labelled with the manual chunks that best match its correct answer and
+explanation (up to GOLD_CHUNKS chunks scoring at least GOLD_MIN_SCORE with
+rapidfuzz token_set_ratio). The labels are derived automatically, so treat
+the absolute numbers as approximate and compare runs against each other;
+pass --golden to freeze a labelled set in a file and reuse it.
+
+For each state and retrieval strategy it reports p50/p95/p99 latency,
+recall@k, MRR, hit rate and chunks scanned, measured on the chunks the
+agent hands to generation (so k is at most 5) with the retrieval cache
+bypassed. The answer pass runs the full generation path (context packing,
+prompt, trimming) against a stub model, plus the extractive answerer, and
+reports how often the answer contains the correct option. Nothing talks to
+Ollama, so it runs offline.
+
+    python benchmark.py [state ...] [--strategies lexical,dense] [--top-k 5]
+                        [--repeat 3] [--output file.json] [--golden file.json]
+                        [--compare earlier.json]
+
+Results are written to benchmarks/benchmark-<UTC time>.json by default.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+from typing import Dict, Iterator, List, Optional
+from rapidfuzz import fuzz, process
+from answer_cache import AnswerCache
+from corpus_registry import get_registry
+from dense_retriever import load_quiz_questions, _is_hit
+from lightweight_rag import LightweightRAGAgent, RETRIEVAL_STRATEGIES
+
+GOLD_CHUNKS = 3
+GOLD_MIN_SCORE = 60  # same bar dense_retriever uses for a quiz hit
+ANSWER_MATCH_SCORE = 90  # partial_ratio of the correct option against the answer
+BENCHMARK_DIR = 'benchmarks'
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'recall_at_k', 'mrr', 'hit_rate', 'chunks_scanned')
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+class StubModel:
+    """
+    Offline stand-in for the Ollama client: answers with the prompt's excerpts,
+    cut to the requested num_predict (about 0.75 words per token)
+    """
+
+    def available(self) -> bool:
+        return True
+
+    def generate(self, model: str, prompt: str, options: Dict = None, stream: bool = False,
+                 timeout: float = None, queue_timeout: float = None, keep_alive: str = None):
+        excerpts = prompt.split('EXCERPTS:\n', 1)[-1].split('\n\nSTUDENT QUESTION:', 1)[0]
+        words = excerpts.replace('---SECTION---', ' ').split()
+        limit = int((options or {}).get('num_predict', 300) * 0.75)
+        response = 'According to Washington State traffic laws, ' + ' '.join(words[:limit])
+        if stream:
+            return iter([{'response': response, 'done': True}])
+        return {'response': response, 'done': True}
+
+    def stats(self) -> Dict:
+        return {'stub': True}
+
+
+class BenchmarkAgent(LightweightRAGAgent):
+    """
+    RAG agent wired to the stub model, with a throwaway answer cache
+    """
+
+    def __init__(self, cache_dir: str):
+        # Never opens (or warms from) the production answer cache
+        super().__init__(answer_cache=AnswerCache(path=os.path.join(cache_dir, 'answer_cache.db')))
+        self.ollama = StubModel()
+
+    def _ollama_ready(self) -> bool:
+        return True
+
+
+def build_golden_set(registry, state: str) -> List[Dict]:
+    """Quiz questions with the text of their best-matching manual chunks"""
+    index = registry.get_index(state)
+    questions = load_quiz_questions(state)
+    if index is None or not questions:
+        return []
+    chunks_lower = index.chunks_lower
+    golden = []
+    for question in questions:
+        target = f"{question.get('correct_answer', '')} {question.get('explanation', '')}".lower()
+        scores = process.cdist([target], chunks_lower, scorer=fuzz.token_set_ratio,
+                               score_cutoff=GOLD_MIN_SCORE)[0]
+        best = [int(i) for i in scores.argsort()[::-1][:GOLD_CHUNKS] if scores[i] >= GOLD_MIN_SCORE]
+        golden.append(dict(question, state=state, gold_chunks=[index.chunk(i) for i in best]))
+    return golden
+
+
+def load_golden_set(path: str) -> Optional[Dict[str, List[Dict]]]:
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _rank_metrics(chunks: List[str], gold: List[str]) -> Dict:
+    """recall of the gold chunks in `chunks` and reciprocal rank of the first one"""
+    gold_set = set(gold)
+    found = [rank for rank, chunk in enumerate(chunks, 1) if chunk in gold_set]
+    return {
+        'recall': len(set(chunks) & gold_set) / len(gold_set),
+        'reciprocal_rank': 1.0 / found[0] if found else 0.0
+    }
+
+
+def benchmark_retrieval(agent: LightweightRAGAgent, state: str, golden: List[Dict], strategy: str,
+                        top_k: int, repeat: int) -> Dict:
+    """Latency and ranking quality of one strategy (retrieval cache bypassed)"""
+    latencies, scanned, recalls, reciprocal_ranks, hits = [], [], [], [], 0
+    served_by = set()
+    labelled = [question for question in golden if question['gold_chunks']]
+    for question in golden:
+        for attempt in range(repeat):
+            agent.retrieval_cache.clear()
+            stats = {}
+            with _quiet():
+                start = time.perf_counter()
+                chunks = agent._search_documents(question['question'], state, stats=stats, strategy=strategy)[:top_k]
+                latencies.append((time.perf_counter() - start) * 1000)
+            if attempt:
+                continue
+            scanned.append(stats.get('candidates', 0))
+            served_by.add(stats.get('strategy', strategy))
+            hits += _is_hit(chunks, question)
+            if question['gold_chunks']:
+                metrics = _rank_metrics(chunks, question['gold_chunks'])
+                recalls.append(metrics['recall'])
+                reciprocal_ranks.append(metrics['reciprocal_rank'])
+    latencies.sort()
+    return {
+        'questions': len(golden),
+        'labelled': len(labelled),
+        'served_by': sorted(served_by),
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'recall_at_k': round(sum(recalls) / len(recalls), 3) if recalls else None,
+        'mrr': round(sum(reciprocal_ranks) / len(reciprocal_ranks), 3) if reciprocal_ranks else None,
+        'hit_rate': round(hits / len(golden), 3) if golden else None,
+        'chunks_scanned': round(sum(scanned) / len(scanned), 1) if scanned else 0
+    }
+
+
+def benchmark_answers(agent: LightweightRAGAgent, state: str, golden: List[Dict]) -> Dict:
+    """Stub-model and extractive answers over the default strategy's retrieval"""
+    report = {}
+    for generator in ('stub_model', 'extractive'):
+        latencies, matches, overlaps = [], 0, []
+        for question in golden:
+            with _quiet():
+                chunks = agent._search_documents(question['question'], state)
+                start = time.perf_counter()
+                if generator == 'stub_model':
+                    answer = agent._generate_response(question['question'], chunks, state, {})
+                else:
+                    answer = agent._extract_detailed_answer(question['question'], chunks, state)
+                latencies.append((time.perf_counter() - start) * 1000)
+            answer_lower = answer.lower()
+            matches += fuzz.partial_ratio(question.get('correct_answer', '').lower(), answer_lower) >= ANSWER_MATCH_SCORE
+            overlaps.append(fuzz.token_set_ratio(question.get('explanation', '').lower(), answer_lower))
+        latencies.sort()
+        report[generator] = {
+            'p50_ms': round(percentile(latencies, 0.50), 3),
+            'p95_ms': round(percentile(latencies, 0.95), 3),
+            'p99_ms': round(percentile(latencies, 0.99), 3),
+            'contains_answer': round(matches / len(golden), 3) if golden else None,
+            'explanation_overlap': round(sum(overlaps) / len(overlaps), 1) if overlaps else None
+        }
+    return report
+
+
+def run(states: List[str] = None, strategies: List[str] = None, top_k: int = 5, repeat: int = 3,
+        golden_path: str = None) -> Dict:
+    """Benchmark every requested state and strategy; returns the JSON-ready report"""
+    strategies = strategies or list(RETRIEVAL_STRATEGIES)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        agent = BenchmarkAgent(cache_dir)
+        registry = agent.registry
+        states = states or [state for state in registry.states() if load_quiz_questions(state)]
+
+        golden_sets = load_golden_set(golden_path) or {}
+        for state in states:
+            if state not in golden_sets:
+                golden_sets[state] = build_golden_set(registry, state)
+        if golden_path and not os.path.exists(golden_path):
+            with open(golden_path, 'w', encoding='utf-8') as f:
+                json.dump(golden_sets, f, indent=2)
+            print(f"Golden set written to {golden_path}")
+
+        report = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'config': {'top_k': top_k, 'repeat': repeat, 'gold_chunks': GOLD_CHUNKS,
+                       'gold_min_score': GOLD_MIN_SCORE, 'golden_set': golden_path},
+            'states': {}
+        }
+        for state in states:
+            golden = golden_sets.get(state, [])
+            if not golden:
+                print(f"⚠️  No index or quiz questions for {state}")
+                continue
+            # Build dense/ANN structures before timing so the first query doesn't pay for them
+            registry.get_dense_index(state)
+            registry.get_ann_index(state)
+
+            state_report = {'questions': len(golden), 'strategies': {}}
+            print(f"\n{state} ({len(golden)} questions, "
+                  f"{sum(1 for question in golden if question['gold_chunks'])} labelled)")
+            for strategy in strategies:
+                result = benchmark_retrieval(agent, state, golden, strategy, top_k, repeat)
+                state_report['strategies'][strategy] = result
+                print(f"  {strategy:8s} recall@{top_k} {_fmt(result['recall_at_k'])}  MRR {_fmt(result['mrr'])}  "
+                      f"hit {_fmt(result['hit_rate'])}  p50 {result['p50_ms']:.2f}ms  p95 {result['p95_ms']:.2f}ms  "
+                      f"p99 {result['p99_ms']:.2f}ms  scanned {result['chunks_scanned']}")
+            state_report['answers'] = benchmark_answers(agent, state, golden)
+            for generator, result in state_report['answers'].items():
+                print(f"  {generator:10s} contains answer {_fmt(result['contains_answer'])}  "
+                      f"explanation overlap {result['explanation_overlap']}  p50 {result['p50_ms']:.2f}ms")
+            report['states'][state] = state_report
+    return report
+
+
+def compare(report: Dict, earlier: Dict) -> Iterator[str]:
+    """Lines describing how each retrieval metric moved since an earlier report"""
+    for state, state_report in report['states'].items():
+        for strategy, result in state_report['strategies'].items():
+            before = earlier.get('states', {}).get(state, {}).get('strategies', {}).get(strategy)
+            if not before:
+                continue
+            changes = [
+                f"{metric} {before[metric]} -> {result[metric]}"
+                for metric in METRICS
+                if result.get(metric) is not None and before.get(metric) is not None and result[metric] != before[metric]
+            ]
+            yield f"  {state}/{strategy}: " + (', '.join(changes) if changes else 'unchanged')
+
+
+def _quiet():
+    """Swallow the agent's per-query log lines while measuring"""
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def _fmt(value: Optional[float]) -> str:
+    return f"{value:.1%}" if value is not None else 'n/a'
+
+
+def _parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Retrieval and answer benchmark on the quiz golden set')
+    parser.add_argument('states', nargs='*', help='states to benchmark (default: every state with a quiz)')
+    parser.add_argument('--strategies', help=f"comma-separated subset of {','.join(RETRIEVAL_STRATEGIES)}")
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help=f'report path (default: {BENCHMARK_DIR}/benchmark-<UTC time>.json)')
+    parser.add_argument('--golden', help='labelled golden set to reuse, written on first use')
+    parser.add_argument('--compare', help='earlier report to compare against')
+    args = parser.parse_args(argv)
+
+    # Reject bad input before anything (golden set, report) is written
+    registry = get_registry()
+    unknown = [state for state in args.states if registry.resolve(state) is None]
+    if unknown:
+        parser.error(f"unknown state(s): {', '.join(unknown)} (known: {', '.join(registry.catalog)})")
+    args.states = [registry.resolve(state) for state in args.states]
+    args.strategies = args.strategies.split(',') if args.strategies else None
+    unknown = [strategy for strategy in args.strategies or [] if strategy not in RETRIEVAL_STRATEGIES]
+    if unknown:
+        parser.error(f"unknown strategy(s): {', '.join(unknown)} (known: {', '.join(RETRIEVAL_STRATEGIES)})")
+    if args.compare and not os.path.exists(args.compare):
+        parser.error(f"no such report: {args.compare}")
+    return args
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    print("DriveSmart Retrieval Benchmark")
+    output = args.output or os.path.join(
+        BENCHMARK_DIR, f"benchmark-{time.strftime('%Y%m%d-%H%M%S', time.gmtime())}.json"
+    )
+
+    report = run(args.states or None, args.strategies, args.top_k, args.repeat, args.golden)
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            earlier = json.load(f)
+        print(f"Compared with {args.compare} ({earlier.get('timestamp')}):")
+        for line in compare(report, earlier):
+            print(line)
@@ -4,16 +4,57 @@ Chat Module - Enhanced RAG Integration
 Handles AI chat functionality with Lightweight RAG for faster responses
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+import os
+import json
 import time
 import concurrent.futures
+from collections import deque
 from service import generate_fallback_response, get_system_status
-from lightweight_rag import LightweightRAGAgent
+from lightweight_rag import get_shared_agent, RETRIEVAL_STRATEGIES, COMPARE_MAX_STATES
+from query_cache import normalize_question
+from worker_pool import llm_pool, PoolFullError, LLM_POOL_WORKERS
+from deadline import Deadline
+from followups import Followup, FollowupStore
 
 chat_bp = Blueprint('chat', __name__)
 
-# Initialize RAG agent globally for faster repeated calls
-rag_agent = LightweightRAGAgent()
+# Retrieval candidate budgets - the quick endpoint reranks fewer chunks
+CHAT_CANDIDATE_BUDGET = int(os.environ.get('CHAT_CANDIDATE_BUDGET', 100))
+QUICK_CANDIDATE_BUDGET = int(os.environ.get('QUICK_CANDIDATE_BUDGET', 20))
+
+# End-to-end response budgets (seconds) - passed down so generation fits inside them
+CHAT_TIMEOUT = float(os.environ.get('CHAT_TIMEOUT', 60))
+QUICK_CHAT_TIMEOUT = float(os.environ.get('QUICK_CHAT_TIMEOUT', 10))
+DEADLINE_GRACE = 1.0  # extra wait for a pipeline that is finishing right at its deadline
+
+# Background LLM answers for two-phase requests
+followups = FollowupStore()
+FOLLOWUP_MAX_WAIT = 30.0  # longest long-poll on /followup/<id>
+
+# Batch answers (study guides, quiz explanations)
+CHAT_BATCH_MAX_ITEMS = int(os.environ.get('CHAT_BATCH_MAX_ITEMS', 50))
+CHAT_BATCH_TIMEOUT = float(os.environ.get('CHAT_BATCH_TIMEOUT', 90))
+# Generations one batch may have on the shared pool at once, so a batch can't fill
+# the queue and push interactive chat requests into the overloaded fallback
+CHAT_BATCH_IN_FLIGHT = int(os.environ.get('CHAT_BATCH_IN_FLIGHT', max(1, LLM_POOL_WORKERS // 2)))
+
+# Shared RAG agent - manuals are parsed once per process by the corpus registry
+rag_agent = get_shared_agent()
+# Map prebuilt indexes at import so pre-forked workers share the pages; embed them
+# too when the default strategy needs vectors, so no request pays the build
+rag_agent.registry.preload(dense=rag_agent.retrieval_strategy != 'lexical')
+
+
+def _seconds(value, default: float):
+    """A non-negative number of seconds from request input, `default` if absent, None if malformed"""
+    if value is None or value == '':
+        return default
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        return None
+    return seconds if 0 <= seconds < float('inf') else None
 
 @chat_bp.route('/', methods=['POST'])
 def chat():
@@ -24,6 +65,7 @@ def chat():
         data = request.json
         message = data.get('message', data.get('prompt', ''))
         state = data.get('state', 'Washington').lower()
+        strategy = data.get('strategy') if data.get('strategy') in RETRIEVAL_STRATEGIES else None
 
         if not message:
             return jsonify({
@@ -32,36 +74,38 @@ def chat():
                 'error': 'no_message'
             }), 400
 
+        if data.get('two_phase'):
+            return _two_phase_chat(message, state, strategy)
+
         start_time = time.time()
+        deadline = Deadline(CHAT_TIMEOUT)
 
         try:
-            with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-                future = executor.submit(rag_agent.chat_with_rag_fast, message, state)
-
-                try:
-                    # Increased timeout for RAG processing
-                    result = future.result(timeout=60.0)  # Increased from 20 seconds
-                    elapsed = time.time() - start_time
-                    return jsonify({
-                        'response': result['response'],
-                        'rag_enhanced': result.get('rag_enhanced', True),
-                        'response_time': round(elapsed, 2),
-                        'state': state,
-                        'system': 'lightweight_rag',
-                        'contexts_used': result.get('contexts_used', 0)
-                    })
-
-                except concurrent.futures.TimeoutError:
-                    elapsed = time.time() - start_time
-                    fallback_response = generate_fallback_response(message)
-                    return jsonify({
-                        'response': fallback_response,
-                        'rag_enhanced': False,
-                        'response_time': round(elapsed, 2),
-                        'fallback_reason': 'timeout',
-                        'state': state,
-                        'system': 'fallback'
-                    })
+            # Identical questions in flight are joined before a pool slot is taken
+            future, _ = rag_agent.submit_chat(llm_pool, message, state, CHAT_CANDIDATE_BUDGET, strategy, deadline)
+            result = llm_pool.wait(future, timeout=deadline.remaining() + DEADLINE_GRACE)
+            elapsed = time.time() - start_time
+            return jsonify({
+                'response': result['response'],
+                'rag_enhanced': result.get('rag_enhanced', True),
+                'response_time': round(elapsed, 2),
+                'state': state,
+                'system': 'lightweight_rag',
+                'contexts_used': result.get('contexts_used', 0),
+                'stage_timings_ms': result.get('stage_timings_ms', {})
+            })
+
+        except (concurrent.futures.TimeoutError, PoolFullError) as e:
+            elapsed = time.time() - start_time
+            fallback_response = generate_fallback_response(message)
+            return jsonify({
+                'response': fallback_response,
+                'rag_enhanced': False,
+                'response_time': round(elapsed, 2),
+                'fallback_reason': 'overloaded' if isinstance(e, PoolFullError) else 'timeout',
+                'state': state,
+                'system': 'fallback'
+            })
 
         except Exception as e:
             elapsed = time.time() - start_time
@@ -87,6 +131,220 @@ def chat():
         })
 
 
+@chat_bp.route('/batch', methods=['POST'])
+def batch_chat():
+    """
+    Answer many questions in one request.
+    Body: {"items": [{"question": "...", "state": "..."}, ...], "state": default, "strategy": ..., "timeout": s}
+    Duplicate questions are answered once, retrieval for the whole batch runs in one
+    vectorized pass, and generations go through the shared LLM pool a few at a time.
+    Results come back in request order; items not finished by the deadline get
+    the extractive answer with status 'partial'.
+    """
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'invalid_body', 'results': []}), 400
+    default_state = data.get('state') or 'Washington'
+    if not isinstance(default_state, str):
+        return jsonify({'error': 'invalid_state', 'state': default_state, 'results': []}), 400
+    strategy = data.get('strategy') if data.get('strategy') in RETRIEVAL_STRATEGIES else None
+    items = data.get('items', data.get('questions', []))
+
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'no_items', 'results': []}), 400
+    if len(items) > CHAT_BATCH_MAX_ITEMS:
+        return jsonify({'error': 'too_many_items', 'max_items': CHAT_BATCH_MAX_ITEMS, 'results': []}), 400
+
+    timeout = _seconds(data.get('timeout') or None, CHAT_BATCH_TIMEOUT)
+    if timeout is None:
+        return jsonify({'error': 'invalid_timeout', 'timeout': data.get('timeout'), 'results': []}), 400
+    for index, item in enumerate(items):
+        fields = [item.get('question'), item.get('message'), item.get('state')] if isinstance(item, dict) else []
+        if not isinstance(item, (str, dict)) or not all(field is None or isinstance(field, str) for field in fields):
+            return jsonify({'error': 'invalid_item', 'index': index, 'results': []}), 400
+
+    start_time = time.time()
+    deadline = Deadline(min(timeout, CHAT_BATCH_TIMEOUT))
+
+    # Normalize items and dedupe on the same key single-flight coalesces on
+    questions, unique, owner = [], [], {}
+    for item in items:
+        if isinstance(item, str):
+            item = {'question': item}
+        message = (item.get('question') or item.get('message') or '').strip()
+        state = (item.get('state') or default_state).lower()
+        key = (rag_agent.registry.resolve(state) or state, normalize_question(message))
+        if message and key not in owner:
+            owner[key] = len(unique)
+            unique.append((message, state))
+        questions.append((message, state, owner.get(key) if message else None))
+
+    retrieval = rag_agent.search_documents_batch(unique, CHAT_CANDIDATE_BUDGET, strategy)
+
+    # Schedule generations on the shared pool, keeping at most CHAT_BATCH_IN_FLIGHT queued or running
+    answers, finished_at, errors = {}, {}, {}
+    waiting = deque(range(len(unique)))
+    running = {}
+    while (waiting or running) and not deadline.expired():
+        while waiting and len(running) < CHAT_BATCH_IN_FLIGHT:
+            message, state = unique[waiting[0]]
+            try:
+                future, _ = rag_agent.submit_chat(llm_pool, message, state, CHAT_CANDIDATE_BUDGET, strategy, deadline)
+            except PoolFullError:
+                break
+            running[future] = waiting.popleft()
+        if not running:
+            time.sleep(deadline.cap(0.1))  # pool saturated by other traffic - retry shortly
+            continue
+        done, _ = concurrent.futures.wait(running, timeout=deadline.remaining(),
+                                          return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            position = running.pop(future)
+            finished_at[position] = time.time()
+            try:
+                answers[position] = future.result()
+            except Exception as e:
+                errors[position] = str(e)
+
+    results, first_index = [], {}
+    for index, (message, state, position) in enumerate(questions):
+        entry = {'index': index, 'question': message, 'state': state}
+        if position is None:
+            results.append(dict(entry, status='error', error='no_question', response=None, rag_enhanced=False))
+            continue
+        if first_index.setdefault(position, index) != index:
+            entry['duplicate_of'] = first_index[position]
+        if position in answers:
+            result = answers[position]
+            results.append(dict(
+                entry,
+                status='ok' if result.get('source') != 'error' else 'error',
+                response=result['response'],
+                source=result.get('source'),
+                rag_enhanced=result.get('rag_enhanced', True),
+                contexts_used=result.get('contexts_used', 0),
+                response_time=round(finished_at[position] - start_time, 2),
+                stage_timings_ms=result.get('stage_timings_ms', {})
+            ))
+        else:
+            # Not answered in time (or failed) - fall back to the extractive answer from the batch retrieval
+            chunks = retrieval['chunks'][position]
+            response = rag_agent._extract_detailed_answer(message, chunks, state) if chunks else generate_fallback_response(message)
+            results.append(dict(
+                entry,
+                status='error' if position in errors else 'partial',
+                response=response,
+                source='extractive' if chunks else 'fallback',
+                rag_enhanced=bool(chunks),
+                contexts_used=len(chunks),
+                response_time=round(finished_at.get(position, time.time()) - start_time, 2),
+                **({'error': errors[position]} if position in errors else {})
+            ))
+
+    return jsonify({
+        'results': results,
+        'items': len(questions),
+        'unique': len(unique),
+        'completed': len(answers),
+        'partial': sum(1 for result in results if result['status'] == 'partial'),
+        'retrieval': {key: retrieval[key] for key in ('cached', 'searched', 'ms')},
+        'response_time': round(time.time() - start_time, 2),
+        'deadline': deadline.to_dict(),
+        'system': 'lightweight_rag'
+    })
+
+
+@chat_bp.route('/compare', methods=['POST'])
+def compare_chat():
+    """
+    Compare a rule across states - e.g. "How does California's right-on-red rule differ from Washington's?"
+    Body: {"message": "...", "states": ["california", "washington"]} (states default to the ones named in the message).
+    Each state's manual is searched concurrently and one LLM call writes the comparison.
+    """
+    try:
+        data = request.json or {}
+        message = data.get('message', data.get('prompt', ''))
+        strategy = data.get('strategy') if data.get('strategy') in RETRIEVAL_STRATEGIES else None
+
+        if not message:
+            return jsonify({
+                'response': "Please ask me a driving question!",
+                'rag_enhanced': False,
+                'error': 'no_message'
+            }), 400
+
+        requested = data.get('states') or rag_agent.registry.states_in(message)
+        states = list(dict.fromkeys(key for key in (rag_agent.registry.resolve(state) for state in requested) if key))
+        if len(states) < 2:
+            return jsonify({
+                'response': "Name at least two states to compare, e.g. California and Washington.",
+                'rag_enhanced': False,
+                'error': 'need_two_states',
+                'states': states
+            }), 400
+        if len(states) > COMPARE_MAX_STATES:
+            return jsonify({
+                'response': f"I can compare up to {COMPARE_MAX_STATES} states at a time.",
+                'rag_enhanced': False,
+                'error': 'too_many_states',
+                'states': states
+            }), 400
+
+        start_time = time.time()
+        deadline = Deadline(CHAT_TIMEOUT)
+
+        try:
+            result = llm_pool.run(rag_agent.compare_states, message, states, CHAT_CANDIDATE_BUDGET, strategy,
+                                  deadline, timeout=deadline.remaining() + DEADLINE_GRACE)
+            elapsed = time.time() - start_time
+            return jsonify({
+                'response': result['response'],
+                'rag_enhanced': result.get('rag_enhanced', True),
+                'response_time': round(elapsed, 2),
+                'states': result['states'],
+                'per_state': result['per_state'],
+                'generator': result.get('generator'),
+                'llm_calls': result.get('llm_calls', 0),
+                'system': 'lightweight_rag',
+                'stage_timings_ms': result.get('stage_timings_ms', {})
+            })
+
+        except (concurrent.futures.TimeoutError, PoolFullError) as e:
+            elapsed = time.time() - start_time
+            fallback_response = generate_fallback_response(message)
+            return jsonify({
+                'response': fallback_response,
+                'rag_enhanced': False,
+                'response_time': round(elapsed, 2),
+                'fallback_reason': 'overloaded' if isinstance(e, PoolFullError) else 'timeout',
+                'states': states,
+                'system': 'fallback'
+            })
+
+        except Exception as e:
+            elapsed = time.time() - start_time
+            fallback_response = generate_fallback_response(message)
+            return jsonify({
+                'response': fallback_response,
+                'rag_enhanced': False,
+                'response_time': round(elapsed, 2),
+                'fallback_reason': 'error',
+                'error': str(e),
+                'states': states,
+                'system': 'fallback'
+            })
+
+    except Exception as e:
+        return jsonify({
+            'response': "I'm here to help with driving questions.",
+            'rag_enhanced': False,
+            'response_time': 0,
+            'fallback_reason': 'system_error',
+            'error': str(e),
+            'system': 'emergency_fallback'
+        })
+
+
 @chat_bp.route('/quick', methods=['POST'])
 def quick_chat():
     """
@@ -96,6 +354,7 @@ def quick_chat():
         data = request.json
         message = data.get('message', '')
         state = data.get('state', 'Washington').lower()
+        strategy = data.get('strategy') if data.get('strategy') in RETRIEVAL_STRATEGIES else None
 
         if not message:
             return jsonify({
@@ -104,27 +363,29 @@ def quick_chat():
             }), 400
 
         start_time = time.time()
+        deadline = Deadline(QUICK_CHAT_TIMEOUT)
         try:
-            with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-                future = executor.submit(rag_agent.chat_with_rag_fast, message, state)
-                result = future.result(timeout=10.0)
-                elapsed = time.time() - start_time
-                return jsonify({
-                    'response': result['response'],
-                    'rag_enhanced': result.get('rag_enhanced', True),
-                    'response_time': round(elapsed, 2),
-                    'mode': 'quick',
-                    'state': state,
-                    'contexts_used': result.get('contexts_used', 0)
-                })
-        except concurrent.futures.TimeoutError:
+            # Identical questions in flight are joined before a pool slot is taken
+            future, _ = rag_agent.submit_chat(llm_pool, message, state, QUICK_CANDIDATE_BUDGET, strategy, deadline)
+            result = llm_pool.wait(future, timeout=deadline.remaining() + DEADLINE_GRACE)
+            elapsed = time.time() - start_time
+            return jsonify({
+                'response': result['response'],
+                'rag_enhanced': result.get('rag_enhanced', True),
+                'response_time': round(elapsed, 2),
+                'mode': 'quick',
+                'state': state,
+                'contexts_used': result.get('contexts_used', 0),
+                'stage_timings_ms': result.get('stage_timings_ms', {})
+            })
+        except (concurrent.futures.TimeoutError, PoolFullError) as e:
             elapsed = time.time() - start_time
             fallback_response = generate_fallback_response(message)
             return jsonify({
                 'response': fallback_response,
                 'rag_enhanced': False,
                 'response_time': round(elapsed, 2),
-                'mode': 'quick_fallback',
+                'mode': 'quick_overloaded' if isinstance(e, PoolFullError) else 'quick_fallback',
                 'state': state
             })
         except Exception as e:
@@ -148,6 +409,161 @@ def quick_chat():
         })
 
 
+def _stream_into(followup, message: str, state: str, strategy: str, deadline: Deadline):
+    """Generate the LLM answer into a followup's event log (runs on the LLM pool)"""
+    try:
+        for event in rag_agent.stream_chat(message, state, CHAT_CANDIDATE_BUDGET, strategy, deadline):
+            followup.push(event)
+    except Exception as e:
+        followup.fail(str(e))
+
+
+def _run_followup(followup, message: str, state: str, strategy: str):
+    """Background phase two: generate the LLM answer into the followup's event log"""
+    try:
+        _stream_into(followup, message, state, strategy, Deadline(CHAT_TIMEOUT))
+    finally:
+        followups.record(followup)
+
+
+def _two_phase_chat(message: str, state: str, strategy: str):
+    """
+    Phase one: answer right away with the extractive answer and a followup_id.
+    Phase two runs on the LLM pool; fetch it from /followup/<id> or /followup/<id>/stream.
+    """
+    start_time = time.time()
+    result = rag_agent.extractive_answer(message, state, CHAT_CANDIDATE_BUDGET, strategy)
+    followup_id = None
+    if not result.pop('final'):
+        followup = followups.create()
+        try:
+            llm_pool.submit(_run_followup, followup, message, state, strategy)
+            followup_id = followup.id
+        except PoolFullError:
+            followup.fail('overloaded')
+            followups.record(followup)
+    return jsonify(dict(
+        result,
+        response_time=round(time.time() - start_time, 2),
+        system='lightweight_rag',
+        phase=1,
+        followup_id=followup_id,
+        followup_url=f"/api/chat/followup/{followup_id}" if followup_id else None
+    ))
+
+
+@chat_bp.route('/followup/<followup_id>', methods=['GET'])
+def get_followup(followup_id):
+    """
+    Phase two of a two-phase answer. `?wait=<seconds>` long-polls until it's ready.
+    """
+    followup = followups.get(followup_id)
+    if followup is None:
+        return jsonify({'error': 'unknown_or_expired_followup', 'followup_id': followup_id}), 404
+    wait = _seconds(request.args.get('wait'), 0)
+    if wait is None:
+        return jsonify({'error': 'invalid_wait', 'wait': request.args.get('wait'), 'followup_id': followup_id}), 400
+    wait = min(wait, FOLLOWUP_MAX_WAIT)
+    if wait > 0:
+        followup.wait(wait)
+    return jsonify(followup.to_dict())
+
+
+@chat_bp.route('/followup/<followup_id>/stream', methods=['GET'])
+def stream_followup(followup_id):
+    """
+    Phase two as Server-Sent Events - replays tokens generated so far, then follows along
+    """
+    followup = followups.get(followup_id)
+    if followup is None:
+        return jsonify({'error': 'unknown_or_expired_followup', 'followup_id': followup_id}), 404
+
+    def generate():
+        index = 0
+        deadline = Deadline(CHAT_TIMEOUT + DEADLINE_GRACE)
+        while not deadline.expired():
+            events, finished = followup.events_since(index, timeout=deadline.cap(1.0))
+            for event in events:
+                yield _sse(event['event'], event['data'])
+            index += len(events)
+            if finished:
+                if followup.status == 'failed':
+                    yield _sse('error', {'error': followup.error})
+                return
+            if not events:
+                yield ": keep-alive\n\n"
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+def _sse(event: str, data: dict) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@chat_bp.route('/stream', methods=['GET', 'POST'])
+def stream_chat():
+    """
+    Streaming chat endpoint - Server-Sent Events, first byte right after retrieval.
+    Events: `context` (retrieval done), `token` (answer text), `done` (final answer + timings)
+    """
+    data = request.get_json(silent=True) or request.args
+    message = data.get('message', data.get('prompt', ''))
+    state = data.get('state', 'Washington').lower()
+    strategy = data.get('strategy') if data.get('strategy') in RETRIEVAL_STRATEGIES else None
+
+    if not message:
+        return jsonify({
+            'response': "Please ask me a driving question!",
+            'error': 'no_message'
+        }), 400
+
+    # Generate on the shared pool like every other chat endpoint; this response relays the events
+    deadline = Deadline(CHAT_TIMEOUT)
+    channel = Followup()
+    try:
+        llm_pool.submit(_stream_into, channel, message, state, strategy, deadline)
+    except PoolFullError:
+        channel = None
+
+    def fallback(reason: str, error: str = None):
+        fallback_response = generate_fallback_response(message)
+        yield _sse('token', {'text': fallback_response})
+        yield _sse('done', dict({
+            'response': fallback_response,
+            'rag_enhanced': False,
+            'fallback_reason': reason,
+            'state': state
+        }, **({'error': error} if error else {})))
+
+    def generate():
+        if channel is None:
+            yield from fallback('overloaded')
+            return
+        index = 0
+        relay = Deadline(deadline.remaining() + DEADLINE_GRACE)
+        while not relay.expired():
+            events, finished = channel.events_since(index, timeout=relay.cap(1.0))
+            for event in events:
+                yield _sse(event['event'], event['data'])
+            index += len(events)
+            if finished:
+                if channel.status == 'failed':
+                    yield from fallback('error', channel.error)
+                return
+            if not events:
+                yield ": keep-alive\n\n"
+        yield from fallback('timeout')
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # don't let a proxy buffer the stream
+    })
+
+
 @chat_bp.route('/status', methods=['GET'])
 def chat_status():
     """
@@ -163,8 +579,14 @@ def chat_status():
             'endpoints': {
                 'chat': '/api/chat/',
                 'quick_chat': '/api/chat/quick',
-                'status': '/api/chat/status'
-            }
+                'batch': '/api/chat/batch',
+                'compare': '/api/chat/compare',
+                'stream': '/api/chat/stream',
+                'followup': '/api/chat/followup/<followup_id>',
+                'status': '/api/chat/status',
+                'metrics': '/api/chat/metrics'
+            },
+            'states': rag_agent.registry.states()
         })
     except Exception as e:
         return jsonify({
@@ -174,6 +596,30 @@ def chat_status():
         })
 
 
+@chat_bp.route('/metrics', methods=['GET'])
+def chat_metrics():
+    """
+    Retrieval metrics for dashboards (per-state corpus loads, hits, evictions, cache hit rate)
+    """
+    try:
+        return jsonify({
+            'corpus': rag_agent.registry.stats(),
+            'retrieval_cache': rag_agent.retrieval_cache.stats(),
+            'answer_cache': rag_agent.answer_cache.stats(),
+            'semantic_cache': rag_agent.semantic_cache.stats(),
+            'ollama': rag_agent.ollama.stats(),
+            'coalescing': rag_agent.single_flight.stats(),
+            'llm_pool': llm_pool.stats(),
+            'followups': followups.stats(),
+            'timestamp': time.time()
+        })
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'error': str(e)
+        }), 500
+
+
 @chat_bp.route('/test', methods=['POST'])
 def test_chat():
     """
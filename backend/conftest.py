@@ -0,0 +1,14 @@
+"""
+Test setup: keep the suite offline and away from the production caches
+"""
+
+import os
+import tempfile
+
+# Manuals and index artifacts are found relative to backend/, where the app runs
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+# Read at import time by answer_cache / lightweight_rag, so set before any test imports them
+_scratch = tempfile.mkdtemp(prefix='drivesmart-tests-')
+os.environ.setdefault('RAG_ANSWER_CACHE_PATH', os.path.join(_scratch, 'answer_cache.db'))
+os.environ.setdefault('OLLAMA_ENABLED', 'false')
@@ -0,0 +1,80 @@
+"""
+Context Packer - Token-Budgeted Prompt Context
+==============================================
+Packs retrieved chunks into the RAG prompt under a fixed token budget:
+near-identical chunks are dropped, long chunks are trimmed to the sentences
+that mention the query's terms, and chunks are taken in rank order until the
+budget is full. Smaller, denser prompts evaluate faster on CPU-only Ollama.
+"""
+
+import os
+import re
+from typing import List, Set
+from rapidfuzz import fuzz
+from search_index import query_terms, tokenize
+
+CONTEXT_TOKEN_BUDGET = int(os.environ.get('RAG_CONTEXT_TOKENS', 400))
+DUPLICATE_THRESHOLD = 90  # token_set_ratio at which two chunks count as the same text
+CHARS_PER_TOKEN = 4  # rough average for English text with Mistral's tokenizer
+
+_SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (no tokenizer needed)"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence for sentence in _SENTENCE_RE.split(text) if sentence.strip()]
+
+
+def trim_to_relevant(text: str, terms: Set[str], max_tokens: int, keep_unrelated: bool = True) -> str:
+    """
+    Keep the sentences that share the most terms with the query (in their
+    original order) within `max_tokens`. Returns '' if nothing relevant fits.
+    """
+    sentences = split_sentences(text)
+    scored = sorted(
+        ((len(terms.intersection(tokenize(sentence))), -position, sentence)
+         for position, sentence in enumerate(sentences)),
+        reverse=True
+    )
+    chosen, used = [], 0
+    for score, negative_position, sentence in scored:
+        if score == 0 and (chosen or not keep_unrelated):
+            break
+        cost = estimate_tokens(sentence)
+        if used + cost <= max_tokens:
+            chosen.append((-negative_position, sentence))
+            used += cost
+    if not chosen and scored and (scored[0][0] > 0 or keep_unrelated) and max_tokens > 0:
+        # Best sentence alone is over budget - keep its leading words
+        words = scored[0][2].split()
+        return ' '.join(words[:max(1, max_tokens * CHARS_PER_TOKEN // 6)])
+    return ' '.join(sentence for _, sentence in sorted(chosen))
+
+
+def pack_context(query: str, chunks: List[str], budget_tokens: int = None) -> List[str]:
+    """Deduplicated, trimmed excerpts (in rank order) that fit the token budget"""
+    budget = budget_tokens or CONTEXT_TOKEN_BUDGET
+    terms = set(query_terms(query.lower()))
+    packed, packed_lower = [], []
+    used = 0
+    for rank, chunk in enumerate(chunks):
+        remaining = budget - used
+        if remaining <= 0:
+            break
+        text = ' '.join(chunk.split())
+        text_lower = text.lower()
+        if any(fuzz.token_set_ratio(text_lower, other) >= DUPLICATE_THRESHOLD for other in packed_lower):
+            continue
+        # Long chunks (or ones that don't fit) are cut down to their query-relevant sentences
+        if estimate_tokens(text) > min(remaining, budget // 2):
+            text = trim_to_relevant(text, terms, min(remaining, budget // 2), keep_unrelated=rank == 0)
+        if not text:
+            continue
+        packed.append(text)
+        packed_lower.append(text.lower())
+        used += estimate_tokens(text)
+    return packed
@@ -0,0 +1,404 @@
+"""
+Corpus Registry - Shared State Manual Indexes
+=============================================
+Process-wide, thread-safe registry of parsed state manuals and their search
+indexes. Every RAG agent borrows from the same registry, so each manual is
+read and chunked once per process. Prebuilt index artifacts are mmapped when
+present; the text manuals are only parsed as a fallback.
+
+States come from the staterules manifest and are loaded on first request.
+A memory budget evicts the least-recently-used indexes, so memory scales
+with the states students are actually asking about.
+"""
+
+import glob
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+from search_index import StateIndex
+from index_artifact import MappedStateIndex, artifact_path, source_stamp
+from dense_retriever import DenseIndex
+from ann_index import AnnIndex
+from sentence_index import SentenceIndex
+
+# Try multiple possible locations for Docker deployment
+STATERULES_DIRS = [
+    '../frontend/assets/staterules',  # Local development
+    './staterules',                   # Docker deployment
+    'staterules',                     # Simple path
+    '.'                               # Direct files
+]
+MANIFEST_NAME = 'manifest.json'
+
+DEFAULT_STATE = 'washington'
+MEMORY_BUDGET_MB = float(os.environ.get('RAG_CORPUS_BUDGET_MB', 128))
+PRELOAD_STATES = os.environ.get('RAG_PRELOAD_STATES', DEFAULT_STATE)
+
+
+def state_key(name: str) -> str:
+    """Normalize a state name ('New Jersey', 'new_jersey') to its catalog key"""
+    return re.sub(r'[^a-z0-9]', '', (name or '').lower())
+
+
+def find_manual(filepaths: List[str]) -> Optional[str]:
+    """First candidate path that exists"""
+    for filepath in filepaths:
+        if os.path.exists(filepath):
+            return filepath
+    return None
+
+
+def read_manual_chunks(filepath: str) -> List[str]:
+    """Read a manual and break it into searchable chunks"""
+    with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
+        content = f.read()
+    return [chunk.strip() for chunk in content.split('\n') if len(chunk.strip()) > 50]
+
+
+def load_catalog(dirs: List[str] = None) -> Dict[str, Dict]:
+    """
+    Build the state catalog from the first manifest found. Without a manifest,
+    every .txt manual in the first staterules directory becomes a state.
+    """
+    dirs = dirs or STATERULES_DIRS
+    for directory in dirs:
+        manifest_path = os.path.join(directory, MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            continue
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except Exception as e:
+            print(f"❌ Error reading {manifest_path}: {e}")
+            continue
+
+        catalog = {}
+        for key, entry in manifest.get('states', {}).items():
+            entry = dict(entry)
+            entry['path'] = find_manual([os.path.join(d, entry['file']) for d in [directory] + dirs])
+            catalog[state_key(key)] = entry
+        return catalog
+
+    for directory in dirs:
+        manuals = sorted(glob.glob(os.path.join(directory, '*.txt')))
+        if manuals:
+            return {
+                state_key(os.path.splitext(os.path.basename(path))[0]): {
+                    'name': os.path.splitext(os.path.basename(path))[0],
+                    'file': os.path.basename(path),
+                    'path': path,
+                    'aliases': []
+                }
+                for path in manuals
+            }
+    return {}
+
+
+def estimate_index_bytes(index: StateIndex) -> int:
+    """Rough resident size of an index, used for the memory budget"""
+    if isinstance(index, MappedStateIndex):
+        # Mapped pages are shared and reclaimable, but count them so the budget stays conservative
+        return os.path.getsize(index.path) + len(index._vocab) * 120
+    text_bytes = sum(len(chunk) + 49 for chunk in index.chunks) * 2
+    postings_bytes = sum(docs.nbytes + tfs.nbytes + 200 for docs, tfs in index.postings.values())
+    array_bytes = index.doc_lengths.nbytes + index.digit_flags.nbytes \
+        + index.phrase_bits.nbytes + index.term_bits.nbytes
+    return text_bytes + postings_bytes + array_bytes
+
+
+class CorpusRegistry:
+    """
+    Lazily loads state manuals on first use and hands out shared, read-only indexes
+    """
+
+    def __init__(self, catalog: Dict[str, Dict] = None, memory_budget_mb: float = None):
+        self._catalog = catalog
+        self.memory_budget = int((memory_budget_mb or MEMORY_BUDGET_MB) * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._indexes: 'OrderedDict[str, StateIndex]' = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._dense: Dict[str, DenseIndex] = {}
+        self._ann: Dict[str, AnnIndex] = {}
+        self._sentences: Dict[str, SentenceIndex] = {}
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._stamps: Dict[str, Optional[tuple]] = {}  # (size, mtime) of each state's manual when last loaded
+        self._counters: Dict[str, Dict] = {}
+        self._reload_listeners: List[Callable[[str], None]] = []
+
+    @property
+    def catalog(self) -> Dict[str, Dict]:
+        if self._catalog is None:
+            with self._lock:
+                if self._catalog is None:
+                    self._catalog = load_catalog()
+                    print(f"State catalog: {', '.join(self._catalog) or 'empty'}")
+        return self._catalog
+
+    def resolve(self, state: str) -> Optional[str]:
+        """Catalog key for a state name, key or alias"""
+        key = state_key(state or DEFAULT_STATE)
+        if key in self.catalog:
+            return key
+        for catalog_key, entry in self.catalog.items():
+            if key in (state_key(alias) for alias in entry.get('aliases', [])) \
+                    or key == state_key(entry.get('name', '')):
+                return catalog_key
+        return None
+
+    def states_in(self, text: str) -> List[str]:
+        """Catalog keys of the states named in free text, in order of first mention"""
+        text_lower = (text or '').lower()
+        positions = {}
+        for key, entry in self.catalog.items():
+            match = re.search(r'\b' + re.escape(entry.get('name', key).lower()) + r'\b', text_lower)
+            if match:
+                positions[key] = match.start()
+        return sorted(positions, key=positions.get)
+
+    def _counter(self, key: str) -> Dict:
+        return self._counters.setdefault(key, {
+            'loads': 0, 'hits': 0, 'evictions': 0, 'failures': 0, 'last_load_ms': None
+        })
+
+    def get_index(self, state: str) -> Optional[StateIndex]:
+        """Shared index for a state, loading it on first request; None if unavailable"""
+        key = self.resolve(state)
+        if key is None:
+            return None
+
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self._indexes.move_to_end(key)
+                self._counter(key)['hits'] += 1
+                return index
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Load outside the registry lock so other states stay servable
+        with load_lock:
+            with self._lock:
+                index = self._indexes.get(key)
+                if index is not None:
+                    self._indexes.move_to_end(key)
+                    self._counter(key)['hits'] += 1
+                    return index
+
+            start = time.time()
+            stamp = self._source_stamp(key)
+            index = self._load_state(key)
+            sentences = self._segment(key, index) if index is not None else None
+            with self._lock:
+                counter = self._counter(key)
+                if index is None:
+                    counter['failures'] += 1
+                    return None
+                # A manual edited since it was last loaded (e.g. while evicted) makes cached results stale
+                changed = key in self._stamps and self._stamps[key] != stamp
+                self._stamps[key] = stamp
+                counter['loads'] += 1
+                counter['last_load_ms'] = round((time.time() - start) * 1000, 2)
+                self._indexes[key] = index
+                if sentences is not None:
+                    self._sentences[key] = sentences
+                self._sizes[key] = self._state_bytes(key)
+                self._evict(keep=key)
+            if changed:
+                print(f"🔄 {key} manual changed on disk - invalidating cached results")
+                self._notify_reload(key)
+            return index
+
+    def _source_stamp(self, key: str) -> Optional[tuple]:
+        source_path = self.catalog[key].get('path')
+        try:
+            return tuple(source_stamp(source_path)) if source_path else None
+        except OSError:
+            return None
+
+    def get_dense_index(self, state: str) -> Optional[DenseIndex]:
+        """Shared LSA embeddings for a state, built from its index on first use"""
+        index = self.get_index(state)
+        if index is None:
+            return None
+        key = self.resolve(state)
+        with self._lock:
+            dense = self._dense.get(key)
+            if dense is not None and dense.index is index:
+                return dense
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                dense = self._dense.get(key)
+                if dense is not None and dense.index is index:
+                    return dense
+            dense = DenseIndex(index)
+            print(f"✅ Embedded {key}: {len(dense.vectors)} chunk vectors in {dense.build_ms:.0f}ms")
+            with self._lock:
+                self._dense[key] = dense
+                if key in self._indexes:
+                    self._sizes[key] = self._state_bytes(key)
+                    self._evict(keep=key)
+            return dense
+
+    def get_ann_index(self, state: str) -> Optional[AnnIndex]:
+        """Memory-mapped IVF index for a state; None if it hasn't been built (see ann_index.py)"""
+        index = self.get_index(state)
+        if index is None:
+            return None
+        key = self.resolve(state)
+        with self._lock:
+            ann = self._ann.get(key)
+            if ann is not None:
+                return ann
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                ann = self._ann.get(key)
+                if ann is not None:
+                    return ann
+            ann = AnnIndex.open(key, self.catalog[key].get('path'), len(index))
+            if ann is None:
+                return None
+            print(f"✅ Mapped ANN {key}: {ann.meta['chunks']} vectors in {ann.meta['nlist']} lists")
+            with self._lock:
+                self._ann[key] = ann
+                if key in self._indexes:
+                    self._sizes[key] = self._state_bytes(key)
+                    self._evict(keep=key)
+            return ann
+
+    def get_sentence_index(self, state: str) -> Optional[SentenceIndex]:
+        """Pre-segmented sentences of a state's chunks (built when the manual loads)"""
+        key = self.resolve(state)
+        if key is None:
+            return None
+        with self._lock:
+            sentences = self._sentences.get(key)
+        if sentences is None and self.get_index(key) is not None:
+            with self._lock:
+                sentences = self._sentences.get(key)
+        return sentences
+
+    @staticmethod
+    def _segment(key: str, index: StateIndex) -> Optional[SentenceIndex]:
+        try:
+            sentences = SentenceIndex(index)
+            print(f"✅ Segmented {key}: {len(sentences)} sentences in {sentences.build_ms:.0f}ms")
+            return sentences
+        except Exception as e:
+            print(f"❌ Error segmenting {key} sentences: {e}")
+            return None
+
+    def _load_state(self, key: str) -> Optional[StateIndex]:
+        """Map the state's prebuilt artifact, or parse its manual"""
+        source_path = self.catalog[key].get('path')
+        try:
+            index = MappedStateIndex.open(key, artifact_path(key), source_path)
+            if index is not None:
+                print(f"✅ Mapped {key}: {len(index)} text chunks from {index.path}")
+                return index
+        except Exception as e:
+            print(f"❌ Error mapping {key} index artifact: {e}")
+
+        if not source_path:
+            print(f"⚠️  Could not load {key} manual from any location")
+            return None
+        try:
+            chunks = read_manual_chunks(source_path)
+            print(f"✅ Loaded {key}: {len(chunks)} text chunks from {source_path}")
+            return StateIndex(key, chunks)
+        except Exception as e:
+            print(f"❌ Error loading {source_path}: {e}")
+            return None
+
+    def add_reload_listener(self, listener: Callable[[str], None]):
+        """Call `listener(state_key)` when a state's manual is reloaded or found changed on disk at load"""
+        self._reload_listeners.append(listener)
+
+    def _notify_reload(self, key: str):
+        for listener in self._reload_listeners:
+            try:
+                listener(key)
+            except Exception as e:
+                print(f"Reload listener failed for {key}: {e}")
+
+    def reload(self, state: str) -> Optional[StateIndex]:
+        """Drop a state's cached structures and load its manual again (e.g. after a manual update)"""
+        key = self.resolve(state)
+        if key is None:
+            return None
+        with self._lock:
+            self._indexes.pop(key, None)
+            self._sizes.pop(key, None)
+            self._dense.pop(key, None)
+            self._ann.pop(key, None)
+            self._sentences.pop(key, None)
+            self._stamps.pop(key, None)  # notified below, changed or not
+        index = self.get_index(key)
+        self._notify_reload(key)
+        return index
+
+    def _state_bytes(self, key: str) -> int:
+        """Estimated memory of everything held for a loaded state (caller holds the lock)"""
+        parts = [self._dense.get(key), self._ann.get(key), self._sentences.get(key)]
+        return estimate_index_bytes(self._indexes[key]) + sum(part.nbytes for part in parts if part is not None)
+
+    def _evict(self, keep: str):
+        """Drop least-recently-used indexes until under budget (caller holds the lock)"""
+        while sum(self._sizes.values()) > self.memory_budget and len(self._indexes) > 1:
+            key = next(iter(self._indexes))
+            if key == keep:
+                self._indexes.move_to_end(key)
+                continue
+            del self._indexes[key]
+            del self._sizes[key]
+            self._dense.pop(key, None)
+            self._ann.pop(key, None)
+            self._sentences.pop(key, None)
+            self._counter(key)['evictions'] += 1
+            print(f"♻️  Evicted {key} index (memory budget {self.memory_budget // (1024 * 1024)} MB)")
+
+    def preload(self, states: List[str] = None, dense: bool = False):
+        """Load the given states up front (call before workers fork to share mapped pages)"""
+        if states is None:
+            states = [s.strip() for s in PRELOAD_STATES.split(',') if s.strip()]
+        for state in states:
+            if dense:
+                self.get_dense_index(state)
+            else:
+                self.get_index(state)
+
+    def states(self) -> List[str]:
+        """Every state in the catalog whose manual can be found"""
+        return [key for key, entry in self.catalog.items() if entry.get('path')]
+
+    def stats(self) -> Dict:
+        """Per-state load/hit counters and memory usage for monitoring"""
+        catalog = self.catalog
+        with self._lock:
+            return {
+                'memory_budget_bytes': self.memory_budget,
+                'memory_used_bytes': sum(self._sizes.values()),
+                'loaded_states': list(self._indexes),
+                'embedded_states': list(self._dense),
+                'ann_states': list(self._ann),
+                'sentences': {key: len(sentences) for key, sentences in self._sentences.items()},
+                'states': {
+                    key: dict(self._counter(key), loaded=key in self._indexes,
+                              bytes=self._sizes.get(key, 0))
+                    for key in catalog
+                }
+            }
+
+
+# Process-wide registry shared by every agent
+registry = CorpusRegistry()
+
+
+def get_registry() -> CorpusRegistry:
+    return registry
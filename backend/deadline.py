@@ -0,0 +1,43 @@
+"""
+Deadline - Request Time Budget Shared Across Pipeline Stages
+============================================================
+Created once per chat request from the endpoint's SLO and passed down through
+retrieval and generation, so every stage can size its work to the time that
+is actually left instead of each layer applying its own fixed timeout.
+"""
+
+import time
+from typing import Optional
+
+
+class Deadline:
+    """
+    Absolute point in time a request must answer by
+    """
+
+    def __init__(self, budget_seconds: float):
+        self.budget = budget_seconds
+        self.started_at = time.time()
+        self.expires_at = self.started_at + budget_seconds
+
+    @classmethod
+    def of(cls, deadline: Optional['Deadline'], default_seconds: float) -> 'Deadline':
+        """The given deadline, or a fresh one with the default budget"""
+        return deadline if deadline is not None else cls(default_seconds)
+
+    def remaining(self) -> float:
+        """Seconds left (never negative)"""
+        return max(0.0, self.expires_at - time.time())
+
+    def elapsed(self) -> float:
+        return time.time() - self.started_at
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def cap(self, seconds: float) -> float:
+        """`seconds`, but no more than what's left"""
+        return min(seconds, self.remaining())
+
+    def to_dict(self) -> dict:
+        return {'budget_s': self.budget, 'remaining_s': round(self.remaining(), 3)}
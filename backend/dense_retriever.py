@@ -0,0 +1,240 @@
+"""
+Dense Retriever - Local Vector Search over Manual Chunks
+=======================================================
+Optional dense retrieval mode built entirely with NumPy - no external service.
+Chunks are embedded with TF-IDF + truncated SVD (latent semantic analysis), so
+paraphrased questions that share few exact words with the manual can still
+match chunks about the same topic.
+
+Retrieval is a single matrix-vector product against a float32 (or int8)
+chunk matrix, with argpartition for the top-k.
+
+Benchmark against the lexical scorer:
+    python dense_retriever.py [state]
+"""
+
+import json
+import math
+import os
+import sys
+import time
+from typing import Dict, List
+import numpy as np
+from rapidfuzz import fuzz
+from search_index import StateIndex, STOPWORDS, tokenize
+
+DENSE_DIMENSIONS = int(os.environ.get('RAG_DENSE_DIMS', 128))
+DENSE_QUANTIZE = os.environ.get('RAG_DENSE_INT8', 'false').lower() == 'true'
+MIN_DOCUMENT_FREQUENCY = 2
+MIN_SIMILARITY = 0.05
+
+
+def _sparse_matmul(rows: np.ndarray, cols: np.ndarray, vals: np.ndarray, dense: np.ndarray, n_rows: int) -> np.ndarray:
+    """(sparse COO matrix) @ dense"""
+    out = np.zeros((n_rows, dense.shape[1]), dtype=np.float64)
+    np.add.at(out, rows, vals[:, None] * dense[cols])
+    return out
+
+
+def embed_query(text: str, term_ids: Dict[str, int], idf: np.ndarray, components: np.ndarray) -> np.ndarray:
+    """Project a query's TF-IDF vector into the LSA space and normalize it"""
+    weights = {}
+    for token in tokenize(text):
+        term_id = term_ids.get(token)
+        if term_id is not None:
+            weights[term_id] = weights.get(term_id, 0) + 1
+    vector = np.zeros(components.shape[1], dtype=np.float32)
+    for term_id, tf in weights.items():
+        vector += (1 + math.log(tf)) * idf[term_id] * components[term_id]
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+class DenseIndex:
+    """
+    LSA embeddings for one state's chunks, derived from its inverted index
+    """
+
+    def __init__(self, index: StateIndex, dimensions: int = DENSE_DIMENSIONS,
+                 quantize: bool = DENSE_QUANTIZE, seed: int = 0):
+        start = time.time()
+        self.state = index.state
+        self.index = index
+        n_chunks = len(index)
+
+        # TF-IDF vocabulary: informative terms that appear in at least two chunks
+        vocabulary = sorted(
+            term for term in index.terms()
+            if len(term) > 2 and term not in STOPWORDS
+            and MIN_DOCUMENT_FREQUENCY <= index.document_frequency(term) <= n_chunks // 2
+        )
+        self.vocabulary = vocabulary
+        self.term_ids = {term: i for i, term in enumerate(vocabulary)}
+        self.idf = np.array([
+            math.log((1 + n_chunks) / (1 + index.document_frequency(term))) + 1 for term in vocabulary
+        ], dtype=np.float32)
+
+        rows, cols, vals = [], [], []
+        for term_id, term in enumerate(vocabulary):
+            docs, tfs = index.posting_arrays(term)
+            rows.append(docs.astype(np.int64))
+            cols.append(np.full(len(docs), term_id, dtype=np.int64))
+            vals.append((1 + np.log(tfs.astype(np.float64))) * self.idf[term_id])
+        rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+        cols = np.concatenate(cols) if cols else np.zeros(0, dtype=np.int64)
+        vals = np.concatenate(vals) if vals else np.zeros(0)
+
+        # Randomized truncated SVD of the (chunks x terms) TF-IDF matrix
+        k = max(1, min(dimensions, len(vocabulary) - 1, n_chunks - 1))
+        rng = np.random.default_rng(seed)
+        omega = rng.standard_normal((len(vocabulary), k + 10))
+        y = _sparse_matmul(rows, cols, vals, omega, n_chunks)
+        for _ in range(2):  # power iterations sharpen the spectrum
+            q, _ = np.linalg.qr(y)
+            z = _sparse_matmul(cols, rows, vals, q, len(vocabulary))
+            y = _sparse_matmul(rows, cols, vals, z, n_chunks)
+        q, _ = np.linalg.qr(y)
+        b = _sparse_matmul(cols, rows, vals, q, len(vocabulary)).T
+        _, _, vt = np.linalg.svd(b, full_matrices=False)
+        self.components = np.ascontiguousarray(vt[:k].T, dtype=np.float32)  # terms x k
+
+        vectors = _sparse_matmul(rows, cols, vals, self.components, n_chunks).astype(np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+
+        self.quantized = quantize
+        if quantize:
+            self.scales = np.maximum(np.abs(vectors).max(axis=1), 1e-9).astype(np.float32) / 127
+            self.vectors = np.round(vectors / self.scales[:, None]).astype(np.int8)
+        else:
+            self.scales = None
+            self.vectors = vectors
+        self.build_ms = round((time.time() - start) * 1000, 2)
+
+    @property
+    def nbytes(self) -> int:
+        scales = self.scales.nbytes if self.scales is not None else 0
+        return self.vectors.nbytes + scales + self.components.nbytes + self.idf.nbytes + len(self.term_ids) * 120
+
+    def embed(self, text: str) -> np.ndarray:
+        """Unit-length query vector in the LSA space (zeros if no known terms)"""
+        return embed_query(text, self.term_ids, self.idf, self.components)
+
+    def unit_vectors(self) -> np.ndarray:
+        """Chunk vectors as float32 (dequantized if stored as int8)"""
+        if self.quantized:
+            return self.vectors.astype(np.float32) * self.scales[:, None]
+        return self.vectors
+
+    def similarities(self, query_vector: np.ndarray) -> np.ndarray:
+        if self.quantized:
+            return (self.vectors @ query_vector) * self.scales
+        return self.vectors @ query_vector
+
+    def search(self, query: str, top_k: int = 5, min_similarity: float = MIN_SIMILARITY) -> Dict:
+        """
+        Cosine top-k over every chunk vector.
+        Returns {'hits': [(chunk_id, similarity), ...], 'candidates': int, 'timings_ms': {...}}
+        """
+        start = time.time()
+        query_vector = self.embed(query)
+        hits = []
+        if query_vector.any():
+            scores = self.similarities(query_vector)
+            k = min(top_k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind='stable')]
+            hits = [(int(i), float(scores[i])) for i in top if scores[i] >= min_similarity]
+        return {
+            'hits': hits,
+            'candidates': len(self.vectors),
+            'reranked': 0,
+            'timings_ms': {'retrieve': round((time.time() - start) * 1000, 2), 'rerank': 0.0}
+        }
+
+    def search_many(self, queries: List[str], top_k: int = 5, min_similarity: float = MIN_SIMILARITY) -> List[Dict]:
+        """`search` for a batch of queries with one (chunks x dims) @ (dims x queries) product"""
+        if not queries:
+            return []
+        start = time.time()
+        query_vectors = np.stack([self.embed(query) for query in queries], axis=1)
+        scores = self.vectors @ query_vectors
+        if self.quantized:
+            scores *= self.scales[:, None]
+        k = min(top_k, scores.shape[0])
+        per_query_ms = round((time.time() - start) * 1000 / len(queries), 2)
+        results = []
+        for column in range(len(queries)):
+            hits = []
+            if query_vectors[:, column].any():
+                column_scores = scores[:, column]
+                top = np.argpartition(-column_scores, k - 1)[:k]
+                top = top[np.argsort(-column_scores[top], kind='stable')]
+                hits = [(int(i), float(column_scores[i])) for i in top if column_scores[i] >= min_similarity]
+            results.append({
+                'hits': hits,
+                'candidates': len(self.vectors),
+                'reranked': 0,
+                'timings_ms': {'retrieve': per_query_ms, 'rerank': 0.0}
+            })
+        return results
+
+
+# Benchmark
+
+QUIZ_DIRS = ['../frontend/assets/quizzes', './quizzes', 'quizzes']
+
+
+def load_quiz_questions(state: str) -> List[Dict]:
+    """Questions (with correct answer and explanation) from a state's quiz bank"""
+    for directory in QUIZ_DIRS:
+        path = os.path.join(directory, f"{state.lower()}.json")
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                quiz = json.load(f)
+            return [q for test in quiz.get('tests', {}).values() for q in test.get('questions', [])]
+    return []
+
+
+def _is_hit(chunks: List[str], question: Dict) -> bool:
+    target = f"{question.get('correct_answer', '')} {question.get('explanation', '')}".lower()
+    return any(fuzz.token_set_ratio(chunk.lower(), target) >= 60 for chunk in chunks)
+
+
+def benchmark_strategies(state: str = 'washington', top_k: int = 5) -> Dict[str, Dict]:
+    """Latency and hit rate of the lexical scorer vs dense retrieval on the quiz bank"""
+    from corpus_registry import get_registry
+
+    registry = get_registry()
+    index = registry.get_index(state)
+    questions = load_quiz_questions(state)
+    if index is None or not questions:
+        print(f"⚠️  No index or quiz questions for {state}")
+        return {}
+
+    retrievers = {
+        'lexical': index.search,
+        'dense': registry.get_dense_index(state).search
+    }
+    report = {}
+    for name, search in retrievers.items():
+        latencies, hits = [], 0
+        for question in questions:
+            start = time.time()
+            result = search(question['question'], top_k=top_k)
+            latencies.append((time.time() - start) * 1000)
+            hits += _is_hit([index.chunk(chunk_id) for chunk_id, _ in result['hits']], question)
+        latencies.sort()
+        report[name] = {
+            'questions': len(questions),
+            'hit_rate': round(hits / len(questions), 3),
+            'mean_ms': round(sum(latencies) / len(latencies), 3),
+            'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3)
+        }
+        print(f"{name:8s} hit@{top_k}: {report[name]['hit_rate']:.1%}  "
+              f"mean {report[name]['mean_ms']:.2f}ms  p95 {report[name]['p95_ms']:.2f}ms")
+    return report
+
+
+if __name__ == "__main__":
+    print("DriveSmart Dense Retrieval Benchmark")
+    benchmark_strategies(sys.argv[1] if len(sys.argv) > 1 else 'washington')
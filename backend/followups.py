@@ -0,0 +1,113 @@
+"""
+Followups - Background LLM Answers for Two-Phase Chat
+=====================================================
+In two-phase mode the chat API answers immediately with the extractive
+answer and a followup_id, while the LLM answer is generated in the
+background. Each followup records the generation's stream events so a
+client can poll for the final answer or replay and follow the tokens.
+Followups live in memory and expire after RAG_FOLLOWUP_TTL seconds.
+"""
+
+import os
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+from query_cache import LRUTTLCache
+
+FOLLOWUP_TTL = float(os.environ.get('RAG_FOLLOWUP_TTL', 300))
+FOLLOWUP_MAX = int(os.environ.get('RAG_FOLLOWUP_MAX', 1000))
+
+
+class Followup:
+    """
+    One background answer: its stream events so far and final status
+    """
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.created_at = time.time()
+        self.status = 'pending'  # pending -> streaming -> done | failed
+        self.events: List[Dict] = []
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self._changed = threading.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('done', 'failed')
+
+    def push(self, event: Dict):
+        with self._changed:
+            self.events.append(event)
+            if event['event'] == 'done':
+                self.status = 'done'
+                self.result = event['data']
+            else:
+                self.status = 'streaming'
+            self._changed.notify_all()
+
+    def fail(self, error: str):
+        with self._changed:
+            self.status = 'failed'
+            self.error = error
+            self._changed.notify_all()
+
+    def wait(self, timeout: float) -> bool:
+        """Block until finished or timeout; True if finished"""
+        with self._changed:
+            return self._changed.wait_for(lambda: self.finished, timeout=timeout)
+
+    def events_since(self, index: int, timeout: float) -> Tuple[List[Dict], bool]:
+        """Events after `index` (waiting up to `timeout` for new ones) and whether it's finished"""
+        with self._changed:
+            self._changed.wait_for(lambda: len(self.events) > index or self.finished, timeout=timeout)
+            return self.events[index:], self.finished
+
+    def to_dict(self) -> Dict:
+        with self._changed:
+            data = {
+                'followup_id': self.id,
+                'status': self.status,
+                'age_s': round(time.time() - self.created_at, 2)
+            }
+            if self.result is not None:
+                data.update(self.result)
+            elif self.events:
+                data['partial_response'] = ''.join(
+                    event['data'].get('text', '') for event in self.events if event['event'] == 'token'
+                )
+            if self.error:
+                data['error'] = self.error
+            return data
+
+
+class FollowupStore:
+    """
+    Expiring registry of followups by id
+    """
+
+    def __init__(self, ttl: float = FOLLOWUP_TTL, max_size: int = FOLLOWUP_MAX):
+        self._followups = LRUTTLCache(max_size=max_size, ttl=ttl)
+        self._lock = threading.Lock()
+        self._counters = {'created': 0, 'completed': 0, 'failed': 0}
+
+    def create(self) -> Followup:
+        followup = Followup()
+        self._followups.put(followup.id, followup)
+        with self._lock:
+            self._counters['created'] += 1
+        return followup
+
+    def get(self, followup_id: str) -> Optional[Followup]:
+        return self._followups.get(followup_id)
+
+    def record(self, followup: Followup):
+        """Count a finished followup"""
+        with self._lock:
+            self._counters['completed' if followup.status == 'done' else 'failed'] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+        return dict(counters, stored=self._followups.stats()['size'])
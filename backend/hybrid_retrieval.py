@@ -0,0 +1,75 @@
+"""
+Hybrid Retrieval - Lexical + Vector Fusion
+==========================================
+Runs several retrievers concurrently and fuses their rankings with reciprocal
+rank fusion (RRF). Each retriever gets its own timeout, so a slow retriever
+(e.g. a dense search starved of CPU) can't stall the chat response -
+whatever finished in time is fused.
+"""
+
+import concurrent.futures
+import os
+import time
+from typing import Callable, Dict, List, Tuple
+
+RRF_K = 60
+HYBRID_TOP_K = int(os.environ.get('RAG_HYBRID_TOP_K', 3))
+RETRIEVER_TIMEOUT_MS = float(os.environ.get('RAG_RETRIEVER_TIMEOUT_MS', 250))
+RETRIEVER_DEPTH = 10  # hits requested from each retriever before fusion
+
+# Shared pool for retriever fan-out (retrieval is short, mostly GIL-free NumPy / rapidfuzz work)
+_retriever_pool = concurrent.futures.ThreadPoolExecutor(
+    max_workers=int(os.environ.get('RAG_RETRIEVER_WORKERS', 4)),
+    thread_name_prefix='retriever'
+)
+
+
+def reciprocal_rank_fusion(rankings: Dict[str, List[int]], k: int = RRF_K,
+                           weights: Dict[str, float] = None) -> List[Tuple[int, float]]:
+    """Fuse ranked chunk id lists: score(d) = sum(weight / (k + rank))"""
+    fused: Dict[int, float] = {}
+    for name, ranking in rankings.items():
+        weight = (weights or {}).get(name, 1.0)
+        for rank, chunk_id in enumerate(ranking, start=1):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + weight / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+def hybrid_search(retrievers: Dict[str, Callable[[], Dict]], top_k: int = HYBRID_TOP_K,
+                  timeouts_ms: Dict[str, float] = None) -> Dict:
+    """
+    Run retrievers concurrently and fuse whatever returns before its timeout.
+
+    Each retriever is a zero-argument callable returning a search result dict
+    ({'hits': [(chunk_id, score), ...], 'candidates': int, ...}).
+    """
+    start = time.time()
+    futures = {name: _retriever_pool.submit(search) for name, search in retrievers.items()}
+
+    rankings = {}
+    statuses = {}
+    candidates = 0
+    for name, future in futures.items():
+        timeout_s = (timeouts_ms or {}).get(name, RETRIEVER_TIMEOUT_MS) / 1000
+        try:
+            result = future.result(timeout=max(0.0, start + timeout_s - time.time()))
+            rankings[name] = [chunk_id for chunk_id, _ in result['hits']]
+            candidates += result.get('candidates', 0)
+            status = 'ok'
+        except concurrent.futures.TimeoutError:
+            future.cancel()  # no-op if already running; the result is simply ignored
+            status = 'timeout'
+        except Exception as e:
+            print(f"Retriever {name} failed: {e}")
+            status = 'error'
+        statuses[name] = {'status': status, 'ms': round((time.time() - start) * 1000, 2)}
+
+    fused = reciprocal_rank_fusion(rankings)
+    end = time.time()
+    return {
+        'hits': fused[:top_k],
+        'candidates': candidates,
+        'reranked': len(fused),
+        'retrievers': statuses,
+        'timings_ms': {'retrieve': round((end - start) * 1000, 2), 'rerank': 0.0}
+    }
@@ -0,0 +1,244 @@
+"""
+Index Artifact - Prebuilt, Memory-Mapped Manual Indexes
+=======================================================
+Offline build step that serializes each state's chunks, postings, term stats
+and boost bit matrices into one compact binary file, plus a loader that mmaps
+it at startup.
+
+Mapped files are read-only and file-backed, so pre-forked workers share the
+same pages through the OS page cache instead of each parsing the manual.
+
+Build all artifacts (or only the listed states):
+    python index_artifact.py [state ...]
+"""
+
+import mmap
+import os
+import struct
+import sys
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from search_index import StateIndex, EXACT_PHRASES, TRAFFIC_TERMS
+
+INDEX_DIR = os.environ.get('RAG_INDEX_DIR', 'indexes')
+ARTIFACT_SUFFIX = '.idx'
+
+MAGIC = b'DSIDX\x00\x00\x00'
+VERSION = 2
+
+# magic, version, byteorder, chunks, terms, postings, avg doc length,
+# source size, source mtime, section count
+_HEADER = struct.Struct('<8sIBxxxIIIdQQI')
+_SECTION = struct.Struct('<16sQQ')
+_ALIGN = 8
+
+
+def artifact_path(state: str, index_dir: str = None) -> str:
+    return os.path.join(index_dir or INDEX_DIR, f"{state}{ARTIFACT_SUFFIX}")
+
+
+def source_stamp(source_path: str) -> Tuple[int, int]:
+    stat = os.stat(source_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _offsets_and_blob(strings: Iterable[str]) -> Tuple[np.ndarray, bytes]:
+    encoded = [text.encode('utf-8') for text in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint32)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return offsets, b''.join(encoded)
+
+
+def _boost_vocab() -> bytes:
+    """Boost vocabulary the bit matrices were built against"""
+    return '\n'.join(EXACT_PHRASES + ['\x00'] + TRAFFIC_TERMS).encode('utf-8')
+
+
+def write_artifact(index: StateIndex, path: str, source_path: str):
+    """Serialize an in-memory StateIndex to a binary artifact (atomic replace)"""
+    terms = sorted(index.terms())
+    posting_offsets = np.zeros(len(terms) + 1, dtype=np.uint32)
+    doc_parts, tf_parts = [], []
+    for i, term in enumerate(terms):
+        docs, tfs = index.posting_arrays(term)
+        doc_parts.append(docs)
+        tf_parts.append(tfs)
+        posting_offsets[i + 1] = posting_offsets[i] + len(docs)
+    posting_docs = np.concatenate(doc_parts).astype(np.uint32) if terms else np.zeros(0, dtype=np.uint32)
+    posting_tfs = np.concatenate(tf_parts).astype(np.uint32) if terms else np.zeros(0, dtype=np.uint32)
+
+    text_offsets, text_blob = _offsets_and_blob(index.chunks)
+    lower_offsets, lower_blob = _offsets_and_blob(index.chunks_lower)
+    vocab_offsets, vocab_blob = _offsets_and_blob(terms)
+
+    sections = [
+        ('text_offsets', text_offsets.tobytes()),
+        ('text', text_blob),
+        ('lower_offsets', lower_offsets.tobytes()),
+        ('lower', lower_blob),
+        ('doc_lengths', index.doc_lengths.astype(np.uint32).tobytes()),
+        ('digit_flags', index.digit_flags.astype(np.uint8).tobytes()),
+        ('vocab_offsets', vocab_offsets.tobytes()),
+        ('vocab', vocab_blob),
+        ('posting_offsets', posting_offsets.tobytes()),
+        ('posting_docs', posting_docs.tobytes()),
+        ('posting_tfs', posting_tfs.tobytes()),
+        ('boost_vocab', _boost_vocab()),
+        ('phrase_bits', np.ascontiguousarray(index.phrase_bits).tobytes()),
+        ('term_bits', np.ascontiguousarray(index.term_bits).tobytes()),
+    ]
+
+    source_size, source_mtime = source_stamp(source_path)
+    header = _HEADER.pack(
+        MAGIC, VERSION, 0 if sys.byteorder == 'little' else 1,
+        len(index), len(terms), len(posting_docs), index.avg_doc_length,
+        source_size, source_mtime, len(sections)
+    )
+
+    position = _HEADER.size + _SECTION.size * len(sections)
+    table = []
+    body = []
+    for name, data in sections:
+        padding = (-position) % _ALIGN
+        body.append(b'\x00' * padding)
+        position += padding
+        table.append(_SECTION.pack(name.encode('ascii'), position, len(data)))
+        body.append(data)
+        position += len(data)
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        f.write(b''.join(table))
+        f.write(b''.join(body))
+    os.replace(tmp_path, path)
+
+
+class MappedStateIndex(StateIndex):
+    """
+    StateIndex backed by a memory-mapped artifact instead of in-process arrays
+    """
+
+    def __init__(self, state: str, path: str, mapped: mmap.mmap, header: Tuple, sections: Dict[str, Tuple[int, int]],
+                 k1: float = 1.5, b: float = 0.75):
+        self.state = state
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._mm = mapped
+        self._sections = sections
+        self._size = header[3]
+        self.avg_doc_length = header[6]
+
+        # Zero-copy, read-only views over the mapping
+        self._text_offsets = self._array('text_offsets', np.uint32)
+        self._lower_offsets = self._array('lower_offsets', np.uint32)
+        self.doc_lengths = self._array('doc_lengths', np.uint32)
+        self.digit_flags = self._array('digit_flags', np.uint8).view(bool)
+        self._posting_offsets = self._array('posting_offsets', np.uint32)
+        self._posting_docs = self._array('posting_docs', np.uint32)
+        self._posting_tfs = self._array('posting_tfs', np.uint32)
+        self.phrase_bits = self._array('phrase_bits', np.uint8).reshape(self._size, -1)
+        self.term_bits = self._array('term_bits', np.uint8).reshape(self._size, -1)
+
+        # The vocabulary is the only structure materialized in private memory
+        vocab_offsets = self._array('vocab_offsets', np.uint32).tolist()
+        vocab_start = sections['vocab'][0]
+        self._vocab = {
+            mapped[vocab_start + vocab_offsets[i]:vocab_start + vocab_offsets[i + 1]].decode('utf-8'): i
+            for i in range(header[4])
+        }
+
+    @classmethod
+    def open(cls, state: str, path: str, source_path: str = None) -> Optional['MappedStateIndex']:
+        """Map an artifact; returns None if it's missing, corrupt or older than its source"""
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        header = _HEADER.unpack_from(mapped, 0)
+        magic, version, byteorder = header[0], header[1], header[2]
+        if magic != MAGIC or version != VERSION or byteorder != (0 if sys.byteorder == 'little' else 1):
+            mapped.close()
+            return None
+        if source_path and os.path.exists(source_path) and source_stamp(source_path) != (header[7], header[8]):
+            mapped.close()
+            return None
+
+        sections = {}
+        for i in range(header[9]):
+            name, offset, length = _SECTION.unpack_from(mapped, _HEADER.size + i * _SECTION.size)
+            sections[name.rstrip(b'\x00').decode('ascii')] = (offset, length)
+
+        offset, length = sections['boost_vocab']
+        if mapped[offset:offset + length] != _boost_vocab():
+            mapped.close()
+            return None
+
+        return cls(state, path, mapped, header, sections)
+
+    def _array(self, name: str, dtype) -> np.ndarray:
+        offset, length = self._sections[name]
+        return np.frombuffer(self._mm, dtype=dtype, count=length // np.dtype(dtype).itemsize, offset=offset)
+
+    def _blob_string(self, blob: str, offsets: np.ndarray, chunk_id: int) -> str:
+        start = self._sections[blob][0]
+        return self._mm[start + int(offsets[chunk_id]):start + int(offsets[chunk_id + 1])].decode('utf-8')
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def chunks(self) -> List[str]:
+        return [self.chunk(i) for i in range(self._size)]
+
+    @property
+    def chunks_lower(self) -> List[str]:
+        return [self.chunk_lower(i) for i in range(self._size)]
+
+    def chunk(self, chunk_id: int) -> str:
+        return self._blob_string('text', self._text_offsets, chunk_id)
+
+    def chunk_lower(self, chunk_id: int) -> str:
+        return self._blob_string('lower', self._lower_offsets, chunk_id)
+
+    def terms(self) -> Iterable[str]:
+        return self._vocab.keys()
+
+    def posting_arrays(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        term_id = self._vocab.get(term)
+        if term_id is None:
+            return self._posting_docs[:0], self._posting_tfs[:0]
+        start, end = self._posting_offsets[term_id], self._posting_offsets[term_id + 1]
+        return self._posting_docs[start:end], self._posting_tfs[start:end]
+
+
+def build_all(index_dir: str = None, states: List[str] = None) -> Dict[str, str]:
+    """Offline build step: write one artifact per catalog state whose manual can be found"""
+    from corpus_registry import load_catalog, read_manual_chunks, state_key
+
+    built = {}
+    wanted = set(state_key(s) for s in states) if states else None
+    for state, entry in load_catalog().items():
+        if wanted is not None and state not in wanted:
+            continue
+        source_path = entry.get('path')
+        if not source_path:
+            print(f"⚠️  Could not find {state} manual - skipping")
+            continue
+        start = time.time()
+        index = StateIndex(state, read_manual_chunks(source_path))
+        path = artifact_path(state, index_dir)
+        write_artifact(index, path, source_path)
+        built[state] = path
+        print(f"✅ Built {path}: {len(index)} chunks, {len(index.postings)} terms, "
+              f"{os.path.getsize(path) / 1024:.0f} KB in {(time.time() - start) * 1000:.0f}ms")
+    return built
+
+
+if __name__ == "__main__":
+    print("DriveSmart Index Artifact Builder")
+    build_all(states=sys.argv[1:] or None)
@@ -7,155 +7,311 @@ RAG agent that searches through your actual state driving manuals
 instead of using hardcoded responses. Much more accurate!
 """
 
-import time
 import os
-from typing import Dict, List
-from rapidfuzz import fuzz
+import time
+import threading
+import re
+import concurrent.futures
+from typing import Dict, Iterator, List, Optional, Tuple
+from corpus_registry import get_registry
+from hybrid_retrieval import hybrid_search, RETRIEVER_DEPTH, RETRIEVER_TIMEOUT_MS
+from query_cache import RetrievalCache, normalize_question
+from answer_cache import AnswerCache, answer_key
+from semantic_cache import SemanticCache
+from ollama_client import get_ollama_client
+from single_flight import SingleFlight
+from deadline import Deadline
+from context_packer import pack_context, estimate_tokens, trim_to_relevant, CONTEXT_TOKEN_BUDGET
+from search_index import query_terms
+from sentence_index import segment
+
+# 'lexical' (BM25 + boosts), 'dense' (local LSA vectors), 'hybrid' (both, fused with RRF)
+# or 'ann' (prebuilt on-disk IVF index, falls back to dense when not built)
+RETRIEVAL_STRATEGIES = ('lexical', 'dense', 'hybrid', 'ann')
+RETRIEVAL_STRATEGY = os.environ.get('RAG_RETRIEVAL_STRATEGY', 'lexical')
+
+# Cross-state comparison: one retrieval task per state, one generation over all of them
+COMPARE_MAX_STATES = int(os.environ.get('RAG_COMPARE_MAX_STATES', 4))
+COMPARE_EXTRACT_TOKENS = 40  # per state, in the extractive comparison fallback
+# Words that say "compare" rather than what to compare - dropped from each state's search query
+COMPARE_WORDS = re.compile(
+    r"\b(compare[sd]?|comparing|comparison|differ(s|ent|ence|ences)?|between|versus|vs|rules?|laws?)\b"
+    r"(\s+(from|to|with|between|in))?",
+    re.IGNORECASE
+)
+_state_pool = concurrent.futures.ThreadPoolExecutor(max_workers=COMPARE_MAX_STATES, thread_name_prefix='compare')
+
+# Generation settings (also part of the answer cache key)
+OLLAMA_MODEL = os.environ.get('OLLAMA_MODEL', 'mistral:latest')
+GENERATE_OPTIONS = {
+    'num_predict': 300,  # Increased for fuller responses
+    'temperature': 0.2,  # Slightly more creative
+    'top_p': 0.9,
+    'num_ctx': 4096,     # Larger context window
+    'num_thread': 8,
+    'stop': ['STUDENT QUESTION:', 'OFFICIAL WASHINGTON']  # Stop tokens
+}
+MAX_RESPONSE_WORDS = 200
+
+# Deadline-aware generation: num_predict is sized to the time left, and below
+# MIN_GENERATION_SECONDS (or MIN_PREDICT_TOKENS) the extractive answer is used instead
+GENERATION_TOKENS_PER_SECOND = float(os.environ.get('RAG_TOKENS_PER_SECOND', 15))
+MIN_GENERATION_SECONDS = float(os.environ.get('RAG_MIN_GENERATION_SECONDS', 2.0))
+MIN_PREDICT_TOKENS = 80
+DEADLINE_SAFETY_SECONDS = 0.25  # left for trimming, caching and the HTTP response
+
+_WORD_RE = re.compile(r"\S+")
+
 
-# Try to import ollama, but have fallback for production
-try:
-    import ollama
-    OLLAMA_AVAILABLE = True
-except ImportError:
-    OLLAMA_AVAILABLE = False
-    print("Ollama not available - using fallback responses")
+def word_cut(text: str, max_words: int = MAX_RESPONSE_WORDS) -> Optional[int]:
+    """Character offset just past the `max_words`-th word, or None if the text is shorter"""
+    if len(text.split()) < max_words:
+        return None
+    for count, match in enumerate(_WORD_RE.finditer(text), start=1):
+        if count == max_words:
+            return match.end()
+    return None
+
+# Ollama is reached over HTTP through the shared pooled client; set OLLAMA_ENABLED=false
+# to serve extractive answers only (e.g. deployments without a model server)
+OLLAMA_AVAILABLE = os.environ.get('OLLAMA_ENABLED', 'true').lower() == 'true'
+if not OLLAMA_AVAILABLE:
+    print("Ollama disabled - using fallback responses")
 
 class LightweightRAGAgent:
     """
     RAG agent using real document content from your PDFs
     """
     
-    def __init__(self, database_path='database.db'):
+    def __init__(self, database_path='database.db', registry=None, retrieval_strategy=None, answer_cache=None):
         self.database_path = database_path
         self.max_response_time = 8.0
+        self.retrieval_strategy = retrieval_strategy or RETRIEVAL_STRATEGY
         
-        # Load actual documents from your state files  
-        self.state_documents = {}
-        self._load_state_documents()
-        
-    def _load_state_documents(self):
-        """Load your actual state driving manuals"""
-        # Try multiple possible paths for Docker deployment
-        state_files = {
-            'washington': [
-                '../frontend/assets/staterules/Washington.txt',  # Local development
-                './staterules/Washington.txt',                   # Docker deployment
-                'staterules/Washington.txt',                     # Simple path
-                'Washington.txt'                                 # Direct file
-            ],
-            'california': [
-                '../frontend/assets/staterules/California.txt',
-                './staterules/California.txt',
-                'staterules/California.txt',
-                'California.txt'
-            ],
-            'florida': [
-                '../frontend/assets/staterules/Florida.txt',
-                './staterules/Florida.txt',
-                'staterules/Florida.txt',
-                'Florida.txt'
-            ]
-        }
+        # Borrow parsed manuals from the process-wide registry instead of re-reading them
+        self.registry = registry or get_registry()
         
-        for state, filepaths in state_files.items():
-            loaded = False
-            for filepath in filepaths:
-                try:
-                    if os.path.exists(filepath):
-                        with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-                            content = f.read()
-                            # Break into searchable chunks
-                            chunks = [chunk.strip() for chunk in content.split('\n') if len(chunk.strip()) > 50]
-                        self.state_documents[state] = chunks
-                        print(f"✅ Loaded {state}: {len(chunks)} text chunks from {filepath}")
-                        loaded = True
-                        break  # Found and loaded, move to next state
-                except Exception as e:
-                    print(f"❌ Error loading {filepath}: {e}")
-                    continue
-            
-            if not loaded:
-                print(f"⚠️  Could not load {state} manual from any location")
+        # Retrieval results per (state, normalized query), dropped when a manual reloads
+        self.retrieval_cache = RetrievalCache()
+        self.registry.add_reload_listener(self.retrieval_cache.invalidate_state)
         
-        print(f"Total documents loaded: {len(self.state_documents)}")
+        # Identical questions arriving together share one retrieval + generation
+        self.single_flight = SingleFlight()
+        
+        # Pooled keep-alive client shared by every Ollama call in the process
+        self.ollama = get_ollama_client()
+        
+        # Generated answers persist in SQLite across restarts and workers
+        self.answer_cache = answer_cache or AnswerCache()
+        self.registry.add_reload_listener(self._invalidate_answers)
+        
+        # Near-duplicate questions reuse an earlier answer before any retrieval runs
+        self.semantic_cache = SemanticCache()
+        # Stored rows carry the state as the request gave it ('new jersey'); lookups use catalog keys
+        self.semantic_cache.warm((self.registry.resolve(state) or state, question, answer)
+                                 for state, question, answer in self.answer_cache.recent())
+        self.registry.add_reload_listener(self.semantic_cache.invalidate_state)
+    
+    def _invalidate_answers(self, state_key: str):
+        """Drop stored answers generated from a state's manual (compare answers are stored as 'a+b')"""
+        dropped = self.answer_cache.invalidate_states(
+            lambda label: state_key in (self.registry.resolve(part) or part for part in label.split('+'))
+        )
+        print(f" Dropped {dropped} cached {state_key} answers")
     
-    def _search_documents(self, query: str, state: str) -> List[str]:
-        """Enhanced search with fuzzy matching for better coverage"""
-        state_key = state.lower() if state else 'washington'
+    def _search_documents(self, query: str, state: str, candidate_budget: int = None,
+                          stats: Dict = None, strategy: str = None, deadline: Deadline = None) -> List[str]:
+        """Search a state manual with the lexical (two-stage BM25), dense, hybrid or ANN retriever"""
+        strategy = strategy or self.retrieval_strategy
+        if strategy not in RETRIEVAL_STRATEGIES:
+            raise ValueError(f"Unknown retrieval strategy: {strategy}")
         
-        if state_key not in self.state_documents:
+        index = self.registry.get_index(state or 'washington')
+        if index is None:
             return []
         
-        chunks = self.state_documents[state_key]
-        query_lower = query.lower()
-        query_words = set(query_lower.split())
-        
-        # Expanded exact phrases and traffic terms
-        exact_phrases = [
-            'speed limit', 'fire hydrant', 'school zone', 'right on red',
-            'learner permit', 'parking distance', 'mph', 'feet',
-            'school bus', 'passing bus', 'stop sign', 'yield', 'turn signal'
-        ]
-        
-        traffic_terms = [
-            'speed', 'limit', 'zone', 'park', 'distance', 'turn', 
-            'permit', 'license', 'bus', 'stop', 'children', 'passing', 
-            'lane', 'road', 'intersection'
-        ]
-        
-        scored_chunks = []
-        for chunk in chunks:
-            chunk_lower = chunk.lower()
-            score = 0
-            
-            # 1. Exact phrase matching
-            for phrase in exact_phrases:
-                if phrase in query_lower and phrase in chunk_lower:
-                    score += 20
-            
-            # 2. Keyword density
-            word_matches = sum(1 for word in query_words if word in chunk_lower and len(word) > 2)
-            score += word_matches * 3
-            
-            # 3. Number relevance
-            if any(c.isdigit() for c in query) and any(c.isdigit() for c in chunk):
-                score += 5
-            
-            # 4. Traffic-specific terms boost
-            for term in traffic_terms:
-                if term in query_lower and term in chunk_lower:
-                    score += 2
-            
-            # 5. Fuzzy matching for typos / variations
-            fuzz_ratio = fuzz.partial_ratio(query_lower, chunk_lower)
-            if fuzz_ratio > 70:  # threshold can be adjusted
-                score += 10
-            
-            if score > 0:
-                scored_chunks.append((chunk, score))
+        cache_key = RetrievalCache.make_key(index.state, query, strategy, candidate_budget)
+        cached = self.retrieval_cache.get(cache_key)
+        if cached is not None:
+            if stats is not None:
+                stats['timings_ms'] = {'retrieve': 0.0, 'rerank': 0.0}
+                stats['candidates'] = 0
+                stats['strategy'] = cached['strategy']
+                stats['retrieval_cache'] = 'hit'
+            print(f" Retrieval cache hit: {len(cached['chunks'])} chunks")
+            return list(cached['chunks'])
+        
+        ann = self.registry.get_ann_index(state or 'washington') if strategy == 'ann' else None
+        if strategy == 'ann' and ann is None:
+            strategy = 'dense'
+        
+        if strategy == 'ann':
+            result = ann.search(query)
+        elif strategy == 'dense':
+            result = self.registry.get_dense_index(state or 'washington').search(query)
+        elif strategy == 'hybrid':
+            # Build the embeddings (once per state) before the retriever timeouts start, so a cold
+            # state doesn't time out its dense leg or park pool threads on the registry's load lock
+            dense = self.registry.get_dense_index(state or 'washington')
+            retriever_timeout_ms = deadline.cap(RETRIEVER_TIMEOUT_MS / 1000) * 1000 if deadline else RETRIEVER_TIMEOUT_MS
+            result = hybrid_search({
+                'lexical': lambda: index.search(query, top_k=RETRIEVER_DEPTH, candidate_budget=candidate_budget),
+                'dense': lambda: dense.search(query, top_k=RETRIEVER_DEPTH)
+            }, timeouts_ms={'lexical': retriever_timeout_ms, 'dense': retriever_timeout_ms})
+        else:
+            result = index.search(query, candidate_budget=candidate_budget)
+        if stats is not None:
+            stats['timings_ms'] = result['timings_ms']
+            stats['candidates'] = result['candidates']
+            stats['strategy'] = strategy
+            if 'retrievers' in result:
+                stats['retrievers'] = result['retrievers']
         
         # Return top 5 chunks for better coverage
-        scored_chunks.sort(key=lambda x: x[1], reverse=True)
-        top_chunks = [chunk for chunk, score in scored_chunks[:5] if score >= 5]
+        top_chunks = [index.chunk(chunk_id) for chunk_id, score in result['hits']]
         
-        precision = len(top_chunks) / max(len(scored_chunks), 1) if scored_chunks else 0
-        print(f" Search precision: {precision:.3f} ({len(top_chunks)}/{len(scored_chunks)})")
+        print(f" {strategy.title()} search: {len(top_chunks)} chunks from {result['candidates']} candidates")
         
+        # A hybrid result missing a timed-out or failed retriever isn't worth keeping for the TTL
+        if all(retriever['status'] == 'ok' for retriever in result.get('retrievers', {}).values()):
+            self.retrieval_cache.put(cache_key, {'chunks': tuple(top_chunks), 'strategy': strategy})
+        if stats is not None:
+            stats['retrieval_cache'] = 'miss'
         return top_chunks
     
-    def chat_with_rag_fast(self, message: str, state: str = None) -> Dict:
-        """RAG chat using your actual documents"""
+    def search_documents_batch(self, queries: List[Tuple[str, str]], candidate_budget: int = None,
+                               strategy: str = None) -> Dict:
+        """
+        Retrieval for many (question, state) pairs at once. Cached queries are
+        served from the retrieval cache; the rest are grouped by state and scored
+        in one vectorized pass per state (lexical and dense) or one by one (hybrid,
+        ANN). Results are stored in the retrieval cache, so answering the
+        questions afterwards skips retrieval.
+        Returns {'chunks': [[chunk, ...] per query], 'cached': int, 'searched': int, 'ms': float}
+        """
+        start = time.time()
+        strategy = strategy or self.retrieval_strategy
+        if strategy not in RETRIEVAL_STRATEGIES:
+            raise ValueError(f"Unknown retrieval strategy: {strategy}")
+        
+        chunks: List[Optional[List[str]]] = [None] * len(queries)
+        misses: Dict[str, List[Tuple[int, str, str]]] = {}
+        cached = 0
+        for position, (query, state) in enumerate(queries):
+            index = self.registry.get_index(state or 'washington')
+            if index is None:
+                chunks[position] = []
+                continue
+            hit = self.retrieval_cache.get(RetrievalCache.make_key(index.state, query, strategy, candidate_budget))
+            if hit is not None:
+                chunks[position] = list(hit['chunks'])
+                cached += 1
+            else:
+                misses.setdefault(index.state, []).append((position, query, state))
+        
+        for state_key, items in misses.items():
+            index = self.registry.get_index(state_key)
+            batch_queries = [query for _, query, _ in items]
+            if strategy == 'lexical':
+                results = index.search_many(batch_queries, candidate_budget=candidate_budget)
+            elif strategy == 'dense':
+                results = self.registry.get_dense_index(state_key).search_many(batch_queries)
+            else:
+                results = None
+            for offset, (position, query, state) in enumerate(items):
+                if results is None:
+                    chunks[position] = self._search_documents(query, state, candidate_budget, strategy=strategy)
+                    continue
+                top_chunks = [index.chunk(chunk_id) for chunk_id, score in results[offset]['hits']]
+                self.retrieval_cache.put(RetrievalCache.make_key(index.state, query, strategy, candidate_budget),
+                                         {'chunks': tuple(top_chunks), 'strategy': strategy})
+                chunks[position] = top_chunks
+        
+        searched = sum(len(items) for items in misses.values())
+        elapsed_ms = round((time.time() - start) * 1000, 2)
+        print(f" Batch {strategy} search: {len(queries)} queries ({cached} cached, {searched} searched) in {elapsed_ms}ms")
+        return {'chunks': chunks, 'cached': cached, 'searched': searched, 'ms': elapsed_ms}
+    
+    def _flight_key(self, message: str, state: str, candidate_budget: int, strategy: str,
+                    deadline: Optional[Deadline]) -> Tuple:
+        """Only callers that would do identical work share it: same question, budgets and retriever"""
+        state_key = self.registry.resolve(state or 'washington') or (state or 'washington')
+        return (state_key, normalize_question(message), candidate_budget, strategy or self.retrieval_strategy,
+                deadline.budget if deadline else None)
+    
+    def chat_with_rag_fast(self, message: str, state: str = None, candidate_budget: int = None,
+                           strategy: str = None, deadline: Deadline = None) -> Dict:
+        """
+        RAG chat using your actual documents (concurrent identical questions are coalesced).
+        Retrieval and generation are sized to `deadline`; without one the answer is full length.
+        """
+        try:
+            result, shared = self.single_flight.do(
+                self._flight_key(message, state, candidate_budget, strategy, deadline),
+                lambda: self._chat_with_rag(message, state, candidate_budget, strategy, deadline),
+                timeout=deadline.remaining() if deadline else None
+            )
+        except concurrent.futures.TimeoutError:
+            return {
+                'response': f"Timed out searching {state or 'Washington'} documents. Please try again.",
+                'source': 'error',
+                'response_time_ms': deadline.elapsed() * 1000,
+                'rag_enhanced': False,
+                'error': 'timeout waiting for an identical in-flight question'
+            }
+        return dict(result, coalesced=True) if shared else result
+    
+    def submit_chat(self, pool, message: str, state: str = None, candidate_budget: int = None,
+                    strategy: str = None, deadline: Deadline = None) -> Tuple[concurrent.futures.Future, bool]:
+        """
+        chat_with_rag_fast for a worker pool: a question identical to one in
+        flight joins it without taking a pool slot, so a burst of the same
+        question runs one generation. Returns (future, shared); raises the
+        pool's PoolFullError when a new question can't be admitted.
+        """
+        return self.single_flight.submit(
+            self._flight_key(message, state, candidate_budget, strategy, deadline),
+            lambda: pool.submit(self._chat_with_rag, message, state, candidate_budget, strategy, deadline)
+        )
+    
+    def _chat_with_rag(self, message: str, state: str = None, candidate_budget: int = None,
+                       strategy: str = None, deadline: Deadline = None) -> Dict:
         start_time = time.time()
+        search_stats = {}
         print(f"Searching {state or 'Washington'} documents for: {message[:40]}...")
         
         try:
+            state_key = self.registry.resolve(state or 'washington') or (state or 'washington')
+            match = self.semantic_cache.lookup(state_key, message)
+            if match is not None:
+                response_time = time.time() - start_time
+                print(f" Semantic cache hit ({match['similarity']:.2f}): {match['question'][:40]}")
+                return {
+                    'response': match['answer'],
+                    'source': 'cache',
+                    'cache_match': {'question': match['question'], 'similarity': match['similarity']},
+                    'response_time_ms': response_time * 1000,
+                    'stage_timings_ms': {'retrieve': 0.0, 'rerank': 0.0, 'generate': 0.0},
+                    'candidates_scanned': 0,
+                    'retrieval_strategy': strategy or self.retrieval_strategy,
+                    'retrievers': {},
+                    'rag_enhanced': True,
+                    'contexts_used': 0,
+                    'state': state or 'washington'
+                }
+            
             # Search actual documents
-            relevant_chunks = self._search_documents(message, state)
+            relevant_chunks = self._search_documents(message, state, candidate_budget, search_stats, strategy, deadline)
+            stage_timings = dict(search_stats.get('timings_ms', {}))
             
             if relevant_chunks:
                 # Generate response with document context
-                response = self._generate_response(message, relevant_chunks, state)
-                source = 'document_rag'
+                generate_start = time.time()
+                response = self._generate_response(message, relevant_chunks, state, search_stats, deadline)
+                stage_timings['generate'] = round((time.time() - generate_start) * 1000, 2)
+                source = 'cache' if search_stats.get('generator') == 'cache' else 'document_rag'
+                if search_stats.get('generator') in ('ollama', 'cache') and not search_stats.get('shortened'):
+                    self.semantic_cache.add(state_key, message, response)
                 contexts_used = len(relevant_chunks)
             else:
                 response = f"I couldn't find information about '{message}' in the {state or 'Washington'} driving manual. Please ask about specific driving rules."
@@ -169,6 +325,13 @@ class LightweightRAGAgent:
                 'response': response,
                 'source': source,
                 'response_time_ms': response_time * 1000,
+                'stage_timings_ms': stage_timings,
+                'candidates_scanned': search_stats.get('candidates', 0),
+                'retrieval_strategy': search_stats.get('strategy', strategy or self.retrieval_strategy),
+                'retrievers': search_stats.get('retrievers', {}),
+                'generator': search_stats.get('generator'),
+                'context_tokens': search_stats.get('context_tokens', 0),
+                'deadline': deadline.to_dict() if deadline else None,
                 'rag_enhanced': True,
                 'contexts_used': contexts_used,
                 'state': state or 'washington'
@@ -184,68 +347,343 @@ class LightweightRAGAgent:
                 'error': str(e)
             }
     
-    def _generate_response(self, query: str, contexts: List[str], state: str) -> str:
-        """Generate comprehensive response using Ollama with improved prompting"""
-        if not contexts:
-            return "I don't have specific information about that in the Washington State driving manual. Could you rephrase your question or ask about speed limits, parking rules, traffic signals, or turning regulations?"
+    def extractive_answer(self, message: str, state: str = None, candidate_budget: int = None,
+                          strategy: str = None) -> Dict:
+        """
+        Phase one of a two-phase answer: retrieval plus the extractive answer, no LLM.
+        'final' is True when nothing better will follow (semantic cache hit or no context).
+        """
+        start_time = time.time()
+        search_stats = {}
+        state_key = self.registry.resolve(state or 'washington') or (state or 'washington')
+        base = {'state': state or 'washington', 'rag_enhanced': True}
         
-        # Use more context for better responses
-        context_text = "\n\n---SECTION---\n\n".join(contexts[:3])
+        match = self.semantic_cache.lookup(state_key, message)
+        if match is not None:
+            return dict(base, response=match['answer'], source='cache', final=True, contexts_used=0,
+                        cache_match={'question': match['question'], 'similarity': match['similarity']},
+                        response_time_ms=(time.time() - start_time) * 1000)
         
-        # Enhanced prompt for better responses
-        prompt = f"""You are an expert Washington State driving instructor. Based on the following official Washington State traffic manual excerpts, provide a comprehensive, helpful answer to the student's question.
+        relevant_chunks = self._search_documents(message, state, candidate_budget, search_stats, strategy)
+        if not relevant_chunks:
+            response = f"I couldn't find information about '{message}' in the {state or 'Washington'} driving manual. Please ask about specific driving rules."
+            return dict(base, response=response, source='no_context', final=True, contexts_used=0,
+                        response_time_ms=(time.time() - start_time) * 1000)
+        
+        return dict(base, response=self._extract_detailed_answer(message, relevant_chunks, state), source='extractive',
+                    final=False, contexts_used=len(relevant_chunks),
+                    stage_timings_ms=dict(search_stats.get('timings_ms', {})),
+                    response_time_ms=(time.time() - start_time) * 1000)
+    
+    def stream_chat(self, message: str, state: str = None, candidate_budget: int = None,
+                    strategy: str = None, deadline: Deadline = None) -> Iterator[Dict]:
+        """
+        Streaming variant of chat_with_rag_fast. Yields events as dicts:
+            {'event': 'context', 'data': {...}}  once retrieval is done
+            {'event': 'token', 'data': {'text': ...}}  answer text as it is generated
+            {'event': 'done', 'data': {...}}  final (sentence-trimmed) response and timings
+        Generation stops as soon as the answer reaches MAX_RESPONSE_WORDS words
+        or the deadline (default: max_response_time seconds) passes. Only an
+        explicit deadline shortens num_predict.
+        """
+        explicit_deadline = deadline
+        deadline = Deadline.of(deadline, self.max_response_time)
+        start_time = time.time()
+        state_key = self.registry.resolve(state or 'washington') or (state or 'washington')
+        search_stats = {}
+        
+        def finish(response: str, source: str, stage_timings: Dict, contexts_used: int, **extra) -> Dict:
+            return {'event': 'done', 'data': dict({
+                'response': response,
+                'source': source,
+                'response_time_ms': (time.time() - start_time) * 1000,
+                'stage_timings_ms': stage_timings,
+                'contexts_used': contexts_used,
+                'state': state or 'washington'
+            }, **extra)}
+        
+        match = self.semantic_cache.lookup(state_key, message)
+        if match is not None:
+            timings = {'retrieve': 0.0, 'rerank': 0.0, 'generate': 0.0}
+            yield {'event': 'context', 'data': {'source': 'cache', 'contexts_used': 0, 'stage_timings_ms': timings}}
+            yield {'event': 'token', 'data': {'text': match['answer']}}
+            yield finish(match['answer'], 'cache', timings, 0,
+                         cache_match={'question': match['question'], 'similarity': match['similarity']})
+            return
+        
+        relevant_chunks = self._search_documents(message, state, candidate_budget, search_stats, strategy, deadline)
+        stage_timings = dict(search_stats.get('timings_ms', {}))
+        yield {'event': 'context', 'data': {
+            'contexts_used': len(relevant_chunks),
+            'candidates_scanned': search_stats.get('candidates', 0),
+            'retrieval_strategy': search_stats.get('strategy', strategy or self.retrieval_strategy),
+            'stage_timings_ms': dict(stage_timings),
+            'first_byte_ms': round((time.time() - start_time) * 1000, 2)
+        }}
+        
+        if not relevant_chunks:
+            response = f"I couldn't find information about '{message}' in the {state or 'Washington'} driving manual. Please ask about specific driving rules."
+            yield {'event': 'token', 'data': {'text': response}}
+            yield finish(response, 'no_context', stage_timings, 0)
+            return
+        
+        generate_start = time.time()
+        excerpts = pack_context(message, relevant_chunks)
+        cache_key = answer_key(state or 'washington', message, excerpts, OLLAMA_MODEL, GENERATE_OPTIONS)
+        cached = self.answer_cache.get(cache_key)
+        options = self._generation_options(explicit_deadline)
+        if cached is not None or not self._ollama_ready() or options is None:
+            response = cached if cached is not None else self._extract_detailed_answer(message, relevant_chunks, state)
+            stage_timings['generate'] = round((time.time() - generate_start) * 1000, 2)
+            yield {'event': 'token', 'data': {'text': response}}
+            yield finish(response, 'cache' if cached is not None else 'document_rag', stage_timings, len(relevant_chunks),
+                         generator='cache' if cached is not None else 'extractive')
+            return
+        
+        text = ''
+        emitted = 0
+        truncated = False
+        out_of_time = False
+        first_token_ms = None
+        stream = None
+        try:
+            stream = self.ollama.generate(
+                model=OLLAMA_MODEL,
+                prompt=self._build_prompt(message, excerpts),
+                options=options,
+                stream=True,
+                timeout=deadline.remaining(),
+                queue_timeout=deadline.remaining()
+            )
+            for part in stream:
+                text += part.get('response', '')
+                cut = word_cut(text)
+                if cut is not None:
+                    text = text[:cut]
+                    truncated = True
+                if len(text) > emitted:
+                    if first_token_ms is None:
+                        first_token_ms = round((time.time() - start_time) * 1000, 2)
+                    yield {'event': 'token', 'data': {'text': text[emitted:]}}
+                    emitted = len(text)
+                if deadline.remaining() <= DEADLINE_SAFETY_SECONDS:
+                    truncated = out_of_time = True
+                if truncated or part.get('done'):
+                    break
+        except Exception as e:
+            print(f"Ollama streaming error: {e}")
+        finally:
+            if hasattr(stream, 'close'):
+                stream.close()
+        
+        response = text.strip()
+        if len(response) < 50:
+            response = self._extract_detailed_answer(message, relevant_chunks, state)
+            if not emitted:
+                yield {'event': 'token', 'data': {'text': response}}
+            generator = 'extractive'
+        else:
+            response = self._trim_response(response, truncated)
+            generator = 'ollama'
+            if options == GENERATE_OPTIONS and not out_of_time:
+                self.answer_cache.put(cache_key, state or 'washington', message, OLLAMA_MODEL, response)
+                self.semantic_cache.add(state_key, message, response)
+        stage_timings['generate'] = round((time.time() - generate_start) * 1000, 2)
+        yield finish(response, 'document_rag', stage_timings, len(relevant_chunks),
+                     generator=generator, truncated=truncated, first_token_ms=first_token_ms)
+    
+    def compare_states(self, message: str, states: List[str], candidate_budget: int = None,
+                       strategy: str = None, deadline: Deadline = None) -> Dict:
+        """
+        Answer a question across several states: retrieval fans out with one task
+        per state corpus, then a single generation compares the states' excerpts.
+        """
+        start_time = time.time()
+        explicit_deadline = deadline
+        deadline = Deadline.of(deadline, self.max_response_time)
+        keys = list(dict.fromkeys(self.registry.resolve(state) or state for state in states))
+        names = {key: self.registry.catalog.get(key, {}).get('name', key.title()) for key in keys}
+        query = self._compare_query(message, names.values())
+        print(f"Comparing {', '.join(keys)} for: {query[:40]}...")
+        
+        # 1. Retrieval - one task per state corpus, all running at once
+        stats = {key: {} for key in keys}
+        futures = {
+            key: _state_pool.submit(self._search_documents, query, key, candidate_budget, stats[key], strategy, deadline)
+            for key in keys
+        }
+        concurrent.futures.wait(futures.values(), timeout=deadline.remaining())
+        chunks, per_state = {}, {}
+        for key, future in futures.items():
+            try:
+                chunks[key] = future.result(timeout=0) if future.done() else []
+                status = 'ok' if future.done() else 'timeout'
+            except Exception as e:
+                print(f"Comparison search failed for {key}: {e}")
+                chunks[key], status = [], 'error'
+            per_state[key] = {
+                'name': names[key],
+                'status': status,
+                'contexts_used': len(chunks[key]),
+                'candidates': stats[key].get('candidates', 0),
+                'timings_ms': stats[key].get('timings_ms', {})
+            }
+        stage_timings = {'retrieve': round((time.time() - start_time) * 1000, 2)}
+        base = {
+            'states': keys,
+            'per_state': per_state,
+            'retrieval_strategy': strategy or self.retrieval_strategy,
+            'rag_enhanced': True,
+            'deadline': deadline.to_dict()
+        }
+        
+        if not any(chunks.values()):
+            response = f"I couldn't find information about '{message}' in the {' or '.join(names.values())} driving manuals."
+            return dict(base, response=response, source='no_context', generator=None, llm_calls=0, context_tokens=0,
+                        stage_timings_ms=stage_timings, response_time_ms=(time.time() - start_time) * 1000)
+        
+        # 2. One generation over every state's packed excerpts (the budget is split between states)
+        generate_start = time.time()
+        budget = max(1, CONTEXT_TOKEN_BUDGET // len(keys))
+        excerpts = {key: pack_context(query, chunks[key], budget) if chunks[key] else [] for key in keys}
+        labelled = [f"{names[key]}: {excerpt}" for key in keys for excerpt in excerpts[key]]
+        cache_key = answer_key('+'.join(keys), message, labelled, OLLAMA_MODEL, GENERATE_OPTIONS)
+        response = self.answer_cache.get(cache_key)
+        generator = 'cache' if response is not None else None
+        llm_calls = 0
+        
+        options = self._generation_options(explicit_deadline) if response is None else None
+        if options is not None and self._ollama_ready():
+            llm_calls = 1
+            try:
+                result = self.ollama.generate(
+                    model=OLLAMA_MODEL,
+                    prompt=self._build_compare_prompt(message, names, excerpts),
+                    options=options,
+                    timeout=deadline.remaining(),
+                    queue_timeout=deadline.remaining()
+                )
+                text = result['response'].strip()
+                if len(text) >= 50:
+                    response = self._trim_response(text)
+                    generator = 'ollama'
+                    if options == GENERATE_OPTIONS:
+                        self.answer_cache.put(cache_key, '+'.join(keys), message, OLLAMA_MODEL, response)
+            except Exception as e:
+                print(f"Ollama comparison error: {e}")
+        
+        if response is None:
+            response = self._extract_comparison(query, names, chunks)
+            generator = 'extractive'
+        stage_timings['generate'] = round((time.time() - generate_start) * 1000, 2)
+        
+        response_time = time.time() - start_time
+        print(f" Comparison of {len(keys)} states answered in {response_time:.2f}s ({generator})")
+        return dict(
+            base,
+            response=response,
+            source='cache' if generator == 'cache' else 'document_rag',
+            generator=generator,
+            llm_calls=llm_calls,
+            context_tokens=sum(estimate_tokens(excerpt) for excerpt in labelled),
+            stage_timings_ms=stage_timings,
+            response_time_ms=response_time * 1000
+        )
+    
+    @staticmethod
+    def _compare_query(message: str, names) -> str:
+        """The question with state names and comparison words removed, for searching each manual"""
+        query = message
+        for name in names:
+            query = re.sub(r"\b" + re.escape(name) + r"(?:'s|s')?\b", ' ', query, flags=re.IGNORECASE)
+        query = ' '.join(COMPARE_WORDS.sub(' ', query).split())
+        return query if query.strip(' ?.!') else message
+    
+    def _build_compare_prompt(self, query: str, names: Dict[str, str], excerpts: Dict[str, List[str]]) -> str:
+        """Instructor prompt asking for a side-by-side answer from each state's excerpts"""
+        sections = "\n\n".join(
+            f"{names[key].upper()} MANUAL EXCERPTS:\n" + ("\n\n---SECTION---\n\n".join(state_excerpts) or "(no matching sections)")
+            for key, state_excerpts in excerpts.items()
+        )
+        return f"""You are an expert driving instructor. Compare how the official driving manuals of {', '.join(names.values())} answer the student's question.
 
-OFFICIAL WASHINGTON STATE TRAFFIC MANUAL EXCERPTS:
-{context_text}
+{sections}
 
 STUDENT QUESTION: {query}
 
 INSTRUCTIONS:
-- Provide a complete, detailed answer (150-200 words)
-- Include specific rules, distances, speeds, or requirements mentioned in the manual
-- Explain the reasoning behind the rules when relevant
-- Be clear and educational
-- Start with "According to Washington State traffic laws..."
-- If the excerpts don't fully answer the question, acknowledge what information is available
+- Summarize each state's rule in turn, naming the state
+- Then point out the key differences (and anything that is the same)
+- Use only the excerpts; if a state's excerpts don't cover the question, say so
+- Keep the answer under 200 words
 
-COMPREHENSIVE ANSWER:"""
+COMPARISON:"""
+    
+    def _extract_comparison(self, query: str, names: Dict[str, str], chunks: Dict[str, List[str]]) -> str:
+        """Extractive fallback: each state's sentences sharing the most terms with the question"""
+        terms = set(query_terms(query.lower()))
+        paragraphs = []
+        for key, name in names.items():
+            text = trim_to_relevant(' '.join(chunks.get(key, [])[:3]), terms, COMPARE_EXTRACT_TOKENS, keep_unrelated=False)
+            paragraphs.append(f"{name}: " + (text or f"No matching section found in the {name} manual."))
+        return "\n\n".join(paragraphs)
+    
+    def _generate_response(self, query: str, contexts: List[str], state: str, stats: Dict = None,
+                           deadline: Deadline = None) -> str:
+        """Generate comprehensive response using Ollama with improved prompting"""
+        if stats is None:
+            stats = {}
+        if not contexts:
+            return "I don't have specific information about that in the Washington State driving manual. Could you rephrase your question or ask about speed limits, parking rules, traffic signals, or turning regulations?"
+        
+        # Deduplicated, query-trimmed excerpts within the prompt token budget
+        excerpts = pack_context(query, contexts)
+        stats['context_tokens'] = sum(estimate_tokens(excerpt) for excerpt in excerpts)
+        cache_key = answer_key(state or 'washington', query, excerpts, OLLAMA_MODEL, GENERATE_OPTIONS)
+        cached = self.answer_cache.get(cache_key)
+        if cached is not None:
+            stats['generator'] = 'cache'
+            return cached
+        
+        prompt = self._build_prompt(query, excerpts)
 
         try:
             # Check if Ollama is available
-            if not OLLAMA_AVAILABLE:
-                return self._extract_detailed_answer(query, contexts)
+            if not self._ollama_ready():
+                stats['generator'] = 'extractive'
+                return self._extract_detailed_answer(query, contexts, state)
+            
+            # Not enough time left for a useful generation - answer from the excerpts
+            options = self._generation_options(deadline)
+            if options is None:
+                print(f" Deadline nearly spent ({deadline.remaining():.1f}s left) - extractive answer")
+                stats['generator'] = 'extractive'
+                stats['deadline_skip'] = True
+                return self._extract_detailed_answer(query, contexts, state)
             
             # Better Ollama settings for comprehensive responses
-            response = ollama.generate(
-                model='mistral:latest',
+            response = self.ollama.generate(
+                model=OLLAMA_MODEL,
                 prompt=prompt,
-                options={
-                    'num_predict': 300,  # Increased for fuller responses
-                    'temperature': 0.2,  # Slightly more creative
-                    'top_p': 0.9,
-                    'num_ctx': 4096,     # Larger context window
-                    'num_thread': 8,
-                    'stop': ['STUDENT QUESTION:', 'OFFICIAL WASHINGTON']  # Stop tokens
-                }
+                options=options,
+                timeout=deadline.remaining() if deadline else None,
+                queue_timeout=deadline.remaining() if deadline else None
             )
             
             response_text = response['response'].strip()
             
             # Clean up and validate the response
             if len(response_text) < 50:
-                return self._extract_detailed_answer(query, contexts)
+                stats['generator'] = 'extractive'
+                return self._extract_detailed_answer(query, contexts, state)
             
             # Ensure proper length (150-200 words)
-            words = response_text.split()
-            if len(words) > 220:
-                # Find a good stopping point
-                truncated = ' '.join(words[:200])
-                if '.' in truncated[-50:]:
-                    last_period = truncated.rfind('.')
-                    response_text = truncated[:last_period + 1]
-                else:
-                    response_text = truncated + '.'
+            response_text = self._trim_response(response_text)
             
+            stats['generator'] = 'ollama'
+            stats['shortened'] = options != GENERATE_OPTIONS
+            if not stats['shortened']:  # shortened answers aren't reused for unhurried requests
+                self.answer_cache.put(cache_key, state or 'washington', query, OLLAMA_MODEL, response_text)
             return response_text
             
             # Simple truncation to ~150 words
@@ -257,22 +695,75 @@ COMPREHENSIVE ANSWER:"""
             
         except Exception as e:
             print(f"Ollama generation error: {e}")
-            return self._extract_detailed_answer(query, contexts)
+            stats['generator'] = 'extractive'
+            return self._extract_detailed_answer(query, contexts, state)
     
-    def _extract_detailed_answer(self, query: str, contexts: List[str]) -> str:
+    def _generation_options(self, deadline: Optional[Deadline]) -> Optional[Dict]:
+        """GENERATE_OPTIONS with num_predict shrunk to fit the deadline; None if generation won't fit"""
+        if deadline is None:
+            return GENERATE_OPTIONS  # no caller deadline - full-length answer
+        seconds = deadline.remaining() - DEADLINE_SAFETY_SECONDS
+        tokens = int(seconds * GENERATION_TOKENS_PER_SECOND)
+        if seconds < MIN_GENERATION_SECONDS or tokens < MIN_PREDICT_TOKENS:
+            return None
+        if tokens >= GENERATE_OPTIONS['num_predict']:
+            return GENERATE_OPTIONS
+        return dict(GENERATE_OPTIONS, num_predict=tokens)
+    
+    def _ollama_ready(self) -> bool:
+        """Ollama enabled and not backing off after a connection failure"""
+        return OLLAMA_AVAILABLE and self.ollama.available()
+    
+    def _build_prompt(self, query: str, excerpts: List[str]) -> str:
+        """Instructor prompt over the packed manual excerpts (see context_packer)"""
+        context_text = "\n\n---SECTION---\n\n".join(excerpts)
+        
+        # Enhanced prompt for better responses
+        return f"""You are an expert Washington State driving instructor. Based on the following official Washington State traffic manual excerpts, provide a comprehensive, helpful answer to the student's question.
+
+OFFICIAL WASHINGTON STATE TRAFFIC MANUAL EXCERPTS:
+{context_text}
+
+STUDENT QUESTION: {query}
+
+INSTRUCTIONS:
+- Provide a complete, detailed answer (150-200 words)
+- Include specific rules, distances, speeds, or requirements mentioned in the manual
+- Explain the reasoning behind the rules when relevant
+- Be clear and educational
+- Start with "According to Washington State traffic laws..."
+- If the excerpts don't fully answer the question, acknowledge what information is available
+
+COMPREHENSIVE ANSWER:"""
+
+    @staticmethod
+    def _trim_response(response_text: str, truncated: bool = False) -> str:
+        """Cut answers running past ~200 words (or already cut mid-stream) back to a sentence boundary"""
+        words = response_text.split()
+        if truncated or len(words) > MAX_RESPONSE_WORDS + 20:
+            # Find a good stopping point
+            truncated = ' '.join(words[:MAX_RESPONSE_WORDS])
+            if '.' in truncated[-50:]:
+                last_period = truncated.rfind('.')
+                response_text = truncated[:last_period + 1]
+            else:
+                response_text = truncated + '.'
+        return response_text
+    
+    def _extract_detailed_answer(self, query: str, contexts: List[str], state: str = None) -> str:
         """Extract comprehensive answer from context when Ollama fails - ensure complete sentences"""
         if not contexts:
             return "No information found in the traffic manual sections regarding this specific question."
         
         relevant_sentences = []
-        query_words = set(word.lower() for word in query.split() if len(word) > 3)
+        query_words = frozenset(word.lower() for word in query.split() if len(word) > 3)
         
+        # Sentences and their word sets were built when the manual loaded
+        sentence_index = self.registry.get_sentence_index(state or 'washington')
         for context in contexts[:3]:
-            sentences = [s.strip() for s in context.replace('!', '.').replace('?', '.').split('.') if len(s.strip()) > 20]
-            
-            for sentence in sentences:
-                sentence_words = set(word.lower() for word in sentence.split())
-                overlap = len(query_words.intersection(sentence_words))
+            records = sentence_index.chunk_sentences(context) if sentence_index else segment(context)
+            for sentence, sentence_words in records:
+                overlap = len(query_words & sentence_words)
                 if overlap > 0:
                     relevant_sentences.append((sentence, overlap))
         
@@ -324,6 +815,20 @@ COMPREHENSIVE ANSWER:"""
         return " ".join(answer_parts)
 
 
+_shared_agent = None
+_shared_agent_lock = threading.Lock()
+
+
+def get_shared_agent() -> LightweightRAGAgent:
+    """Process-wide agent instance used by the chat, service and learning modules"""
+    global _shared_agent
+    if _shared_agent is None:
+        with _shared_agent_lock:
+            if _shared_agent is None:
+                _shared_agent = LightweightRAGAgent()
+    return _shared_agent
+
+
 # Test function
 def test_rag():
     print("TESTING ENHANCED RAG ")
@@ -0,0 +1,208 @@
+"""
+Ollama Client - Shared Keep-Alive HTTP Client for Generation
+============================================================
+Every Ollama call in the backend goes through one pooled requests.Session, so
+questions reuse open connections instead of paying TCP setup each time.
+A per-process semaphore caps how many generations hit the model at once, and
+after a connection failure the client backs off briefly instead of making
+every request wait on a dead server.
+
+Settings (environment):
+    OLLAMA_HOST             base URL (default http://localhost:11434)
+    OLLAMA_CONNECT_TIMEOUT  seconds to establish a connection (default 2)
+    OLLAMA_READ_TIMEOUT     seconds to wait between response bytes (default 60)
+    OLLAMA_MAX_IN_FLIGHT    concurrent generations per process (default 2)
+    OLLAMA_QUEUE_TIMEOUT    seconds to wait for a generation slot (default 30)
+    OLLAMA_KEEP_ALIVE       how long Ollama keeps the model loaded after a request (default 24h)
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Union
+import requests
+from requests.adapters import HTTPAdapter
+
+OLLAMA_HOST = os.environ.get('OLLAMA_HOST', 'http://localhost:11434').rstrip('/')
+if not OLLAMA_HOST.startswith('http'):
+    OLLAMA_HOST = f"http://{OLLAMA_HOST}"
+OLLAMA_CONNECT_TIMEOUT = float(os.environ.get('OLLAMA_CONNECT_TIMEOUT', 2))
+OLLAMA_READ_TIMEOUT = float(os.environ.get('OLLAMA_READ_TIMEOUT', 60))
+OLLAMA_MAX_IN_FLIGHT = int(os.environ.get('OLLAMA_MAX_IN_FLIGHT', 2))
+OLLAMA_QUEUE_TIMEOUT = float(os.environ.get('OLLAMA_QUEUE_TIMEOUT', 30))
+OLLAMA_RETRY_AFTER = float(os.environ.get('OLLAMA_RETRY_AFTER', 15))  # backoff after connection errors
+OLLAMA_KEEP_ALIVE = os.environ.get('OLLAMA_KEEP_ALIVE', '24h')
+
+
+class OllamaError(Exception):
+    """Ollama unreachable or returned an error"""
+
+
+class OllamaBusyError(OllamaError):
+    """No generation slot became free within the queue timeout"""
+
+
+class OllamaClient:
+    """
+    Pooled, concurrency-limited client for the Ollama HTTP API
+    """
+
+    def __init__(self, host: str = None, connect_timeout: float = None, read_timeout: float = None,
+                 max_in_flight: int = None, queue_timeout: float = None):
+        self.host = host or OLLAMA_HOST
+        self.connect_timeout = connect_timeout or OLLAMA_CONNECT_TIMEOUT
+        self.read_timeout = read_timeout or OLLAMA_READ_TIMEOUT
+        self.max_in_flight = max_in_flight or OLLAMA_MAX_IN_FLIGHT
+        self.queue_timeout = OLLAMA_QUEUE_TIMEOUT if queue_timeout is None else queue_timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(4, self.max_in_flight * 2))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._down_until = 0.0
+        self._counters = {'requests': 0, 'errors': 0, 'busy_rejections': 0, 'connection_errors': 0}
+
+    def available(self) -> bool:
+        """False while backing off after a connection failure"""
+        return time.time() >= self._down_until
+
+    def _acquire(self, queue_timeout: float = None):
+        timeout = self.queue_timeout if queue_timeout is None else queue_timeout
+        if not self._slots.acquire(timeout=max(0.0, timeout)):
+            with self._lock:
+                self._counters['busy_rejections'] += 1
+            raise OllamaBusyError(f"{self.max_in_flight} generations already in flight")
+        with self._lock:
+            self._in_flight += 1
+            self._counters['requests'] += 1
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def _failed(self, error: Exception):
+        with self._lock:
+            self._counters['errors'] += 1
+            if isinstance(error, requests.ConnectionError):
+                self._counters['connection_errors'] += 1
+                self._down_until = time.time() + OLLAMA_RETRY_AFTER
+
+    def _post(self, path: str, payload: Dict, stream: bool, read_timeout: float = None) -> requests.Response:
+        if not self.available():
+            raise OllamaError(f"Ollama at {self.host} unreachable - retrying in {self._down_until - time.time():.0f}s")
+        try:
+            response = self.session.post(
+                f"{self.host}{path}",
+                json=payload,
+                stream=stream,
+                timeout=(self.connect_timeout, read_timeout or self.read_timeout)
+            )
+            response.raise_for_status()
+            return response
+        except requests.RequestException as e:
+            self._failed(e)
+            raise OllamaError(str(e)) from e
+
+    def generate(self, model: str, prompt: str, options: Dict = None, stream: bool = False,
+                 timeout: float = None, queue_timeout: float = None,
+                 keep_alive: Union[str, int] = None) -> Union[Dict, Iterator[Dict]]:
+        """
+        POST /api/generate. Returns the response dict, or with stream=True an
+        iterator of partial response dicts (the generation slot is held until
+        the iterator is exhausted or closed).
+        """
+        payload = {'model': model, 'prompt': prompt, 'stream': stream, 'options': options or {},
+                   'keep_alive': OLLAMA_KEEP_ALIVE if keep_alive is None else keep_alive}
+
+        self._acquire(queue_timeout)
+        if not stream:
+            try:
+                return self._post('/api/generate', payload, stream=False, read_timeout=timeout).json()
+            finally:
+                self._release()
+
+        try:
+            response = self._post('/api/generate', payload, stream=True, read_timeout=timeout)
+        except Exception:
+            self._release()
+            raise
+        return GenerateStream(self, response)
+
+    def list_models(self, timeout: float = 2.0) -> Optional[List[str]]:
+        """Names of the locally available models, or None if the server isn't answering"""
+        try:
+            response = self.session.get(f"{self.host}/api/tags", timeout=(self.connect_timeout, timeout))
+            response.raise_for_status()
+        except requests.RequestException:
+            return None
+        with self._lock:
+            self._down_until = 0.0  # server is up - stop backing off
+        return [model.get('name', '') for model in response.json().get('models', [])]
+
+    def pull(self, model: str, timeout: float = 600) -> bool:
+        """Download a model (blocking); True on success"""
+        try:
+            response = self.session.post(f"{self.host}/api/pull", json={'name': model, 'stream': False},
+                                         timeout=(self.connect_timeout, timeout))
+            response.raise_for_status()
+            return response.json().get('status') == 'success'
+        except requests.RequestException as e:
+            raise OllamaError(str(e)) from e
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(
+                self._counters,
+                host=self.host,
+                in_flight=self._in_flight,
+                max_in_flight=self.max_in_flight,
+                available=self.available()
+            )
+
+
+class GenerateStream:
+    """
+    Iterator over a streamed generation; holds the client's slot until exhausted or closed
+    """
+
+    def __init__(self, client: OllamaClient, response: requests.Response):
+        self.client = client
+        self.response = response
+        self._closed = False
+
+    def __iter__(self) -> Iterator[Dict]:
+        try:
+            for line in self.response.iter_lines():
+                if line:
+                    yield json.loads(line)
+        except requests.RequestException as e:
+            self.client._failed(e)
+            raise OllamaError(str(e)) from e
+        finally:
+            self.close()
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self.response.close()
+            self.client._release()
+
+
+_client: Optional[OllamaClient] = None
+_client_lock = threading.Lock()
+
+
+def get_ollama_client() -> OllamaClient:
+    """Process-wide Ollama client"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OllamaClient()
+    return _client
@@ -0,0 +1,124 @@
+"""
+Query Cache - In-Process LRU + TTL Cache for Retrieval Results
+=============================================================
+Students ask the same handful of questions constantly, so retrieval results
+are cached per (state, normalized query). Entries expire after a TTL, the
+least-recently-used entries are evicted at capacity, and a state's entries
+are dropped whenever its manual is reloaded by the corpus registry.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+from search_index import STOPWORDS, tokenize
+
+QUERY_CACHE_SIZE = int(os.environ.get('RAG_QUERY_CACHE_SIZE', 1024))
+QUERY_CACHE_TTL = float(os.environ.get('RAG_QUERY_CACHE_TTL', 600))
+
+# Short function words dropped on top of the search stopwords
+NORMALIZE_STOPWORDS = STOPWORDS | frozenset([
+    'a', 'an', 'is', 'i', 'to', 'of', 'in', 'on', 'at', 'do', 'be', 'it', 'my',
+    'me', 'am', 'if', 'or', 'as', 'by', 'so', 'we', 'us', 's', 'please', 'tell'
+])
+
+
+# Words that change what a question asks, kept when answers are cached by question
+NEGATIONS = frozenset(['not', 'no', 'never', 'nor', 'cannot'])
+MODALS = frozenset(['can', 'could', 'must', 'should', 'shall', 'may', 'might', 'will', 'would'])
+QUESTION_WORDS = frozenset(['what', 'when', 'where', 'which', 'who', 'why', 'how'])
+MEANING_WORDS = NEGATIONS | MODALS | QUESTION_WORDS
+
+
+def normalize_query(text: str) -> str:
+    """Lowercase, strip punctuation, fold whitespace and drop stopwords"""
+    return ' '.join(token for token in tokenize(text or '') if token not in NORMALIZE_STOPWORDS)
+
+
+def normalize_question(text: str) -> str:
+    """normalize_query that keeps negations, modals and question words ("can't" -> "can not")"""
+    tokens = []
+    for token in tokenize(text or ''):
+        if token == 't':  # tail of an n't contraction
+            token = 'not'
+        elif token == 'cannot':
+            tokens.append('can')
+            token = 'not'
+        if token in MEANING_WORDS or token not in NORMALIZE_STOPWORDS:
+            tokens.append(token)
+    return ' '.join(tokens)
+
+
+class LRUTTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after `ttl` seconds
+    """
+
+    def __init__(self, max_size: int = QUERY_CACHE_SIZE, ttl: float = QUERY_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                self._counters['expirations'] += 1
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = (value, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every entry whose key matches the predicate"""
+        with self._lock:
+            stale = [key for key in self._entries if predicate(key)]
+            for key in stale:
+                del self._entries[key]
+            self._counters['invalidations'] += len(stale)
+            return len(stale)
+
+    def clear(self):
+        self.invalidate(lambda key: True)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses']
+            return dict(
+                self._counters,
+                size=len(self._entries),
+                max_size=self.max_size,
+                ttl_seconds=self.ttl,
+                hit_rate=round(self._counters['hits'] / lookups, 3) if lookups else 0.0
+            )
+
+
+class RetrievalCache(LRUTTLCache):
+    """
+    Retrieval results keyed by (state, normalized query, retrieval options)
+    """
+
+    @staticmethod
+    def make_key(state: str, query: str, *options) -> tuple:
+        return (state, normalize_query(query)) + tuple(options)
+
+    def invalidate_state(self, state: str) -> int:
+        """Called by the corpus registry whenever a state's manual is (re)loaded"""
+        return self.invalidate(lambda key: key[0] == state)
@@ -0,0 +1,307 @@
+"""
+Search Index - Inverted Index + BM25 Retrieval
+==============================================
+Per-state inverted index over the driving manual chunks. The index is built
+once per state, so query cost scales with the query terms instead of the
+size of the manual. Presence of the fixed boost phrases and traffic terms is
+precomputed per chunk as packed NumPy bit matrices.
+"""
+
+import math
+import os
+import re
+import time
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Tuple
+import numpy as np
+from rapidfuzz import fuzz, process
+
+# Phrases and terms that get an extra boost when both query and chunk contain them
+EXACT_PHRASES = [
+    'speed limit', 'fire hydrant', 'school zone', 'right on red',
+    'learner permit', 'parking distance', 'mph', 'feet',
+    'school bus', 'passing bus', 'stop sign', 'yield', 'turn signal'
+]
+
+TRAFFIC_TERMS = [
+    'speed', 'limit', 'zone', 'park', 'distance', 'turn',
+    'permit', 'license', 'bus', 'stop', 'children', 'passing',
+    'lane', 'road', 'intersection'
+]
+
+# Words too common to be worth a postings lookup
+STOPWORDS = frozenset([
+    'the', 'and', 'for', 'are', 'was', 'you', 'your', 'what', 'when', 'where',
+    'which', 'who', 'how', 'can', 'does', 'with', 'that', 'this', 'from',
+    'have', 'has', 'must', 'should', 'will', 'into', 'about', 'there', 'their',
+    'they', 'them', 'than', 'then', 'its', 'not', 'any', 'all', 'may', 'might',
+    'would', 'could', 'been', 'being', 'were', 'our', 'out', 'get'
+])
+
+# Scoring weights (kept on the same scale as the original linear scorer)
+PHRASE_BOOST = 20
+KEYWORD_WEIGHT = 3
+DIGIT_BOOST = 5
+TERM_BOOST = 2
+FUZZY_BOOST = 10
+FUZZY_THRESHOLD = 70
+MIN_SCORE = 5
+TOP_K = 5
+
+# Chunks passed from the cheap first stage to the expensive rerank stage
+CANDIDATE_BUDGET = int(os.environ.get('RAG_CANDIDATE_BUDGET', 50))
+
+# Threads used by rapidfuzz for the batched fuzzy pass (runs without the GIL)
+FUZZY_WORKERS = int(os.environ.get('RAG_FUZZY_WORKERS', min(4, os.cpu_count() or 1)))
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+_EMPTY_POSTINGS = (np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint32))
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase and split text into alphanumeric tokens"""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def query_terms(query_lower: str) -> List[str]:
+    """Distinct searchable terms of a lowercased query"""
+    seen = []
+    for token in tokenize(query_lower):
+        if len(token) > 2 and token not in STOPWORDS and token not in seen:
+            seen.append(token)
+    return seen
+
+
+def presence_bits(texts: List[str], vocabulary: List[str]) -> np.ndarray:
+    """Packed (len(texts), ceil(len(vocabulary) / 8)) bit matrix of substring presence"""
+    present = np.array(
+        [[item in text for item in vocabulary] for text in texts],
+        dtype=bool
+    ).reshape(len(texts), len(vocabulary))
+    return np.packbits(present, axis=1)
+
+
+def query_mask(query_lower: str, vocabulary: List[str]) -> np.ndarray:
+    """Packed bit mask of the vocabulary items present in the query"""
+    return np.packbits(np.array([item in query_lower for item in vocabulary], dtype=bool))
+
+
+def popcount_rows(bits: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """Number of mask bits set in each row of a packed bit matrix"""
+    return _POPCOUNT[bits & mask].sum(axis=1, dtype=np.int32)
+
+
+class StateIndex:
+    """
+    Inverted index for a single state manual with BM25 scoring
+    """
+
+    def __init__(self, state: str, chunks: List[str], k1: float = 1.5, b: float = 0.75):
+        self.state = state
+        self.k1 = k1
+        self.b = b
+        self.chunks = chunks
+        self.chunks_lower = [chunk.lower() for chunk in chunks]
+
+        # Postings: term -> (chunk ids, term frequencies)
+        postings = defaultdict(list)
+        doc_lengths = []
+        for chunk_id, chunk_lower in enumerate(self.chunks_lower):
+            counts = Counter(tokenize(chunk_lower))
+            doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings[term].append((chunk_id, tf))
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {
+            term: (np.array([p[0] for p in entries], dtype=np.uint32),
+                   np.array([p[1] for p in entries], dtype=np.uint32))
+            for term, entries in postings.items()
+        }
+        self.doc_lengths = np.array(doc_lengths, dtype=np.uint32)
+        self.avg_doc_length = float(self.doc_lengths.mean()) if len(chunks) else 0.0
+
+        # Boost vocabularies are fixed, so their presence is resolved once into bit matrices
+        self.phrase_bits = presence_bits(self.chunks_lower, EXACT_PHRASES)
+        self.term_bits = presence_bits(self.chunks_lower, TRAFFIC_TERMS)
+        self.digit_flags = np.array([any(c.isdigit() for c in chunk) for chunk in chunks], dtype=bool)
+
+    def __len__(self):
+        return len(self.chunks)
+
+    # Storage accessors - overridden by alternative index backends
+
+    def chunk(self, chunk_id: int) -> str:
+        return self.chunks[chunk_id]
+
+    def chunk_lower(self, chunk_id: int) -> str:
+        return self.chunks_lower[chunk_id]
+
+    def terms(self) -> Iterable[str]:
+        return self.postings.keys()
+
+    def posting_arrays(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(chunk ids, term frequencies) for a term; empty arrays if unknown"""
+        return self.postings.get(term, _EMPTY_POSTINGS)
+
+    def document_frequency(self, term: str) -> int:
+        return len(self.posting_arrays(term)[0])
+
+    def term_matrix(self) -> np.ndarray:
+        """(chunks x TRAFFIC_TERMS) float32 0/1 matrix unpacked from term_bits, built on first use"""
+        matrix = getattr(self, '_term_matrix', None)
+        if matrix is None:
+            matrix = np.unpackbits(self.term_bits, axis=1)[:, :len(TRAFFIC_TERMS)].astype(np.float32)
+            self._term_matrix = matrix
+        return matrix
+
+    # Scoring
+
+    def idf(self, term: str) -> float:
+        """BM25 inverse document frequency (always positive)"""
+        df = self.document_frequency(term)
+        n = len(self)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def fuzzy_scores(self, query_lower: str, chunk_ids: List[int]):
+        """
+        partial_ratio of the query against each chunk in one rapidfuzz cdist call.
+        Scores below FUZZY_THRESHOLD come back as 0.
+        """
+        if not len(chunk_ids):
+            return np.zeros(0)
+        return process.cdist(
+            [query_lower],
+            [self.chunk_lower(chunk_id) for chunk_id in chunk_ids],
+            scorer=fuzz.partial_ratio,
+            score_cutoff=FUZZY_THRESHOLD,
+            workers=FUZZY_WORKERS
+        )[0]
+
+    def search(self, query: str, top_k: int = TOP_K, min_score: float = MIN_SCORE,
+               candidate_budget: int = None) -> Dict:
+        """
+        Two-stage retrieval over the chunks reachable from the query's postings lists.
+
+        Stage 1 (retrieve) scores candidates with cheap features - BM25, traffic
+        terms and digits - and keeps the best `candidate_budget`. Stage 2 (rerank)
+        adds the phrase and fuzzy boosts to that set only.
+
+        Returns {'hits': [(chunk_id, score), ...], 'candidates': int,
+                 'reranked': int, 'timings_ms': {'retrieve': ms, 'rerank': ms}}
+        """
+        budget = candidate_budget or CANDIDATE_BUDGET
+        retrieve_start = time.time()
+        query_lower = query.lower()
+        scores = np.zeros(len(self), dtype=np.float64)
+        reachable = np.zeros(len(self), dtype=bool)
+
+        # 1. BM25 keyword relevance
+        for term in query_terms(query_lower):
+            docs, tfs = self.posting_arrays(term)
+            if not len(docs):
+                continue
+            tfs = tfs.astype(np.float64)
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[docs] / self.avg_doc_length)
+            scores[docs] += KEYWORD_WEIGHT * self.idf(term) * tfs * (self.k1 + 1) / (tfs + norm)
+            reachable[docs] = True
+
+        # 2. Traffic-specific terms boost (AND + popcount against the query's term mask)
+        term_mask = query_mask(query_lower, TRAFFIC_TERMS)
+        if term_mask.any():
+            term_counts = popcount_rows(self.term_bits, term_mask)
+            scores += TERM_BOOST * term_counts
+            reachable |= term_counts > 0
+
+        # 3. Number relevance, only for reachable chunks
+        if any(c.isdigit() for c in query):
+            scores[reachable & self.digit_flags] += DIGIT_BOOST
+
+        return self._rerank(query_lower, scores, reachable, budget, top_k, min_score, retrieve_start)
+
+    def search_many(self, queries: List[str], top_k: int = TOP_K, min_score: float = MIN_SCORE,
+                    candidate_budget: int = None) -> List[Dict]:
+        """
+        `search` for a batch of queries with stage 1 done in one pass: each
+        distinct term's BM25 contribution is computed once and added to every
+        query that uses it, and the traffic-term counts for all queries come
+        from one matrix product. Results match `search` query by query; the
+        shared stage-1 time is split evenly across the batch's 'retrieve' timings.
+        """
+        if not queries:
+            return []
+        budget = candidate_budget or CANDIDATE_BUDGET
+        retrieve_start = time.time()
+        queries_lower = [query.lower() for query in queries]
+        scores = np.zeros((len(queries), len(self)), dtype=np.float64)
+        reachable = np.zeros((len(queries), len(self)), dtype=bool)
+
+        # 1. BM25 keyword relevance, once per distinct term in the batch
+        rows_by_term = defaultdict(list)
+        for row, query_lower in enumerate(queries_lower):
+            for term in query_terms(query_lower):
+                rows_by_term[term].append(row)
+        for term, rows in rows_by_term.items():
+            docs, tfs = self.posting_arrays(term)
+            if not len(docs):
+                continue
+            tfs = tfs.astype(np.float64)
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[docs] / self.avg_doc_length)
+            contribution = KEYWORD_WEIGHT * self.idf(term) * tfs * (self.k1 + 1) / (tfs + norm)
+            for row in rows:
+                scores[row, docs] += contribution
+                reachable[row, docs] = True
+
+        # 2. Traffic-specific terms boost for every query at once: (queries x terms) @ (terms x chunks)
+        term_masks = np.unpackbits(
+            np.stack([query_mask(query_lower, TRAFFIC_TERMS) for query_lower in queries_lower]), axis=1
+        )[:, :len(TRAFFIC_TERMS)]
+        if term_masks.any():
+            term_counts = term_masks.astype(np.float32) @ self.term_matrix().T
+            scores += TERM_BOOST * term_counts
+            reachable |= term_counts > 0
+
+        # 3. Number relevance, only for reachable chunks
+        has_digits = np.array([any(c.isdigit() for c in query) for query in queries], dtype=bool)
+        scores += DIGIT_BOOST * (reachable & self.digit_flags[None, :] & has_digits[:, None])
+
+        stage_one_ms = (time.time() - retrieve_start) * 1000 / len(queries)
+        results = []
+        for row, query_lower in enumerate(queries_lower):
+            result = self._rerank(query_lower, scores[row], reachable[row], budget, top_k, min_score, time.time())
+            result['timings_ms']['retrieve'] = round(result['timings_ms']['retrieve'] + stage_one_ms, 2)
+            results.append(result)
+        return results
+
+    def _rerank(self, query_lower: str, scores: np.ndarray, reachable: np.ndarray, budget: int,
+                top_k: int, min_score: float, retrieve_start: float) -> Dict:
+        """Stage 2: shortlist the best `budget` reachable chunks and add the phrase and fuzzy boosts"""
+        candidate_ids = np.flatnonzero(reachable)
+        if len(candidate_ids) > budget:
+            keep = np.argpartition(-scores[candidate_ids], budget - 1)[:budget]
+            shortlist_ids = candidate_ids[keep]
+        else:
+            shortlist_ids = candidate_ids
+        shortlist_scores = scores[shortlist_ids]
+        rerank_start = time.time()
+
+        # 4. Exact phrase matching on the shortlist
+        phrase_mask = query_mask(query_lower, EXACT_PHRASES)
+        if phrase_mask.any():
+            shortlist_scores += PHRASE_BOOST * popcount_rows(self.phrase_bits[shortlist_ids], phrase_mask)
+
+        # 5. Fuzzy matching for typos / variations, batched over the shortlist
+        shortlist_scores += FUZZY_BOOST * (self.fuzzy_scores(query_lower, shortlist_ids) > 0)
+
+        order = np.argsort(-shortlist_scores, kind='stable')[:top_k]
+        hits = [(int(shortlist_ids[i]), float(shortlist_scores[i]))
+                for i in order if shortlist_scores[i] >= min_score]
+        end = time.time()
+        return {
+            'hits': hits,
+            'candidates': int(len(candidate_ids)),
+            'reranked': int(len(shortlist_ids)),
+            'timings_ms': {
+                'retrieve': round((rerank_start - retrieve_start) * 1000, 2),
+                'rerank': round((end - rerank_start) * 1000, 2)
+            }
+        }
@@ -0,0 +1,249 @@
+"""
+Semantic Cache - Near-Duplicate Question Lookup with MinHash LSH
+===============================================================
+Exact-key caching misses paraphrases such as "how far from a fire hydrant can
+I park" vs "how close can I park to a hydrant". Questions are reduced to a set of
+canonical shingles (stopwords dropped, light stemming, a few driving synonyms
+folded together), signed with MinHash and bucketed with LSH. A lookup checks
+only the colliding buckets and accepts the best match whose Jaccard similarity
+is at least RAG_SEMANTIC_THRESHOLD. Entries are scoped per state. Negations,
+modals and question words are kept as shingles, and questions with different
+numbers, or where only one is negated, never match.
+
+Replay a query log (one question per line, or JSON lines with "question" and
+optional "state") to compare hit rates against exact matching:
+    python semantic_cache.py [query_log] [--threshold 0.8]
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+import numpy as np
+from query_cache import NEGATIONS, normalize_question
+
+SEMANTIC_THRESHOLD = float(os.environ.get('RAG_SEMANTIC_THRESHOLD', 0.8))  # 0.75 already matches 'school bus' vs 'bus'
+SEMANTIC_MAX_ENTRIES = int(os.environ.get('RAG_SEMANTIC_MAX_ENTRIES', 2000))  # per state
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 32  # 2 rows per band: similar pairs (J >= 0.5) collide with > 99.99% probability
+
+# Words students use interchangeably for the same manual topic
+SYNONYMS = {
+    'far': 'distance', 'close': 'distance', 'near': 'distance', 'away': 'distance',
+    'feet': 'distance', 'foot': 'distance', 'ft': 'distance',
+    'fast': 'speed', 'mph': 'speed', 'quickly': 'speed',
+    'allowed': 'legal', 'permitted': 'legal', 'ok': 'legal', 'okay': 'legal',
+    'car': 'vehicle', 'auto': 'vehicle', 'truck': 'vehicle',
+    'kids': 'children', 'child': 'children',
+    'light': 'signal', 'lights': 'signal',
+    'drunk': 'dui', 'alcohol': 'dui', 'intoxicated': 'dui'
+}
+
+_PRIME = (1 << 61) - 1
+_rng = np.random.default_rng(687)
+# a, b < 2^32 and 32-bit token hashes keep a * x + b inside uint64
+_PERM_A = _rng.integers(1, 1 << 32, size=NUM_PERMUTATIONS, dtype=np.uint64)
+_PERM_B = _rng.integers(0, 1 << 32, size=NUM_PERMUTATIONS, dtype=np.uint64)
+
+
+def _stem(token: str) -> str:
+    for suffix in ('ing', 'ed', 'es', 's'):
+        if len(token) > len(suffix) + 2 and token.endswith(suffix) and not token.endswith('e' + suffix):
+            return token[:-len(suffix)]
+    return token
+
+
+def shingles(question: str) -> FrozenSet[str]:
+    """Canonical token set of a question"""
+    tokens = set()
+    for token in normalize_question(question).split():
+        canonical = SYNONYMS.get(token) or (token if token.isdigit() else _stem(token))
+        tokens.add(SYNONYMS.get(canonical, canonical))
+    return frozenset(tokens)
+
+
+def minhash(shingle_set: Iterable[str]) -> np.ndarray:
+    """NUM_PERMUTATIONS-long MinHash signature of a shingle set"""
+    hashes = np.array([zlib.crc32(s.encode('utf-8')) for s in shingle_set], dtype=np.uint64)
+    if not len(hashes):
+        return np.full(NUM_PERMUTATIONS, np.iinfo(np.uint64).max, dtype=np.uint64)
+    permuted = (np.outer(_PERM_A, hashes) + _PERM_B[:, None]) % np.uint64(_PRIME)
+    return permuted.min(axis=1)
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+class SemanticCache:
+    """
+    Per-state MinHash LSH index of answered questions
+    """
+
+    def __init__(self, threshold: float = None, max_entries: int = None):
+        self.threshold = SEMANTIC_THRESHOLD if threshold is None else threshold
+        self.max_entries = max_entries or SEMANTIC_MAX_ENTRIES
+        self._lock = threading.Lock()
+        self._entries: Dict[str, 'OrderedDict[FrozenSet[str], Dict]'] = {}
+        self._buckets: Dict[str, Dict[Tuple, set]] = {}
+        self._counters = {'hits': 0, 'misses': 0, 'inserts': 0, 'evictions': 0}
+
+    @staticmethod
+    def _bands(signature: np.ndarray) -> List[Tuple]:
+        rows = NUM_PERMUTATIONS // LSH_BANDS
+        return [(band,) + tuple(signature[band * rows:(band + 1) * rows].tolist()) for band in range(LSH_BANDS)]
+
+    def lookup(self, state: str, question: str) -> Optional[Dict]:
+        """Best cached entry ({'question', 'answer', 'similarity'}) above the threshold, or None"""
+        key = shingles(question)
+        if not key:
+            return None
+        digits = {token for token in key if token.isdigit()}
+        negated = bool(key & NEGATIONS)
+        bands = self._bands(minhash(key))
+        with self._lock:
+            entries = self._entries.get(state, {})
+            buckets = self._buckets.get(state, {})
+            candidates = set()
+            for band in bands:
+                candidates |= buckets.get(band, set())
+            best, best_similarity = None, 0.0
+            for candidate in candidates:
+                if {token for token in candidate if token.isdigit()} != digits or bool(candidate & NEGATIONS) != negated:
+                    continue
+                similarity = jaccard(key, candidate)
+                if similarity >= self.threshold and similarity > best_similarity:
+                    best, best_similarity = candidate, similarity
+            if best is None:
+                self._counters['misses'] += 1
+                return None
+            entries.move_to_end(best)
+            self._counters['hits'] += 1
+            entry = entries[best]
+            return {'question': entry['question'], 'answer': entry['answer'],
+                    'similarity': round(best_similarity, 3)}
+
+    def add(self, state: str, question: str, answer: str):
+        key = shingles(question)
+        if not key:
+            return
+        with self._lock:
+            entries = self._entries.setdefault(state, OrderedDict())
+            buckets = self._buckets.setdefault(state, {})
+            if key not in entries:
+                bands = self._bands(minhash(key))
+                for band in bands:
+                    buckets.setdefault(band, set()).add(key)
+                self._counters['inserts'] += 1
+            else:
+                bands = entries[key]['bands']
+            entries[key] = {'question': question, 'answer': answer, 'bands': bands}
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                old_key, old = entries.popitem(last=False)
+                for band in old['bands']:
+                    bucket = buckets.get(band)
+                    if bucket is not None:
+                        bucket.discard(old_key)
+                        if not bucket:
+                            del buckets[band]
+                self._counters['evictions'] += 1
+
+    def invalidate_state(self, state: str):
+        with self._lock:
+            self._entries.pop(state, None)
+            self._buckets.pop(state, None)
+
+    def warm(self, rows: Iterable[Tuple[str, str, str]]) -> int:
+        """Seed from (state, question, answer) rows, e.g. the persistent answer cache"""
+        count = 0
+        for state, question, answer in rows:
+            self.add(state, question, answer)
+            count += 1
+        return count
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses']
+            return dict(
+                self._counters,
+                entries={state: len(entries) for state, entries in self._entries.items()},
+                threshold=self.threshold,
+                hit_rate=round(self._counters['hits'] / lookups, 3) if lookups else 0.0
+            )
+
+
+# Replay report
+
+def load_query_log(path: str, default_state: str = 'washington') -> List[Tuple[str, str]]:
+    """(state, question) pairs from a plain-text or JSON-lines query log"""
+    queries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('{'):
+                record = json.loads(line)
+                queries.append((record.get('state') or default_state, record.get('question') or record.get('message', '')))
+            else:
+                queries.append((default_state, line))
+    return queries
+
+
+def replay(queries: List[Tuple[str, str]], threshold: float = None) -> Dict:
+    """Hit rate of exact (normalized) matching vs the semantic cache over a query log"""
+    exact_seen = set()
+    semantic = SemanticCache(threshold=threshold)
+    exact_hits = semantic_hits = 0
+    lookup_ms = []
+    for state, question in queries:
+        exact_key = (state, normalize_question(question))
+        exact_hit = exact_key in exact_seen
+        exact_hits += exact_hit
+        exact_seen.add(exact_key)
+
+        start = time.time()
+        match = semantic.lookup(state, question)
+        lookup_ms.append((time.time() - start) * 1000)
+        if match is not None or exact_hit:
+            semantic_hits += 1
+        else:
+            semantic.add(state, question, question)
+
+    total = len(queries) or 1
+    lookup_ms.sort()
+    report = {
+        'queries': len(queries),
+        'threshold': semantic.threshold,
+        'exact_hit_rate': round(exact_hits / total, 3),
+        'semantic_hit_rate': round(semantic_hits / total, 3),
+        'uplift': round((semantic_hits - exact_hits) / total, 3),
+        'p50_lookup_ms': round(lookup_ms[len(lookup_ms) // 2], 3) if lookup_ms else 0.0,
+        'p95_lookup_ms': round(lookup_ms[min(len(lookup_ms) - 1, int(len(lookup_ms) * 0.95))], 3) if lookup_ms else 0.0
+    }
+    print(f"Exact hit rate:    {report['exact_hit_rate']:.1%}")
+    print(f"Semantic hit rate: {report['semantic_hit_rate']:.1%} (threshold {report['threshold']})")
+    print(f"Uplift:            {report['uplift']:+.1%}  lookup p50 {report['p50_lookup_ms']:.3f}ms "
+          f"p95 {report['p95_lookup_ms']:.3f}ms")
+    return report
+
+
+if __name__ == "__main__":
+    print("DriveSmart Semantic Cache Replay")
+    args = sys.argv[1:]
+    threshold = None
+    if '--threshold' in args:
+        position = args.index('--threshold')
+        threshold = float(args[position + 1])
+        del args[position:position + 2]
+    if args:
+        log = load_query_log(args[0])
+    else:
+        from dense_retriever import load_quiz_questions
+        log = [('washington', q['question']) for q in load_quiz_questions('washington')]
+    replay(log, threshold)
@@ -0,0 +1,84 @@
+"""
+Sentence Index - Pre-Segmented Sentences for Extractive Answers
+===============================================================
+The extractive answerer (the fallback when Ollama is busy, disabled or out
+of time) scores sentences of the retrieved chunks by word overlap with the
+question. Each state's chunks are segmented and tokenized once when the
+manual loads, so answering only intersects the query's words with
+precomputed per-sentence word sets.
+
+Layout: sentences are stored flat in chunk order; `chunk_offsets[i]` to
+`chunk_offsets[i + 1]` are chunk i's sentences and `sentence_chunk[j]` is
+the chunk sentence j came from.
+"""
+
+import time
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+import numpy as np
+from search_index import StateIndex
+
+MIN_SENTENCE_CHARS = 20  # shorter fragments (headings, list markers) are never quoted
+
+SentenceRecord = Tuple[str, FrozenSet[str]]
+
+
+def segment(text: str) -> List[SentenceRecord]:
+    """(sentence, lowercased word set) for each sentence of a chunk worth quoting"""
+    records = []
+    for sentence in text.replace('!', '.').replace('?', '.').split('.'):
+        sentence = sentence.strip()
+        if len(sentence) > MIN_SENTENCE_CHARS:
+            records.append((sentence, frozenset(word.lower() for word in sentence.split())))
+    return records
+
+
+class SentenceIndex:
+    """
+    Sentences and word sets of every chunk in one state's index
+    """
+
+    def __init__(self, index: StateIndex):
+        start = time.time()
+        self.state = index.state
+        self.index = index
+        self.records: List[SentenceRecord] = []
+        offsets = [0]
+        chunk_of = []
+        lengths = []
+        self._chunk_ids: Dict[int, int] = {}
+        for chunk_id in range(len(index)):
+            chunk = index.chunk(chunk_id)
+            self._chunk_ids.setdefault(hash(chunk), chunk_id)
+            lengths.append(len(chunk))
+            records = segment(chunk)
+            self.records.extend(records)
+            chunk_of.extend([chunk_id] * len(records))
+            offsets.append(len(self.records))
+        self.chunk_offsets = np.array(offsets, dtype=np.uint32)
+        self.sentence_chunk = np.array(chunk_of, dtype=np.uint32)
+        self.chunk_lengths = np.array(lengths, dtype=np.uint32)
+        self.build_ms = round((time.time() - start) * 1000, 2)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def nbytes(self) -> int:
+        words = sum(len(record[1]) for record in self.records)
+        return sum(len(record[0]) + 49 + 216 for record in self.records) + words * 60 \
+            + self.chunk_offsets.nbytes + self.sentence_chunk.nbytes + self.chunk_lengths.nbytes \
+            + len(self._chunk_ids) * 100
+
+    def chunk_id(self, chunk: str) -> Optional[int]:
+        """Id of a chunk by its text, or None if it isn't from this index"""
+        chunk_id = self._chunk_ids.get(hash(chunk))
+        if chunk_id is None or self.chunk_lengths[chunk_id] != len(chunk) or self.index.chunk(chunk_id) != chunk:
+            return None  # the length check skips decoding the stored text for most hash collisions
+        return chunk_id
+
+    def chunk_sentences(self, chunk: str) -> Sequence[SentenceRecord]:
+        """A chunk's sentence records - precomputed, or segmented now for text from elsewhere"""
+        chunk_id = self.chunk_id(chunk)
+        if chunk_id is None:
+            return segment(chunk)
+        return self.records[self.chunk_offsets[chunk_id]:self.chunk_offsets[chunk_id + 1]]
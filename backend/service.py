@@ -6,13 +6,13 @@ Combines all AI services with Grade B enhanced RAG system
 
 import json
 import time
-import requests
 from database import get_db
+from ollama_client import get_ollama_client
 
 # Enhanced RAG Agent for high precision
 try:
-    from lightweight_rag import LightweightRAGAgent
-    enhanced_rag = LightweightRAGAgent()
+    from lightweight_rag import get_shared_agent
+    enhanced_rag = get_shared_agent()
     RAG_AVAILABLE = True
     print("✅ Enhanced Lightweight RAG loaded")
 except ImportError:
@@ -54,29 +54,21 @@ def generate_basic_ollama_response(prompt: str) -> str:
     Direct Ollama API call without RAG
     """
     try:
-        url = "http://localhost:11434/api/generate"
-        
-        payload = {
-            "model": "mistral",
-            "prompt": f"""You are a driving instructor AI assistant. Answer this question about driving rules and traffic laws:
+        result = get_ollama_client().generate(
+            model="mistral",
+            prompt=f"""You are a driving instructor AI assistant. Answer this question about driving rules and traffic laws:
 
 {prompt}
 
 Provide a clear, accurate, and helpful response focused on practical driving advice.""",
-            "stream": False,
-            "options": {
+            options={
                 "temperature": 0.3,
                 "top_p": 0.8,
                 "num_predict": 200
-            }
-        }
-        
-        response = requests.post(url, json=payload, timeout=30)
-        if response.status_code == 200:
-            result = response.json()
-            return result.get('response', generate_fallback_response(prompt))
-        else:
-            return generate_fallback_response(prompt)
+            },
+            timeout=30
+        )
+        return result.get('response') or generate_fallback_response(prompt)
             
     except Exception as e:
         print(f"Ollama API error: {e}")
@@ -172,8 +172,8 @@ class SimpleLearningSystem:
             rag_tips = []
             if use_rag:
                 try:
-                    from lightweight_rag import LightweightRAGAgent
-                    rag_agent = LightweightRAGAgent()
+                    from lightweight_rag import get_shared_agent
+                    rag_agent = get_shared_agent()
                     
                     # Generate state-specific query for weak areas
                     rag_query = f"Study tips and specific rules for {', '.join(weak_areas)} in {state.title()} state driving test preparation"
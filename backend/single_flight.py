@@ -0,0 +1,109 @@
+"""
+Single Flight - Coalesce Identical Concurrent Requests
+======================================================
+When many students send the same question at once, only the first request
+(the leader) does the work; the others wait for and share its result.
+Each flight is a Future, so the leader can hand its work to a worker pool
+(`submit`) and waiters block on the request thread without taking a pool
+slot. Waiters can bound their wait, so a caller whose own deadline passes
+gives up instead of waiting until the leader finishes.
+"""
+
+import concurrent.futures
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class _Flight:
+    def __init__(self):
+        self.future = concurrent.futures.Future()
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    In-flight deduplication keyed by an arbitrary hashable key
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._counters = {'leaders': 0, 'coalesced': 0, 'errors': 0, 'wait_timeouts': 0}
+
+    def _join(self, key: Hashable) -> Tuple[_Flight, bool]:
+        """The key's flight and whether this caller leads it"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.waiters += 1
+                self._counters['coalesced'] += 1
+                return flight, False
+            flight = self._flights[key] = _Flight()
+            self._counters['leaders'] += 1
+            return flight, True
+
+    def _land(self, key: Hashable, flight: _Flight, result: Any = None, error: BaseException = None):
+        """Retire the flight (new callers start a fresh one) and release its waiters"""
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            if error is not None:
+                self._counters['errors'] += 1
+        if error is not None:
+            flight.future.set_exception(error)
+        else:
+            flight.future.set_result(result)
+
+    def submit(self, key: Hashable, start: Callable[[], concurrent.futures.Future]) -> Tuple[concurrent.futures.Future, bool]:
+        """
+        Join the key's flight, or lead a new one by calling `start()` (e.g. a
+        worker pool submit). Returns (future, shared). Errors raised by
+        `start` (e.g. PoolFullError) propagate to the leader and its waiters.
+        """
+        flight, leader = self._join(key)
+        if not leader:
+            return flight.future, True
+        try:
+            work = start()
+        except Exception as e:
+            self._land(key, flight, error=e)
+            raise
+
+        def done(work_future):
+            error = work_future.exception()
+            self._land(key, flight, None if error else work_future.result(), error)
+
+        work.add_done_callback(done)
+        return flight.future, False
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: Optional[float] = None) -> Tuple[Any, bool]:
+        """
+        Run `fn` once per key at a time on the calling thread. Returns
+        (result, shared) - `shared` is True for callers that waited on another
+        caller's computation. A waiter raises concurrent.futures.TimeoutError
+        if the leader hasn't finished within `timeout` seconds.
+        """
+        flight, leader = self._join(key)
+        if not leader:
+            return self.wait(flight.future, timeout), True
+        try:
+            result = fn()
+        except Exception as e:
+            self._land(key, flight, error=e)
+            raise
+        self._land(key, flight, result)
+        return result, False
+
+    def wait(self, future: concurrent.futures.Future, timeout: Optional[float] = None) -> Any:
+        """A flight's result, waiting up to `timeout` seconds"""
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            with self._lock:
+                self._counters['wait_timeouts'] += 1
+            raise
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._counters, in_flight=len(self._flights),
+                        waiting=sum(flight.waiters for flight in self._flights.values()))
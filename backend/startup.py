@@ -9,10 +9,10 @@ Orchestrates Ollama + Flask for production deployment
 - Production-ready logging
 """
 import subprocess
-import time
 import sys
 import os
 import logging
+import startup_orchestrator
 
 # Configure logging
 logging.basicConfig(
@@ -38,46 +38,6 @@ def start_ollama_server():
         logger.error(f"❌ Failed to start Ollama: {e}")
         return None
 
-def pull_mistral_model():
-    """Pull Mistral model with timeout and error handling"""
-    logger.info("⏳ Waiting for Ollama to initialize...")
-    time.sleep(15)  # Reduced wait time
-    
-    logger.info("📥 Attempting to pull Mistral model...")
-    try:
-        result = subprocess.run(
-            ['ollama', 'pull', 'mistral:latest'],
-            capture_output=True,
-            text=True,
-            timeout=300  # 5 minute timeout for model download
-        )
-        
-        if result.returncode == 0:
-            logger.info("✅ Mistral model pulled successfully")
-            return True
-        else:
-            logger.warning(f"⚠️ Model pull failed, continuing without model: {result.stderr}")
-            return False
-            
-    except subprocess.TimeoutExpired:
-        logger.warning("⚠️ Model pull timed out - app will work without pre-downloaded model")
-        return False
-    except Exception as e:
-        logger.warning(f"⚠️ Model pull error, continuing: {e}")
-        return False
-
-def initialize_database():
-    """Initialize the SQLite database"""
-    logger.info("🗄️ Initializing database...")
-    try:
-        from database import init_db
-        init_db()
-        logger.info("✅ Database initialized successfully")
-        return True
-    except Exception as e:
-        logger.error(f"❌ Database initialization failed: {e}")
-        return False
-
 def start_flask_app():
     """Start Flask application with Railway configuration"""
     logger.info("🌐 Starting Flask application...")
@@ -121,15 +81,11 @@ def main():
     if not ollama_process:
         logger.warning("⚠️ Ollama failed to start - AI features may be limited")
     
-    # Step 2: Pull Mistral model (optional, app can work without it)
-    pull_mistral_model()
-    
-    # Step 3: Initialize database
-    if not initialize_database():
-        logger.error("❌ Database initialization failed - exiting")
-        sys.exit(1)
+    # Step 2: Wait for Ollama, pull + warm up Mistral and init the database - in parallel
+    # and in the background while the app imports; /api/ready flips when all are done
+    startup_orchestrator.start(background=True)
     
-    # Step 4: Start Flask application (this blocks)
+    # Step 3: Start Flask application (this blocks)
     logger.info("🎯 Starting main application...")
     start_flask_app()
 
@@ -0,0 +1,184 @@
+"""
+Startup Orchestrator - Parallel Warm-Up and Readiness Tracking
+==============================================================
+Replaces the fixed `sleep(15)` + `ollama pull` startup sequence:
+- polls Ollama's HTTP API until it answers instead of sleeping
+- pulls the model only if it isn't already present
+- loads the model with a one-token warm-up generation and a long keep_alive,
+  so the first student question doesn't pay the model load
+- initializes the database in parallel with all of that
+
+The manual indexes are not a step here: importing chat.py preloads them
+before the server can answer anything. GET /api/ready reports 503 until
+every step has finished and the database step succeeded (a failed model
+step still counts - extractive answers work without it), then 200.
+"""
+
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+OLLAMA_STARTUP_TIMEOUT = float(os.environ.get('OLLAMA_STARTUP_TIMEOUT', 120))
+OLLAMA_PULL_TIMEOUT = float(os.environ.get('OLLAMA_PULL_TIMEOUT', 600))
+READINESS_POLL_INTERVAL = 0.5
+
+# Steps the app can't serve without; model steps may fail (extractive answers still work)
+REQUIRED_STEPS = ('database',)
+
+
+class Readiness:
+    """
+    Status of each startup step; ready once all have finished and the required ones succeeded
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = None
+        self.ready_at = None
+        self.steps: Dict[str, Dict] = {}
+
+    @property
+    def orchestrated(self) -> bool:
+        return self.started_at is not None
+
+    @property
+    def ready(self) -> bool:
+        with self._lock:
+            if not self.orchestrated:
+                return True  # started without the orchestrator (e.g. `python app.py`) - nothing to wait for
+            return self._finished()
+
+    def _finished(self) -> bool:
+        finished = all(step['status'] in ('ok', 'failed', 'skipped') for step in self.steps.values())
+        required_ok = all(self.steps.get(name, {}).get('status') == 'ok' for name in REQUIRED_STEPS)
+        return finished and required_ok
+
+    def begin(self, names):
+        with self._lock:
+            self.started_at = time.time()
+            self.steps = {name: {'status': 'pending'} for name in names}
+
+    def update(self, name: str, status: str, **details):
+        with self._lock:
+            step = self.steps.setdefault(name, {})
+            step.update(details, status=status)
+            if status in ('ok', 'failed', 'skipped') and self.started_at:
+                step['finished_after_s'] = round(time.time() - self.started_at, 2)
+            became_ready = self.orchestrated and self.ready_at is None and self._finished()
+            if became_ready:
+                self.ready_at = time.time()
+        if became_ready:
+            logger.info(f"✅ Ready after {self.ready_at - self.started_at:.1f}s")
+
+    def to_dict(self) -> Dict:
+        ready = self.ready
+        with self._lock:
+            model_ok = self.steps.get('warmup', {}).get('status') == 'ok'
+            return {
+                'ready': ready,
+                'orchestrated': self.orchestrated,
+                'degraded': ready and self.orchestrated and not model_ok,
+                'startup_s': round(self.ready_at - self.started_at, 2) if self.ready_at and self.started_at else None,
+                'steps': {name: dict(step) for name, step in self.steps.items()}
+            }
+
+
+readiness = Readiness()
+
+
+def _run_step(name: str, fn: Callable[[], None]) -> bool:
+    readiness.update(name, 'running')
+    start = time.time()
+    try:
+        fn()
+        readiness.update(name, 'ok', ms=round((time.time() - start) * 1000))
+        return True
+    except Exception as e:
+        logger.warning(f"⚠️ Startup step {name} failed: {e}")
+        readiness.update(name, 'failed', ms=round((time.time() - start) * 1000), error=str(e))
+        return False
+
+
+def wait_for_ollama(timeout: float = OLLAMA_STARTUP_TIMEOUT):
+    """Poll /api/tags until the server answers"""
+    from ollama_client import get_ollama_client
+
+    client = get_ollama_client()
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if client.list_models(timeout=1.0) is not None:
+            logger.info("✅ Ollama is answering")
+            return
+        time.sleep(READINESS_POLL_INTERVAL)
+    raise TimeoutError(f"Ollama did not answer within {timeout:.0f}s")
+
+
+def ensure_model(model: str):
+    """Pull the model unless it's already downloaded"""
+    from ollama_client import get_ollama_client
+
+    client = get_ollama_client()
+    models = client.list_models() or []
+    if model in models or f"{model}:latest" in models:
+        logger.info(f"✅ Model {model} already present")
+        return
+    logger.info(f"📥 Pulling {model}...")
+    if not client.pull(model, timeout=OLLAMA_PULL_TIMEOUT):
+        raise RuntimeError(f"pull of {model} did not succeed")
+    logger.info(f"✅ Model {model} pulled")
+
+
+def warm_up_model(model: str):
+    """Load the model into memory with a one-token generation and a long keep_alive"""
+    from ollama_client import get_ollama_client, OLLAMA_KEEP_ALIVE
+
+    get_ollama_client().generate(model, 'Hello', options={'num_predict': 1},
+                                 timeout=OLLAMA_PULL_TIMEOUT, keep_alive=OLLAMA_KEEP_ALIVE)
+    logger.info(f"🔥 Model {model} loaded (keep_alive {OLLAMA_KEEP_ALIVE})")
+
+
+def _model_pipeline():
+    from lightweight_rag import OLLAMA_AVAILABLE, OLLAMA_MODEL
+
+    if not OLLAMA_AVAILABLE:
+        for name in ('ollama', 'model', 'warmup'):
+            readiness.update(name, 'skipped')
+        return
+    if not _run_step('ollama', wait_for_ollama):
+        readiness.update('model', 'skipped')
+        readiness.update('warmup', 'skipped')
+        return
+    _run_step('model', lambda: ensure_model(OLLAMA_MODEL))
+    _run_step('warmup', lambda: warm_up_model(OLLAMA_MODEL))
+
+
+def _init_database():
+    from database import init_db, check_db_health
+
+    init_db()  # logs and swallows its own errors, so check the result
+    health = check_db_health()
+    if health['status'] != 'healthy':
+        raise RuntimeError(f"database {health['status']}: {health.get('missing_tables') or health.get('error')}")
+
+
+def start(background: bool = True):
+    """
+    Run the model pipeline (wait for Ollama, pull, warm up) and database init in parallel.
+    With background=True this returns immediately so the app can import (and
+    preload the indexes) and start serving while warm-up continues.
+    """
+    readiness.begin(['ollama', 'model', 'warmup', 'database'])
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix='startup')
+    futures = [
+        executor.submit(_model_pipeline),
+        executor.submit(_run_step, 'database', _init_database)
+    ]
+    executor.shutdown(wait=not background)
+    if not background:
+        concurrent.futures.wait(futures)
+    return futures
@@ -0,0 +1,57 @@
+"""
+ANN index tests: an IVF build probed in full matches exact dense search, and stale builds aren't opened
+"""
+
+import os
+
+from ann_index import AnnIndex, build_state
+from dense_retriever import DenseIndex
+from search_index import StateIndex
+
+CHUNKS = [
+    'Never park within fifteen feet of a fire hydrant or on the curb.',
+    'Parking beside a hydrant or a painted curb can get your vehicle towed.',
+    'When parking uphill at a curb, turn your wheels away from the curb.',
+    'Stop for a school bus when its red lights flash and children cross.',
+    'Children leaving a school bus may run into the road without looking.',
+    'Drivers behind a stopped bus must wait until children have crossed.',
+    'Merge onto the freeway at highway speed and signal before the merge.',
+    'On the freeway keep right except to pass and signal every lane change.',
+    'Signal every lane change on the highway and check your blind spot.',
+]
+
+
+def _build(tmp_path):
+    source = tmp_path / 'test.txt'
+    source.write_text('\n\n'.join(CHUNKS))
+    index = StateIndex('test', CHUNKS)
+    build_state('test', index, str(source), nlist=3, ann_dir=str(tmp_path))
+    return index, source
+
+
+def test_full_probe_matches_dense_search(tmp_path):
+    index, source = _build(tmp_path)
+    ann = AnnIndex.open('test', str(source), len(CHUNKS), ann_dir=str(tmp_path))
+    assert ann is not None
+    dense = DenseIndex(index, quantize=False)
+    for query in ['hydrant curb', 'school bus children', 'freeway lane signal']:
+        exact = dense.search(query)['hits']
+        probed = ann.search(query, nprobe=3)
+        assert probed['candidates'] == len(CHUNKS)
+        assert [chunk_id for chunk_id, _ in probed['hits']] == [chunk_id for chunk_id, _ in exact]
+
+
+def test_single_probe_scans_one_cluster(tmp_path):
+    _build(tmp_path)
+    ann = AnnIndex.open('test', ann_dir=str(tmp_path))
+    result = ann.search('hydrant curb', nprobe=1)
+    assert 0 < result['candidates'] < len(CHUNKS)
+    assert result['hits'][0][0] in (0, 1, 2)
+
+
+def test_stale_build_is_not_opened(tmp_path):
+    _, source = _build(tmp_path)
+    assert AnnIndex.open('test', chunks=len(CHUNKS) + 1, ann_dir=str(tmp_path)) is None
+    os.utime(source, ns=(1, 1))
+    assert AnnIndex.open('test', str(source), ann_dir=str(tmp_path)) is None
+    assert AnnIndex.open('missing', ann_dir=str(tmp_path)) is None
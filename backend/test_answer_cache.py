@@ -0,0 +1,24 @@
+"""
+Answer cache tests: keys, persistence and invalidation
+"""
+
+from answer_cache import AnswerCache, answer_key
+
+
+def test_invalidate_states_drops_only_matching_entries(tmp_path):
+    cache = AnswerCache(path=str(tmp_path / 'answers.db'))
+    cache.put('k1', 'washington', 'q1', 'm', 'a1')
+    cache.put('k2', 'new jersey', 'q2', 'm', 'a2')
+    cache.put('k3', 'washington+newjersey', 'q3', 'm', 'a3')
+    dropped = cache.invalidate_states(lambda label: 'newjersey' in label.replace(' ', '').split('+'))
+    assert dropped == 2
+    assert cache.get('k1') == 'a1'
+    assert cache.get('k2') is None and cache.get('k3') is None
+
+
+def test_key_keeps_negation_and_ignores_phrasing():
+    contexts = ['Stop for a school bus with flashing red lights.']
+    key = answer_key('washington', 'Must I stop for a school bus?', contexts, 'm', {'num_predict': 300})
+    assert key == answer_key('washington', 'must i stop for a school bus', contexts, 'm', {'num_predict': 300})
+    assert key != answer_key('washington', "Mustn't I stop for a school bus?", contexts, 'm', {'num_predict': 300})
+    assert key != answer_key('washington', 'Must I stop for a school bus?', contexts, 'm', {'num_predict': 100})
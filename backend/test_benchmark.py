@@ -0,0 +1,37 @@
+"""
+Benchmark tests: offline, isolated from production caches, and strict about arguments
+"""
+
+import pytest
+import answer_cache
+import benchmark
+
+
+def test_agent_never_opens_the_production_answer_cache(tmp_path, monkeypatch):
+    opened = []
+    real_init = answer_cache.AnswerCache.__init__
+
+    def tracking_init(self, path=None, *args, **kwargs):
+        opened.append(path)
+        real_init(self, path, *args, **kwargs)
+
+    monkeypatch.setattr(answer_cache.AnswerCache, '__init__', tracking_init)
+    agent = benchmark.BenchmarkAgent(str(tmp_path))
+    assert opened == [str(tmp_path / 'answer_cache.db')]
+    assert agent.answer_cache.path == str(tmp_path / 'answer_cache.db')
+
+
+def test_metrics_on_a_small_golden_set(tmp_path):
+    agent = benchmark.BenchmarkAgent(str(tmp_path))
+    golden = benchmark.build_golden_set(agent.registry, 'washington')[:5]
+    assert golden and all('gold_chunks' in question for question in golden)
+    result = benchmark.benchmark_retrieval(agent, 'washington', golden, 'lexical', 5, 1)
+    assert 0.0 <= result['hit_rate'] <= 1.0 and result['p50_ms'] >= 0
+
+
+@pytest.mark.parametrize('argv', [['--bogus'], ['atlantis'], ['washington', '--strategies', 'psychic']])
+def test_bad_arguments_exit_before_writing(argv, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(SystemExit):
+        benchmark._parse_args(argv)
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,176 @@
+"""
+Chat endpoint tests (Ollama disabled, see conftest.py)
+"""
+
+import json
+import threading
+import time
+import pytest
+from flask import Flask
+import chat
+from worker_pool import BoundedWorkerPool
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.register_blueprint(chat.chat_bp, url_prefix='/api/chat')
+    return app.test_client()
+
+
+def test_identical_burst_runs_one_generation(client, monkeypatch):
+    monkeypatch.setattr(chat, 'llm_pool', BoundedWorkerPool(max_workers=2, max_queue=2))
+    calls = []
+
+    def slow_chat(message, state=None, candidate_budget=None, strategy=None, deadline=None):
+        calls.append(message)
+        time.sleep(0.5)
+        return {'response': 'Stop at least 20 feet from a school bus.', 'contexts_used': 3}
+
+    monkeypatch.setattr(chat.rag_agent, '_chat_with_rag', slow_chat)
+    barrier = threading.Barrier(20)
+    responses = []
+
+    def ask():
+        barrier.wait()
+        responses.append(client.post('/api/chat/', json={'message': 'Must I stop for a school bus?'}).get_json())
+
+    threads = [threading.Thread(target=ask) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert len(responses) == 20
+    assert all(response['system'] == 'lightweight_rag' for response in responses)
+    assert chat.llm_pool.stats()['rejected'] == 0
+
+
+@pytest.mark.parametrize('body, error', [
+    (['what is the speed limit?'], 'invalid_body'),
+    ({'items': ['what is the speed limit?'], 'state': 7}, 'invalid_state'),
+    ({'items': ['what is the speed limit?'], 'state': ['washington']}, 'invalid_state'),
+    ({'items': [{'question': 'what is the speed limit?', 'state': 7}]}, 'invalid_item'),
+    ({'items': [{'question': 5}]}, 'invalid_item'),
+    ({'items': [None]}, 'invalid_item'),
+    ({'items': ['what is the speed limit?'], 'timeout': 'soon'}, 'invalid_timeout'),
+    ({'items': ['what is the speed limit?'], 'timeout': 'nan'}, 'invalid_timeout'),
+    ({'items': []}, 'no_items'),
+])
+def test_batch_rejects_malformed_input(client, body, error):
+    response = client.post('/api/chat/batch', json=body)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == error
+
+
+def test_batch_null_state_uses_default(client):
+    response = client.post('/api/chat/batch', json={
+        'state': None,
+        'items': ['how far from a fire hydrant can I park?', {'question': 'what does a flashing red light mean?', 'state': None}]
+    })
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [result['state'] for result in results] == ['washington', 'washington']
+    assert all(result['status'] in ('ok', 'partial') for result in results)
+
+
+def test_two_phase_answer_and_followup(client, monkeypatch):
+    def fake_stream(message, state=None, candidate_budget=None, strategy=None, deadline=None):
+        yield {'event': 'token', 'data': {'text': 'Stop for the bus.'}}
+        yield {'event': 'done', 'data': {'response': 'Stop for the bus.', 'rag_enhanced': True}}
+
+    monkeypatch.setattr(chat.rag_agent, 'stream_chat', fake_stream)
+    first = client.post('/api/chat/', json={
+        'message': 'When must I stop for a stopped school bus with flashing lights?', 'two_phase': True
+    }).get_json()
+    assert first['phase'] == 1 and first['followup_id']
+
+    followup = client.get(f"{first['followup_url']}?wait=5").get_json()
+    assert followup['status'] == 'done'
+    assert followup['response'] == 'Stop for the bus.'
+
+
+@pytest.mark.parametrize('wait', ['soon', '-1', 'inf'])
+def test_followup_rejects_invalid_wait(client, wait):
+    followup = chat.followups.create()
+    response = client.get(f"/api/chat/followup/{followup.id}?wait={wait}")
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'invalid_wait'
+
+
+def test_unknown_followup_is_404(client):
+    assert client.get('/api/chat/followup/nope').status_code == 404
+
+
+@pytest.mark.parametrize('body, error', [
+    ({'message': 'What is the speed limit in Washington?'}, 'need_two_states'),
+    ({'message': 'Compare speed limits', 'states': ['washington', 'wa']}, 'need_two_states'),
+    ({'message': 'Compare speed limits',
+      'states': ['washington', 'california', 'florida', 'newjersey', 'texas']}, 'too_many_states'),
+])
+def test_compare_needs_two_to_four_states(client, body, error):
+    response = client.post('/api/chat/compare', json=body)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == error
+
+
+def test_compare_answers_per_state(client):
+    response = client.post('/api/chat/compare', json={
+        'message': "How does California's right on red rule differ from Washington's?"
+    })
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result['system'] == 'lightweight_rag'
+    assert sorted(result['states']) == ['california', 'washington']
+    assert set(result['per_state']) == {'california', 'washington'}
+    assert all(state['status'] == 'ok' for state in result['per_state'].values())
+    assert result['response']
+
+
+def test_compare_overloaded_falls_back(client, monkeypatch):
+    monkeypatch.setattr(chat, 'llm_pool', BoundedWorkerPool(max_workers=1, max_queue=0))
+    release = threading.Event()
+    chat.llm_pool.submit(release.wait, 5)
+    try:
+        result = client.post('/api/chat/compare', json={
+            'message': 'Compare school bus rules', 'states': ['california', 'washington']
+        }).get_json()
+    finally:
+        release.set()
+    assert result['system'] == 'fallback'
+    assert result['fallback_reason'] == 'overloaded'
+
+
+def _events(response):
+    """(event, data) pairs from a Server-Sent Events body"""
+    events = []
+    for block in response.get_data(as_text=True).split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+        if 'event' in lines:
+            events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def test_stream_ends_with_done(client):
+    response = client.post('/api/chat/stream', json={'message': 'How far from a fire hydrant can I park?'})
+    assert response.mimetype == 'text/event-stream'
+    events = _events(response)
+    assert events[-1][0] == 'done'
+    assert 'token' in [event for event, _ in events]
+    assert events[-1][1]['response']
+
+
+def test_stream_overloaded_falls_back(client, monkeypatch):
+    monkeypatch.setattr(chat, 'llm_pool', BoundedWorkerPool(max_workers=1, max_queue=0))
+    release = threading.Event()
+    chat.llm_pool.submit(release.wait, 5)
+    try:
+        events = _events(client.get('/api/chat/stream?message=Can+I+turn+right+on+red%3F'))
+    finally:
+        release.set()
+    assert [event for event, _ in events] == ['token', 'done']
+    assert events[-1][1]['fallback_reason'] == 'overloaded'
+
+
+def test_stream_requires_a_message(client):
+    assert client.post('/api/chat/stream', json={}).status_code == 400
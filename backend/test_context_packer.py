@@ -0,0 +1,32 @@
+"""
+Context packer tests: deduplication, relevance trimming and the token budget
+"""
+
+from context_packer import estimate_tokens, pack_context, trim_to_relevant
+
+FILLER = ' '.join(f'Sentence {i} covers vehicle registration fees and renewal forms.' for i in range(30))
+
+
+def test_near_duplicates_are_dropped():
+    chunks = [
+        'Stop at least 20 feet from a school bus with flashing red lights.',
+        'Stop at least 20 feet from a  school bus with flashing red lights!',
+        'Do not park within 15 feet of a fire hydrant.',
+    ]
+    packed = pack_context('school bus', chunks, budget_tokens=200)
+    assert packed == [chunks[0], chunks[2]]
+
+
+def test_packed_context_fits_the_budget():
+    chunks = [FILLER + ' Stop 20 feet behind a school bus.', FILLER, 'Yield to a school bus leaving a stop.']
+    packed = pack_context('school bus', chunks, budget_tokens=60)
+    assert sum(estimate_tokens(text) for text in packed) <= 60
+    assert 'school bus' in packed[0]
+    assert packed[-1] == chunks[2]
+
+
+def test_trim_keeps_relevant_sentences_in_order():
+    text = 'Registration costs money. Stop for a school bus. Renew online. Never pass a bus loading children.'
+    trimmed = trim_to_relevant(text, {'bus', 'school'}, max_tokens=30, keep_unrelated=False)
+    assert trimmed == 'Stop for a school bus. Never pass a bus loading children.'
+    assert trim_to_relevant('Registration costs money.', {'bus'}, 30, keep_unrelated=False) == ''
@@ -0,0 +1,77 @@
+"""
+Corpus registry tests: lazy loading, LRU eviction and invalidation when a manual changes
+"""
+
+import os
+from corpus_registry import CorpusRegistry, estimate_index_bytes
+
+
+def _manual(path, topic, lines=40):
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(lines):
+            f.write(f"Rule {i}: drivers must follow the {topic} requirements described in section {i} of this manual.\n")
+    return str(path)
+
+
+def _registry(tmp_path, budget_mb=64):
+    catalog = {
+        'alpha': {'name': 'Alpha', 'aliases': ['al'], 'path': _manual(tmp_path / 'alpha.txt', 'parking')},
+        'beta': {'name': 'Beta', 'aliases': [], 'path': _manual(tmp_path / 'beta.txt', 'speed limit')},
+    }
+    return CorpusRegistry(catalog=catalog, memory_budget_mb=budget_mb)
+
+
+def test_lazy_load_and_shared_index(tmp_path):
+    registry = _registry(tmp_path)
+    assert registry.stats()['loaded_states'] == []
+    index = registry.get_index('al')
+    assert index is registry.get_index('Alpha') and len(index) == 40
+    assert registry.get_index('nowhere') is None
+
+
+def test_lru_eviction_under_budget(tmp_path):
+    registry = _registry(tmp_path, budget_mb=0.0001)
+    registry.get_index('alpha')
+    registry.get_index('beta')
+    stats = registry.stats()
+    assert stats['loaded_states'] == ['beta']
+    assert stats['states']['alpha']['evictions'] == 1
+
+
+def test_changed_manual_invalidates_on_next_load(tmp_path):
+    registry = _registry(tmp_path, budget_mb=0.0001)
+    notified = []
+    registry.add_reload_listener(notified.append)
+    registry.get_index('alpha')
+    registry.get_index('beta')  # evicts alpha
+    registry.get_index('alpha')  # same manual - nothing to invalidate
+    assert notified == []
+
+    path = registry.catalog['beta']['path']
+    _manual(path, 'school bus', lines=45)
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 10 ** 9))
+    index = registry.get_index('beta')  # evicted earlier, re-read from the edited manual
+    assert notified == ['beta']
+    assert len(index) == 45
+
+
+def test_reload_notifies_once(tmp_path):
+    registry = _registry(tmp_path)
+    notified = []
+    registry.add_reload_listener(notified.append)
+    registry.get_index('alpha')
+    assert notified == []
+    registry.reload('alpha')
+    assert notified == ['alpha']
+
+
+def test_memory_accounts_for_every_structure(tmp_path):
+    registry = _registry(tmp_path)
+    index = registry.get_index('alpha')
+    sentences = registry.get_sentence_index('alpha')
+    dense = registry.get_dense_index('alpha')
+    used = registry.stats()['states']['alpha']['bytes']
+    assert sentences is not None and dense is not None
+    assert used == estimate_index_bytes(index) + sentences.nbytes + dense.nbytes
+    assert used == registry.stats()['memory_used_bytes']
+    assert index is registry.get_index('alpha')
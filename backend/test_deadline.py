@@ -0,0 +1,45 @@
+"""
+Deadline tests: the remaining budget, and generation sized to it
+"""
+
+import time
+
+import lightweight_rag
+from deadline import Deadline
+
+
+def test_remaining_and_cap():
+    deadline = Deadline(10)
+    assert 9 < deadline.remaining() <= 10
+    assert deadline.cap(2) == 2
+    assert deadline.cap(60) <= 10
+    assert not deadline.expired()
+    assert deadline.to_dict()['budget_s'] == 10
+
+
+def test_expired_deadline_never_goes_negative():
+    deadline = Deadline(0.01)
+    time.sleep(0.03)
+    assert deadline.expired()
+    assert deadline.remaining() == 0.0
+    assert deadline.cap(5) == 0.0
+
+
+def test_of_keeps_the_callers_deadline():
+    deadline = Deadline(3)
+    assert Deadline.of(deadline, 30) is deadline
+    assert Deadline.of(None, 30).budget == 30
+
+
+def test_generation_is_sized_to_the_deadline():
+    agent = lightweight_rag.LightweightRAGAgent()
+    full = lightweight_rag.GENERATE_OPTIONS
+    assert agent._generation_options(None) is full
+    assert agent._generation_options(Deadline(3600)) is full
+    assert agent._generation_options(Deadline(0.5)) is None
+
+    seconds = (full['num_predict'] - 20) / lightweight_rag.GENERATION_TOKENS_PER_SECOND
+    seconds = max(seconds, lightweight_rag.MIN_GENERATION_SECONDS + 0.5)
+    options = agent._generation_options(Deadline(seconds + lightweight_rag.DEADLINE_SAFETY_SECONDS))
+    assert options is not None
+    assert options['num_predict'] < full['num_predict']
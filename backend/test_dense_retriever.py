@@ -0,0 +1,46 @@
+"""
+Dense retriever tests: topical ranking, batched search and int8 quantization
+"""
+
+import numpy as np
+
+from dense_retriever import DenseIndex
+from search_index import StateIndex
+
+CHUNKS = [
+    'Never park within fifteen feet of a fire hydrant or on the curb.',
+    'Parking beside a hydrant or a painted curb can get your vehicle towed.',
+    'When parking uphill at a curb, turn your wheels away from the curb.',
+    'Stop for a school bus when its red lights flash and children cross.',
+    'Children leaving a school bus may run into the road without looking.',
+    'Drivers behind a stopped bus must wait until children have crossed.',
+    'Merge onto the freeway at highway speed and signal before the merge.',
+    'On the freeway keep right except to pass and signal every lane change.',
+]
+
+
+def test_topic_ranks_first():
+    dense = DenseIndex(StateIndex('test', CHUNKS))
+    assert dense.search('hydrant curb')['hits'][0][0] in (0, 1, 2)
+    assert dense.search('school bus children')['hits'][0][0] in (3, 4, 5)
+    assert dense.search('freeway merge signal')['hits'][0][0] in (6, 7)
+    assert dense.search('zzz qqq')['hits'] == []
+
+
+def test_search_many_matches_search():
+    dense = DenseIndex(StateIndex('test', CHUNKS))
+    queries = ['hydrant curb', 'bus children', 'freeway lane signal', 'zzz']
+    for query, result in zip(queries, dense.search_many(queries)):
+        single = dense.search(query)['hits']
+        assert [chunk_id for chunk_id, _ in result['hits']] == [chunk_id for chunk_id, _ in single]
+        assert np.allclose([s for _, s in result['hits']], [s for _, s in single])
+
+
+def test_quantized_index_is_smaller_and_agrees():
+    index = StateIndex('test', CHUNKS)
+    full = DenseIndex(index)
+    quantized = DenseIndex(index, quantize=True)
+    assert quantized.vectors.dtype == np.int8
+    assert quantized.nbytes < full.nbytes
+    for query in ['hydrant curb', 'school bus children']:
+        assert quantized.search(query)['hits'][0][0] == full.search(query)['hits'][0][0]
@@ -0,0 +1,55 @@
+"""
+Followup tests: event log, waiting for new events, and the expiring store
+"""
+
+import threading
+import time
+
+from followups import Followup, FollowupStore
+
+
+def test_events_and_final_result():
+    followup = Followup()
+    followup.push({'event': 'token', 'data': {'text': 'Stop '}})
+    followup.push({'event': 'token', 'data': {'text': 'for the bus.'}})
+    assert followup.status == 'streaming'
+    assert followup.to_dict()['partial_response'] == 'Stop for the bus.'
+    followup.push({'event': 'done', 'data': {'response': 'Stop for the bus.'}})
+    assert followup.finished and followup.wait(0)
+    assert followup.to_dict()['response'] == 'Stop for the bus.'
+
+
+def test_events_since_waits_for_new_events():
+    followup = Followup()
+    followup.push({'event': 'context', 'data': {}})
+    events, finished = followup.events_since(1, timeout=0.05)
+    assert events == [] and not finished
+
+    def finish():
+        time.sleep(0.05)
+        followup.push({'event': 'done', 'data': {'response': 'ok'}})
+
+    threading.Thread(target=finish).start()
+    events, finished = followup.events_since(1, timeout=5)
+    assert [event['event'] for event in events] == ['done'] and finished
+
+
+def test_failure_wakes_waiters():
+    followup = Followup()
+    threading.Timer(0.05, followup.fail, args=('overloaded',)).start()
+    assert followup.wait(5)
+    assert followup.to_dict()['error'] == 'overloaded'
+
+
+def test_store_expires_and_counts():
+    store = FollowupStore(ttl=0.05, max_size=10)
+    done, failed = store.create(), store.create()
+    assert store.get(done.id) is done
+    done.push({'event': 'done', 'data': {}})
+    failed.fail('boom')
+    store.record(done)
+    store.record(failed)
+    time.sleep(0.1)
+    assert store.get(done.id) is None
+    stats = store.stats()
+    assert (stats['created'], stats['completed'], stats['failed']) == (2, 1, 1)
@@ -0,0 +1,46 @@
+"""
+Hybrid retrieval tests: RRF fusion and per-retriever timeouts
+"""
+
+import threading
+
+from hybrid_retrieval import hybrid_search, reciprocal_rank_fusion
+
+
+def _hits(*chunk_ids):
+    return {'hits': [(chunk_id, 1.0) for chunk_id in chunk_ids], 'candidates': len(chunk_ids)}
+
+
+def test_rrf_rewards_agreement():
+    fused = reciprocal_rank_fusion({'lexical': [1, 2, 3], 'dense': [2, 4, 1]})
+    assert [chunk_id for chunk_id, _ in fused] == [2, 1, 4, 3]
+    assert fused[0][1] == 1 / 62 + 1 / 61
+
+
+def test_rrf_weights():
+    fused = reciprocal_rank_fusion({'lexical': [1], 'dense': [2]}, weights={'dense': 2.0})
+    assert [chunk_id for chunk_id, _ in fused] == [2, 1]
+
+
+def test_slow_and_failing_retrievers_are_skipped():
+    release = threading.Event()
+
+    def slow():
+        release.wait(2)
+        return _hits(9)
+
+    def broken():
+        raise RuntimeError('index missing')
+
+    try:
+        result = hybrid_search(
+            {'lexical': lambda: _hits(1, 2), 'dense': slow, 'ann': broken},
+            top_k=5, timeouts_ms={'dense': 50}
+        )
+    finally:
+        release.set()
+    assert [chunk_id for chunk_id, _ in result['hits']] == [1, 2]
+    assert {name: status['status'] for name, status in result['retrievers'].items()} == {
+        'lexical': 'ok', 'dense': 'timeout', 'ann': 'error'
+    }
+    assert result['candidates'] == 2
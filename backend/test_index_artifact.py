@@ -0,0 +1,43 @@
+"""
+Index artifact tests: a mapped artifact searches like the in-memory index and goes stale with its source
+"""
+
+import os
+
+from index_artifact import MappedStateIndex, artifact_path, write_artifact
+from search_index import StateIndex
+
+CHUNKS = [
+    'Stop at least 20 feet from a school bus with flashing red lights.',
+    'Do not park within 15 feet of a fire hydrant.',
+    'The speed limit in a school zone is 25 mph when children are present.',
+    'Always use your turn signal before changing lanes.',
+]
+
+
+def _build(tmp_path):
+    source = tmp_path / 'test.txt'
+    source.write_text('\n\n'.join(CHUNKS))
+    index = StateIndex('test', CHUNKS)
+    path = artifact_path('test', str(tmp_path))
+    write_artifact(index, path, str(source))
+    return index, path, source
+
+
+def test_mapped_index_matches_memory(tmp_path):
+    index, path, source = _build(tmp_path)
+    mapped = MappedStateIndex.open('test', path, str(source))
+    assert mapped is not None
+    assert len(mapped) == len(index)
+    assert mapped.chunk(2) == CHUNKS[2]
+    assert sorted(mapped.terms()) == sorted(index.terms())
+    for query in ['school bus lights', 'fire hydrant', 'speed limit 25 mph', 'nothing relevant']:
+        assert mapped.search(query)['hits'] == index.search(query)['hits']
+
+
+def test_stale_or_missing_artifact_is_not_opened(tmp_path):
+    _, path, source = _build(tmp_path)
+    source.write_text('\n\n'.join(CHUNKS + ['A new rule about roundabouts.']))
+    os.utime(source, ns=(1, 1))
+    assert MappedStateIndex.open('test', path, str(source)) is None
+    assert MappedStateIndex.open('test', str(tmp_path / 'missing.idx')) is None
@@ -0,0 +1,80 @@
+"""
+Ollama client tests against a local fake server: generation, slot limits and backoff
+"""
+
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from ollama_client import OllamaBusyError, OllamaClient, OllamaError
+
+
+class FakeOllama(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, body: bytes, content_type: str = 'application/json'):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._reply(json.dumps({'models': [{'name': 'llama3.2:1b'}]}).encode())
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if payload['stream']:
+            lines = [{'response': word, 'done': False} for word in ['Stop', ' for', ' the', ' bus']]
+            self._reply(b'\n'.join(json.dumps(line).encode() for line in lines + [{'response': '', 'done': True}]),
+                        'application/x-ndjson')
+        else:
+            self._reply(json.dumps({'response': f"echo: {payload['prompt']}", 'done': True,
+                                    'keep_alive': payload['keep_alive']}).encode())
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), FakeOllama)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_generate_and_list_models(server):
+    client = OllamaClient(host=server)
+    assert client.list_models() == ['llama3.2:1b']
+    result = client.generate('llama3.2:1b', 'hello', keep_alive='5m')
+    assert result['response'] == 'echo: hello'
+    assert result['keep_alive'] == '5m'
+    assert client.stats()['in_flight'] == 0
+
+
+def test_stream_holds_slot_until_exhausted(server):
+    client = OllamaClient(host=server, max_in_flight=1, queue_timeout=0)
+    stream = client.generate('llama3.2:1b', 'bus?', stream=True)
+    with pytest.raises(OllamaBusyError):
+        client.generate('llama3.2:1b', 'bus?')
+    assert ''.join(part['response'] for part in stream) == 'Stop for the bus'
+    assert client.generate('llama3.2:1b', 'again')['response'] == 'echo: again'
+    assert client.stats()['busy_rejections'] == 1
+
+
+def test_connection_failure_backs_off():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        dead_host = f"http://127.0.0.1:{sock.getsockname()[1]}"
+    client = OllamaClient(host=dead_host)
+    with pytest.raises(OllamaError):
+        client.generate('llama3.2:1b', 'hello')
+    assert not client.available()
+    with pytest.raises(OllamaError, match='retrying'):
+        client.generate('llama3.2:1b', 'hello')
+    stats = client.stats()
+    assert stats['connection_errors'] == 1 and stats['in_flight'] == 0
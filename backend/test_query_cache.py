@@ -0,0 +1,48 @@
+"""
+Query cache tests: LRU eviction, TTL expiry, per-state invalidation and key normalization
+"""
+
+import time
+
+from query_cache import LRUTTLCache, RetrievalCache, normalize_query, normalize_question
+
+
+def test_normalize_query_folds_phrasing():
+    assert normalize_query('What is the SPEED limit?') == normalize_query('speed   limit')
+    assert normalize_query(None) == ''
+
+
+def test_normalize_question_keeps_meaning_words():
+    assert normalize_question("Can't I park here?") == 'can not park here'
+    assert normalize_question('I cannot park here') == 'can not park here'
+    assert normalize_question('Can I park here?') != normalize_question("Can't I park here?")
+
+
+def test_least_recently_used_is_evicted():
+    cache = LRUTTLCache(max_size=2, ttl=60)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # 'b' is now least recently used
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    stats = cache.stats()
+    assert stats['evictions'] == 1 and stats['size'] == 2
+
+
+def test_entries_expire():
+    cache = LRUTTLCache(max_size=4, ttl=0.05)
+    cache.put('a', 1)
+    assert cache.get('a') == 1
+    time.sleep(0.1)
+    assert cache.get('a') is None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_invalidate_state_only_drops_that_state():
+    cache = RetrievalCache(max_size=8, ttl=60)
+    cache.put(RetrievalCache.make_key('washington', 'speed limit', 'lexical'), 'wa')
+    cache.put(RetrievalCache.make_key('oregon', 'speed limit', 'lexical'), 'or')
+    assert cache.invalidate_state('washington') == 1
+    assert cache.get(RetrievalCache.make_key('washington', 'What is the speed limit?', 'lexical')) is None
+    assert cache.get(RetrievalCache.make_key('oregon', 'What is the speed limit?', 'lexical')) == 'or'
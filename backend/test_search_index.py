@@ -0,0 +1,48 @@
+"""
+Search index tests: BM25 ranking, batched search and the candidate budget
+"""
+
+from search_index import StateIndex, query_terms
+
+CHUNKS = [
+    'Stop at least 20 feet from a school bus with flashing red lights.',
+    'Do not park within 15 feet of a fire hydrant.',
+    'The speed limit in a school zone is 25 mph when children are present.',
+    'Always use your turn signal before changing lanes.',
+    'A learner permit lets you drive with a licensed adult in the car.',
+]
+
+
+def test_query_terms_drop_stopwords_and_repeats():
+    assert query_terms('what is the speed limit, the speed?') == ['speed', 'limit']
+
+
+def test_relevant_chunk_ranks_first():
+    index = StateIndex('test', CHUNKS)
+    assert index.search('fire hydrant parking')['hits'][0][0] == 1
+    assert index.search('school zone speed limit')['hits'][0][0] == 2
+    assert index.search('zzz qqq')['hits'] == []
+
+
+def test_rare_terms_weigh_more():
+    index = StateIndex('test', CHUNKS + ['Feet feet feet on the pedals.'])
+    assert index.idf('hydrant') > index.idf('feet')
+
+
+def test_search_many_matches_search():
+    index = StateIndex('test', CHUNKS)
+    queries = ['school bus lights', 'turn signal lanes', 'permit adult', 'how far from a hydrant in feet']
+    batched = index.search_many(queries)
+    for query, result in zip(queries, batched):
+        single = index.search(query)
+        assert [chunk_id for chunk_id, _ in result['hits']] == [chunk_id for chunk_id, _ in single['hits']]
+        assert [round(score, 6) for _, score in result['hits']] == [round(score, 6) for _, score in single['hits']]
+    assert index.search_many([]) == []
+
+
+def test_candidate_budget_limits_rerank():
+    index = StateIndex('test', CHUNKS)
+    result = index.search('feet school', candidate_budget=1, min_score=0)
+    assert result['candidates'] == 3
+    assert result['reranked'] == 1
+    assert len(result['hits']) == 1
@@ -0,0 +1,45 @@
+"""
+Semantic cache tests: paraphrases hit, negated questions never do
+"""
+
+from semantic_cache import SemanticCache, shingles
+from query_cache import normalize_question
+
+
+def test_normalize_question_keeps_negations_and_modals():
+    assert normalize_question("Must I not stop?") == 'must not stop'
+    assert normalize_question("Can't I turn right on red?") == 'can not turn right red'
+    assert normalize_question("I cannot park here") == 'can not park here'
+    assert 'when' in normalize_question("When must I yield?").split()
+
+
+def test_paraphrase_hits():
+    cache = SemanticCache()
+    cache.add('washington', 'How far from a fire hydrant can I park?', 'fifteen feet')
+    match = cache.lookup('washington', 'How close can I park to a hydrant?')
+    assert match is not None and match['answer'] == 'fifteen feet'
+
+
+def test_negated_pair_misses():
+    cache = SemanticCache()
+    cache.add('washington', 'Must I stop for a school bus?', 'yes')
+    assert shingles('Must I stop for a school bus?') != shingles('Must I not stop for a school bus?')
+    assert cache.lookup('washington', 'Must I not stop for a school bus?') is None
+    assert cache.lookup('washington', 'Must I stop for school buses?') is not None
+
+
+def test_dropped_qualifier_misses():
+    cache = SemanticCache()
+    cache.add('washington', 'Can I pass a school bus?', 'no')
+    assert cache.lookup('washington', 'Can I pass a bus?') is None
+
+
+def test_agent_warms_under_catalog_keys():
+    from answer_cache import AnswerCache
+    from lightweight_rag import LightweightRAGAgent
+
+    # The agent's answer cache is the test database from conftest.py
+    AnswerCache().put('warm-nj', 'new jersey', 'When may I use a handheld phone while driving?', 'm', 'Never.')
+    agent = LightweightRAGAgent()
+    match = agent.semantic_cache.lookup('newjersey', 'when may I use a handheld phone while driving')
+    assert match is not None and match['answer'] == 'Never.'
@@ -0,0 +1,32 @@
+"""
+Sentence index tests: precomputed sentences per chunk, and no mix-ups between chunks
+"""
+
+from search_index import StateIndex
+from sentence_index import SentenceIndex, segment
+
+CHUNKS = [
+    'Stop at least 20 feet from a school bus with flashing red lights. Wait until the lights stop.',
+    'Do not park within 15 feet of a fire hydrant. Parking is also banned in crosswalks.',
+]
+
+
+def test_segment_drops_short_fragments():
+    records = segment('Rules. Always signal before you change lanes on the freeway! Ok?')
+    assert [sentence for sentence, _ in records] == ['Always signal before you change lanes on the freeway']
+    assert 'signal' in records[0][1]
+
+
+def test_chunk_sentences_match_segmenting():
+    sentences = SentenceIndex(StateIndex('test', CHUNKS))
+    for chunk in CHUNKS:
+        assert list(sentences.chunk_sentences(chunk)) == segment(chunk)
+    assert sentences.chunk_id('not from this manual at all, just some other text') is None
+
+
+def test_hash_collision_is_not_trusted():
+    sentences = SentenceIndex(StateIndex('test', CHUNKS))
+    impostor = CHUNKS[0][::-1]  # same length as chunk 0, different text
+    sentences._chunk_ids[hash(impostor)] = 0  # simulate a colliding hash
+    assert sentences.chunk_id(impostor) is None
+    assert list(sentences.chunk_sentences(impostor)) == segment(impostor)
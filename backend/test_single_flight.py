@@ -0,0 +1,85 @@
+"""
+Single-flight tests: identical concurrent work runs once, even through a bounded pool
+"""
+
+import concurrent.futures
+import threading
+import time
+import pytest
+from single_flight import SingleFlight
+from worker_pool import BoundedWorkerPool, PoolFullError
+
+
+def _burst(count, fn):
+    barrier = threading.Barrier(count)
+
+    def call():
+        barrier.wait()
+        return fn()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=count) as callers:
+        return [future.result() for future in [callers.submit(call) for _ in range(count)]]
+
+
+def test_identical_burst_through_pool_runs_once():
+    flights = SingleFlight()
+    pool = BoundedWorkerPool(max_workers=2, max_queue=2)
+    generations = []
+
+    def generate():
+        generations.append(1)
+        time.sleep(0.3)
+        return {'response': 'stop for school buses'}
+
+    def request():
+        future, shared = flights.submit('question', lambda: pool.submit(generate))
+        return pool.wait(future, timeout=5), shared
+
+    results = _burst(30, request)
+    assert len(generations) == 1
+    assert all(result == {'response': 'stop for school buses'} for result, _ in results)
+    assert sum(1 for _, shared in results if not shared) == 1
+    stats = pool.stats()
+    assert stats['submitted'] == 1 and stats['rejected'] == 0
+    assert flights.stats()['in_flight'] == 0
+
+
+def test_do_shares_result_and_bounds_waiters():
+    flights = SingleFlight()
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        time.sleep(0.5)
+        return 42
+
+    leader = threading.Thread(target=flights.do, args=('k', slow))
+    leader.start()
+    started.wait()
+    with pytest.raises(concurrent.futures.TimeoutError):
+        flights.do('k', lambda: 0, timeout=0.05)
+    assert flights.do('k', lambda: 0, timeout=2) == (42, True)
+    leader.join()
+    assert flights.stats()['wait_timeouts'] == 1
+    assert flights.do('k', lambda: 7) == (7, False)  # landed flights aren't reused
+
+
+def test_errors_reach_waiters_and_retire_the_flight():
+    flights = SingleFlight()
+    pool = BoundedWorkerPool(max_workers=1, max_queue=0)
+
+    def fail():
+        time.sleep(0.1)
+        raise ValueError('model crashed')
+
+    future, _ = flights.submit('k', lambda: pool.submit(fail))
+    joined, shared = flights.submit('k', lambda: pool.submit(fail))
+    assert shared and joined is future
+    with pytest.raises(ValueError):
+        joined.result(timeout=2)
+
+    blocker = pool.submit(time.sleep, 0.3)
+    with pytest.raises(PoolFullError):
+        flights.submit('other', lambda: pool.submit(fail))
+    assert flights.stats()['in_flight'] == 0
+    blocker.result()
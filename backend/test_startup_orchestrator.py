@@ -0,0 +1,28 @@
+"""
+Startup orchestrator tests: the database step runs and gates readiness
+"""
+
+import database
+import startup_orchestrator
+from startup_orchestrator import Readiness
+
+
+def test_database_step_gates_readiness(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, 'DATABASE_PATH', str(tmp_path / 'database.db'))
+    monkeypatch.setattr(startup_orchestrator, 'readiness', Readiness())
+    startup_orchestrator.start(background=False)
+    status = startup_orchestrator.readiness.to_dict()
+    assert status['steps']['database']['status'] == 'ok'
+    assert status['ready'] and status['startup_s'] is not None
+    assert database.check_db_health()['status'] == 'healthy'
+
+
+def test_failed_required_step_is_not_ready():
+    readiness = Readiness()
+    readiness.begin(['warmup', 'database'])
+    readiness.update('warmup', 'failed', error='no model')
+    assert not readiness.ready
+    readiness.update('database', 'failed', error='disk full')
+    assert not readiness.ready
+    readiness.update('database', 'ok')
+    assert readiness.ready and readiness.to_dict()['degraded']
@@ -0,0 +1,45 @@
+"""
+Worker pool tests: admission control, timeouts and counters
+"""
+
+import concurrent.futures
+import threading
+
+import pytest
+
+from worker_pool import BoundedWorkerPool, PoolFullError
+
+
+def test_rejects_when_workers_and_queue_are_full():
+    pool = BoundedWorkerPool(max_workers=1, max_queue=1, name='test')
+    release = threading.Event()
+    running = pool.submit(release.wait, 5)
+    queued = pool.submit(lambda: 'queued')
+    with pytest.raises(PoolFullError):
+        pool.submit(lambda: 'rejected')
+    release.set()
+    assert running.result(timeout=5) is True
+    assert queued.result(timeout=5) == 'queued'
+    assert pool.run(lambda: 'admitted again', timeout=5) == 'admitted again'
+    stats = pool.stats()
+    assert stats['rejected'] == 1 and stats['completed'] == 3
+    assert stats['running'] == 0 and stats['queue_depth'] == 0
+
+
+def test_timeout_is_counted_and_work_keeps_its_slot():
+    pool = BoundedWorkerPool(max_workers=1, max_queue=0, name='test')
+    release = threading.Event()
+    with pytest.raises(concurrent.futures.TimeoutError):
+        pool.run(release.wait, 5, timeout=0.05)
+    with pytest.raises(PoolFullError):
+        pool.submit(lambda: None)  # the timed-out work still runs in the background
+    release.set()
+    assert pool.stats()['timeouts'] == 1
+
+
+def test_failures_are_counted():
+    pool = BoundedWorkerPool(max_workers=1, max_queue=0, name='test')
+    with pytest.raises(ZeroDivisionError):
+        pool.run(lambda: 1 / 0, timeout=5)
+    assert pool.stats()['failed'] == 1
+    assert pool.run(lambda: 'ok', timeout=5) == 'ok'
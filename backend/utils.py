@@ -6,6 +6,7 @@ Health checks, common helpers, and system utilities
 
 from flask import Blueprint, jsonify
 from database import check_db_health
+from startup_orchestrator import readiness
 import time
 import os
 import psutil
@@ -54,6 +55,12 @@ def health_check():
             'timestamp': time.time()
         }), 500
 
+@utils_bp.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe - 503 until Ollama warm-up and database init have finished"""
+    status = readiness.to_dict()
+    return jsonify(dict(status, timestamp=time.time())), 200 if status['ready'] else 503
+
 def get_system_health():
     """Get system resource usage"""
     try:
@@ -0,0 +1,116 @@
+"""
+Worker Pool - Bounded Process-Wide Pool for Chat Generations
+============================================================
+One executor with a fixed number of workers and a bounded queue runs every
+chat request's RAG + LLM work. When the workers and the queue are full, new
+work is rejected immediately so the endpoint can serve a fallback instead
+of piling more generations onto Ollama. A request that times out stops
+waiting; its generation finishes in the background and still counts
+against the limit until it does.
+
+Settings (environment):
+    LLM_POOL_WORKERS     concurrent chat computations (default 4)
+    LLM_POOL_QUEUE_SIZE  requests allowed to wait for a worker (default 16)
+"""
+
+import concurrent.futures
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict
+
+LLM_POOL_WORKERS = int(os.environ.get('LLM_POOL_WORKERS', 4))
+LLM_POOL_QUEUE_SIZE = int(os.environ.get('LLM_POOL_QUEUE_SIZE', 16))
+WAIT_SAMPLES = 500  # recent queue waits kept for the percentile metrics
+
+
+class PoolFullError(Exception):
+    """All workers busy and the queue is full"""
+
+
+class BoundedWorkerPool:
+    """
+    ThreadPoolExecutor with admission control and queue metrics
+    """
+
+    def __init__(self, max_workers: int = None, max_queue: int = None, name: str = 'llm'):
+        self.max_workers = max_workers or LLM_POOL_WORKERS
+        self.max_queue = LLM_POOL_QUEUE_SIZE if max_queue is None else max_queue
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix=name
+        )
+        self._admission = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._waits_ms = deque(maxlen=WAIT_SAMPLES)
+        self._counters = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0, 'timeouts': 0}
+
+    def submit(self, fn: Callable, *args, **kwargs) -> concurrent.futures.Future:
+        """Queue work or raise PoolFullError right away if the pool is saturated"""
+        if not self._admission.acquire(blocking=False):
+            with self._lock:
+                self._counters['rejected'] += 1
+            raise PoolFullError(f"{self.max_workers} workers busy and {self.max_queue} requests queued")
+        with self._lock:
+            self._queued += 1
+            self._counters['submitted'] += 1
+        enqueued_at = time.time()
+
+        def run():
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                self._waits_ms.append((time.time() - enqueued_at) * 1000)
+            try:
+                result = fn(*args, **kwargs)
+                outcome = 'completed'
+                return result
+            except Exception:
+                outcome = 'failed'
+                raise
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._counters[outcome] += 1
+                self._admission.release()
+
+        try:
+            return self._executor.submit(run)
+        except Exception:
+            with self._lock:
+                self._queued -= 1
+            self._admission.release()
+            raise
+
+    def run(self, fn: Callable, *args, timeout: float = None, **kwargs) -> Any:
+        """Submit and wait up to `timeout` seconds (raises PoolFullError / TimeoutError)"""
+        return self.wait(self.submit(fn, *args, **kwargs), timeout)
+
+    def wait(self, future: concurrent.futures.Future, timeout: float = None) -> Any:
+        """Result of a future for work on this pool, counting a timeout like `run`"""
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            with self._lock:
+                self._counters['timeouts'] += 1
+            raise
+
+    def stats(self) -> Dict:
+        with self._lock:
+            waits = sorted(self._waits_ms)
+            return dict(
+                self._counters,
+                workers=self.max_workers,
+                max_queue=self.max_queue,
+                running=self._running,
+                queue_depth=self._queued,
+                wait_ms_p50=round(waits[len(waits) // 2], 2) if waits else 0.0,
+                wait_ms_p95=round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 2) if waits else 0.0,
+                wait_ms_max=round(waits[-1], 2) if waits else 0.0
+            )
+
+
+# Shared by every chat endpoint in the process
+llm_pool = BoundedWorkerPool()
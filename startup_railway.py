@@ -8,7 +8,6 @@ Simplified Railway deployment without Nginx proxy
 - Static files served by Flask
 """
 import subprocess
-import time
 import sys
 import os
 import logging
@@ -37,42 +36,6 @@ def start_ollama_server():
         logger.error(f"❌ Failed to start Ollama: {e}")
         return None
 
-def pull_mistral_model():
-    """Pull Mistral model with timeout and error handling"""
-    logger.info("⏳ Waiting for Ollama to initialize...")
-    time.sleep(15)  # Wait for Ollama to start
-    
-    logger.info("📥 Attempting to pull Mistral model...")
-    try:
-        result = subprocess.run(
-            ['ollama', 'pull', 'mistral:latest'],
-            capture_output=True,
-            text=True,
-            timeout=300  # 5 minute timeout
-        )
-        if result.returncode == 0:
-            logger.info("✅ Mistral model pulled successfully")
-        else:
-            logger.warning(f"⚠️ Model pull failed: {result.stderr}")
-    except subprocess.TimeoutExpired:
-        logger.warning("⚠️ Model pull timed out - continuing anyway")
-    except Exception as e:
-        logger.warning(f"⚠️ Model pull error: {e}")
-
-def initialize_database():
-    """Initialize the database"""
-    logger.info("🗄️ Initializing database...")
-    try:
-        # Import here to avoid circular imports
-        sys.path.append('/app')
-        from database import init_db
-        init_db()
-        logger.info("✅ Database initialized successfully")
-        return True
-    except Exception as e:
-        logger.error(f"❌ Database initialization failed: {e}")
-        return False
-
 def start_flask_app():
     """Start Flask application on Railway-assigned port"""
     logger.info("🌐 Starting Flask application...")
@@ -86,18 +49,10 @@ def start_flask_app():
     logger.info("🎯 Ready for quiz analysis and study guidance")
     
     try:
-        # Import Flask app
+        # Build the Flask app (create_app already serves the frontend from /app/static)
         sys.path.append('/app')
-        from app import app
-        
-        # Configure Flask to serve static files
-        app.static_folder = '/app/static'
-        app.static_url_path = ''
-        
-        # Add route for serving frontend
-        @app.route('/')
-        def serve_frontend():
-            return app.send_static_file('index.html')
+        from app import create_app
+        app = create_app()
         
         # Start Flask on Railway port
         app.run(
@@ -129,15 +84,13 @@ def main():
     if not ollama_process:
         logger.warning("⚠️ Ollama failed to start - AI features may be limited")
     
-    # Step 2: Pull Mistral model (optional, app can work without it)
-    pull_mistral_model()
-    
-    # Step 3: Initialize database
-    if not initialize_database():
-        logger.error("❌ Database initialization failed - exiting")
-        sys.exit(1)
+    # Step 2: Wait for Ollama, pull + warm up Mistral and init the database - in parallel
+    # and in the background while the app imports; /api/ready flips when all are done
+    sys.path.append('/app')
+    import startup_orchestrator
+    startup_orchestrator.start(background=True)
     
-    # Step 4: Start Flask application (this blocks)
+    # Step 3: Start Flask application (this blocks)
     logger.info("🎯 Starting main application...")
     start_flask_app()
 